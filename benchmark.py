@@ -0,0 +1,176 @@
+import argparse, os, statistics, sys, threading, time
+from typing import Callable, List
+
+from PySide6.QtGui import QGuiApplication
+
+# Same setup as main.py, so the settings and storage paths are the ones the program uses
+QGuiApplication.setApplicationName("Caduceus")
+from comicviewer.files import FileUtils
+os.environ['PATH'] += os.pathsep + FileUtils.getProgramPath() + os.pathsep + os.path.join(FileUtils.getProgramPath(), "lib")
+
+from PySide6.QtCore import QByteArray, Qt
+from PySide6.QtGui import QImage
+
+from comicviewer.files import FileOpenerFactory
+from comicviewer.images import ImageUtils
+from comicviewer.images.ImageCacheHandler import ImageCacheHandler
+from comicviewer.images.decoders import ImageDecoderFactory
+from comicviewer.images.decoders.QtImageDecoder import QtImageDecoder
+from comicviewer.library import LibraryCatalog
+
+
+def _timeFunction(function: Callable, repeatCount: int) -> float:
+	""":return: The median duration of running the provided function, in seconds"""
+	durations = []
+	for _ in range(repeatCount):
+		startTime = time.perf_counter()
+		function()
+		durations.append(time.perf_counter() - startTime)
+	return statistics.median(durations)
+
+def _loadPageBytes(bookPath: str, pageCount: int) -> List:
+	fileOpener = FileOpenerFactory.getFileOpenerForFile(bookPath)
+	pageBytes = [fileOpener.getImageBytesByIndex(index) for index in range(min(pageCount, fileOpener.getMaximumImageIndex() + 1))]
+	return pageBytes
+
+def _readAndDecodeLikeBefore(fileOpener, index: int) -> QImage:
+	"""The read and decode path from before the archive got memory-mapped: read the file from the archive, then copy it into a QByteArray to decode it"""
+	image = QImage()
+	image.loadFromData(QByteArray(fileOpener._readFile(fileOpener.imageNames[index])))
+	return image
+
+def _readAndDecode(fileOpener, index: int) -> QImage:
+	return QtImageDecoder().decodeImage(fileOpener.getImageBytesByIndex(index))
+
+def benchmarkDecoding(arguments: argparse.Namespace):
+	fileOpener = FileOpenerFactory.getFileOpenerForFile(arguments.book)
+	pageCount = min(arguments.pages, fileOpener.getMaximumImageIndex() + 1)
+	print(f"Reading and decoding {pageCount} pages from '{arguments.book}' with the Qt decoder, median of {arguments.repeat} runs per page")
+	# Pages stored without compression are memoryviews into the mapped archive, compressed pages are bytes. Both include reading the page, so the comparison is fair for both
+	print(f"{'Page':>5} {'Size (MB)':>10} {'Type':>11} {'Before (ms)':>12} {'Now (ms)':>9} {'Speedup':>8}")
+	for pageIndex in range(pageCount):
+		imageBytes = fileOpener.getImageBytesByIndex(pageIndex)
+		beforeDuration = _timeFunction(lambda: _readAndDecodeLikeBefore(fileOpener, pageIndex), arguments.repeat)
+		nowDuration = _timeFunction(lambda: _readAndDecode(fileOpener, pageIndex), arguments.repeat)
+		print(f"{pageIndex + 1:>5} {len(imageBytes) / 1_000_000:>10.2f} {type(imageBytes).__name__:>11} {beforeDuration * 1000:>12.2f} {nowDuration * 1000:>9.2f} {beforeDuration / nowDuration:>7.2f}x")
+	fileOpener.close()
+	pageBytes = _loadPageBytes(arguments.book, pageCount)
+	fullDuration = _timeFunction(lambda: [ImageUtils.convertBytesToImage(imageBytes) for imageBytes in pageBytes], 1)
+	print(f"Fully loading all pages like the program does, including the conversion to the display format, took {fullDuration:.3f} seconds")
+
+def _getImageDifference(firstImage: QImage, secondImage: QImage) -> int:
+	""":return: The largest difference between a colour channel of the provided images, so 0 if they're identical"""
+	firstBytes = bytes(firstImage.constBits())
+	secondBytes = bytes(secondImage.convertToFormat(firstImage.format()).constBits())
+	if firstBytes == secondBytes:
+		return 0
+	return max(abs(firstByte - secondByte) for firstByte, secondByte in zip(firstBytes, secondBytes))
+
+def benchmarkScaling(arguments: argparse.Namespace):
+	if arguments.book:
+		image = ImageUtils.convertBytesToImage(_loadPageBytes(arguments.book, arguments.page + 1)[arguments.page])
+	else:
+		# A generated page, with a diagonal line of dots so the scaling has something to average
+		image = QImage(arguments.width, arguments.height, QImage.Format_RGB32)
+		image.fill(Qt.white)
+		for row in range(0, image.height(), 7):
+			image.setPixelColor(row % image.width(), row, Qt.black)
+	scaledWidth, scaledHeight = int(image.width() * arguments.scale), int(image.height() * arguments.scale)
+	print(f"Scaling a {image.width()}x{image.height()} image to {scaledWidth}x{scaledHeight}, median of {arguments.repeat} runs")
+	singleThreadedImage = image.scaled(scaledWidth, scaledHeight, mode=Qt.SmoothTransformation)
+	singleThreadedDuration = _timeFunction(lambda: image.scaled(scaledWidth, scaledHeight, mode=Qt.SmoothTransformation), arguments.repeat)
+	print(f"{'Threads':>7} {'Duration (ms)':>14} {'Speedup':>8} {'Max difference':>15}")
+	print(f"{'Qt':>7} {singleThreadedDuration * 1000:>14.2f} {1:>7.2f}x {0:>15}")
+	threadCount = 1
+	while threadCount <= (os.cpu_count() or 1):
+		stripedImage = ImageUtils.scaleImageSmoothly(image, scaledWidth, scaledHeight, threadCount)
+		stripedDuration = _timeFunction(lambda: ImageUtils.scaleImageSmoothly(image, scaledWidth, scaledHeight, threadCount), arguments.repeat)
+		print(f"{threadCount:>7} {stripedDuration * 1000:>14.2f} {singleThreadedDuration / stripedDuration:>7.2f}x {_getImageDifference(singleThreadedImage, stripedImage):>15}")
+		threadCount *= 2
+
+def benchmarkDecoders(arguments: argparse.Namespace):
+	print(f"Available decoders: {', '.join(ImageDecoderFactory.getDecoderNames())}")
+	formatTimings = ImageDecoderFactory.selectFastestDecoders()
+	if not formatTimings:
+		print("No image format can be decoded by more than one of the available decoders, so there's nothing to choose")
+		return
+	print(f"{'Format':>7} {'Decoder':>10} {'Duration (ms)':>14}")
+	for imageFormat, decoderTimings in formatTimings.items():
+		fastestDecoderName = min(decoderTimings, key=decoderTimings.get)
+		for decoderName, duration in sorted(decoderTimings.items(), key=lambda timing: timing[1]):
+			print(f"{imageFormat:>7} {decoderName:>10} {duration * 1000:>14.2f}{'  <- selected' if decoderName == fastestDecoderName else ''}")
+
+def benchmarkPipeline(arguments: argparse.Namespace):
+	fileOpener = FileOpenerFactory.getFileOpenerForFile(arguments.book)
+	pageCount = min(arguments.pages, fileOpener.getMaximumImageIndex() + 1)
+	loadedPageCount = 0
+	loadedPageCountLock = threading.Lock()
+	allPagesLoadedEvent = threading.Event()
+
+	def onPageDone(*args):
+		nonlocal loadedPageCount
+		# Previews get reported too, only count full images and failures
+		if len(args) == 2 and args[1] is True:
+			return
+		with loadedPageCountLock:
+			loadedPageCount += 1
+			if loadedPageCount >= pageCount:
+				allPagesLoadedEvent.set()
+
+	imageCacheHandler = ImageCacheHandler(fileOpener)
+	imageCacheHandler.setImageLoadedCallbacks(onPageDone, onPageDone)
+	print(f"Loading {pageCount} pages from '{arguments.book}' through the image loading pipeline")
+	startTime = time.perf_counter()
+	imageCacheHandler.retrieveImages(*range(pageCount), shouldUpdateCache=False)
+	while not allPagesLoadedEvent.wait(arguments.interval):
+		print(f"After {time.perf_counter() - startTime:.1f} seconds:")
+		for stageStatistics in ImageCacheHandler.getLoadingStatistics():
+			print(f"  {stageStatistics}")
+	print(f"Loading all pages took {time.perf_counter() - startTime:.3f} seconds")
+	for stageStatistics in ImageCacheHandler.getLoadingStatistics():
+		print(f"  {stageStatistics}")
+	fileOpener.close()
+
+def benchmarkSearch(arguments: argparse.Namespace):
+	for searchText in arguments.searchTexts:
+		foundBooks = []
+		def search():
+			foundBooks[:] = LibraryCatalog.searchBooks(searchText)
+		searchDuration = _timeFunction(search, arguments.repeat)
+		print(f"'{searchText}': {len(foundBooks)} books found in {searchDuration * 1000:.1f} ms")
+	LibraryCatalog.close()
+
+def main():
+	argumentParser = argparse.ArgumentParser(description="Measure how fast the image handling is on this computer")
+	subparsers = argumentParser.add_subparsers(dest='benchmark', required=True)
+	decodeParser = subparsers.add_parser('decode', help="Compare reading and decoding pages like before the archive got memory-mapped, and like now")
+	decodeParser.add_argument('book', help="The comic book file to load pages from")
+	decodeParser.add_argument('--pages', type=int, default=10, help="How many pages to decode, starting at the first one")
+	decodeParser.add_argument('--repeat', type=int, default=5, help="How often each page is decoded")
+	decodeParser.set_defaults(function=benchmarkDecoding)
+	scaleParser = subparsers.add_parser('scale', help="Compare smoothly scaling an image in one go and in parallel stripes, with different numbers of threads")
+	scaleParser.add_argument('book', nargs='?', help="The comic book file to load the page to scale from. If not provided, a generated page is used")
+	scaleParser.add_argument('--page', type=int, default=0, help="The index of the page to scale")
+	scaleParser.add_argument('--width', type=int, default=5000, help="The width of the generated page")
+	scaleParser.add_argument('--height', type=int, default=7500, help="The height of the generated page")
+	scaleParser.add_argument('--scale', type=float, default=0.288, help="The factor to scale the page by. The default fits the generated page on a 4K screen")
+	scaleParser.add_argument('--repeat', type=int, default=5, help="How often the page is scaled per thread count")
+	scaleParser.set_defaults(function=benchmarkScaling)
+	decodersParser = subparsers.add_parser('decoders', help="Show which decoder is fastest for each image format, the same way the program chooses them at startup")
+	decodersParser.set_defaults(function=benchmarkDecoders)
+	pipelineParser = subparsers.add_parser('pipeline', help="Load pages through the staged loading pipeline, and show the queue depth and latency of each stage")
+	pipelineParser.add_argument('book', help="The comic book file to load pages from")
+	pipelineParser.add_argument('--pages', type=int, default=40, help="How many pages to load, starting at the first one")
+	pipelineParser.add_argument('--interval', type=float, default=0.5, help="How many seconds between showing the stage statistics while loading")
+	pipelineParser.set_defaults(function=benchmarkPipeline)
+	searchParser = subparsers.add_parser('search', help="Time searching the library catalog. The library has to be scanned by the program first")
+	searchParser.add_argument('searchTexts', nargs='+', help="The texts to search for, each one is timed separately")
+	searchParser.add_argument('--repeat', type=int, default=5, help="How often each search is done")
+	searchParser.set_defaults(function=benchmarkSearch)
+
+	arguments = argumentParser.parse_args()
+	app = QGuiApplication(sys.argv[:1])
+	arguments.function(arguments)
+
+if __name__ == '__main__':
+	main()
@@ -1,12 +1,18 @@
 import logging, time
 import os.path
-from typing import TYPE_CHECKING, Iterable, Union
+from typing import TYPE_CHECKING, FrozenSet, Union
 
 from PySide6.QtWidgets import QApplication
 
+from comicviewer.images import DecodeWorkerPool, ThumbnailStore
+from comicviewer.images.decoders import ImageDecoderFactory
+from comicviewer.files.BookPreOpener import BookPreOpener
 from comicviewer.keyboard import KeyboardHandler
 from comicviewer.keyboard.KeyboardAction import KeyboardAction
-from comicviewer.misc import HistoryStore
+from comicviewer.library import LibraryCatalog
+from comicviewer.library.CoverThumbnailer import CoverThumbnailer
+from comicviewer.library.LibraryScanner import LibraryScanner
+from comicviewer.misc import BookPool, HistoryStore
 from comicviewer.ui.bookdisplay.BookDisplayParentWidget import BookDisplayParentWidget
 from comicviewer.settings import SettingsStore
 from comicviewer.settings.SettingsEnum import SettingsEnum
@@ -22,6 +28,13 @@ class MainController:
 		self.updateWindowTitle()
 		self._initializeKeyboardHandling()
 		self._wasMaximizedBeforeFullscreen: bool = False
+		# Keeps the library catalog up-to-date. Created here because the library panel starts a scan when it gets created
+		self.libraryScanner = LibraryScanner()
+		self.coverThumbnailer = CoverThumbnailer()
+		self.bookPreOpener = BookPreOpener()
+		# Other parts of the program register for the settings they depend on themselves, these are the settings that affect the window as a whole
+		SettingsStore.registerSettingsChangeListener(self._onLoggingLevelChanged, SettingsEnum.LOGGING_LEVEL)
+		SettingsStore.registerSettingsChangeListener(self._onAllowMultipleBooksChanged, SettingsEnum.ALLOW_MULTIPLE_BOOKS)
 
 	def _initializeKeyboardHandling(self):
 		# Navigation keys
@@ -72,13 +85,15 @@ class MainController:
 				UiUtils.showWarningMessagePopup(f"Missing File{pluralS}", msg)
 		# Make sure all the tab-related display things (window title etc) is correct
 		self.onTabChanged(self.window.tabView.currentIndex())
+		# Find out which image decoder is fastest on this computer. Until that's known, the default decoders are used
+		ImageDecoderFactory.selectFastestDecodersInBackground()
+		# Remove the stored thumbnails of books that changed or haven't been used for a long time
+		ThumbnailStore.pruneInBackground()
 
 	def onTabChanged(self, newTabIndex):
 		if newTabIndex == self.window.bookSelectionTabIndex or newTabIndex == self.window.settingsTabIndex:
 			HistoryStore.setCurrentBook(None)
-			# Make sure the history view is always up-to-date when we switch back to the book selection tab for any reason
 			if newTabIndex == self.window.bookSelectionTabIndex:
-				self.window.historyPanel.updateHistoryView()
 				self.updateWindowTitle("Book Selection")
 			else:
 				self.updateWindowTitle("Settings")
@@ -89,43 +104,20 @@ class MainController:
 		if not self.window.tabView.tabBar().isVisible() and SettingsStore.getSettingValue(SettingsEnum.ALLOW_MULTIPLE_BOOKS) and self.window.tabView.count() > 2:
 			self.setTabBarVisible(True)
 
-	def onSettingsChanged(self, changedSettings: Iterable[SettingsEnum]):
-		if SettingsEnum.LOGGING_LEVEL in changedSettings:
-			newLogLevel = SettingsStore.getSettingValue(SettingsEnum.LOGGING_LEVEL).logLevel
-			logger = logging.getLogger()
-			logger.setLevel(newLogLevel)
-			for logHandler in logger.handlers:
-				logHandler.setLevel(newLogLevel)
-		if SettingsEnum.BOOK_HISTORY_SIZE in changedSettings:
-			HistoryStore.trimHistory()
-		if self.window.tabView.count() == 2:
-			# No books are open, no need to update book views or close books
-			return
+	def _onLoggingLevelChanged(self, settings: SettingsStore.SettingsSnapshot, changedSettings: FrozenSet[SettingsEnum]):
+		newLogLevel = settings.LOGGING_LEVEL.logLevel
+		logger = logging.getLogger()
+		logger.setLevel(newLogLevel)
+		for logHandler in logger.handlers:
+			logHandler.setLevel(newLogLevel)
+
+	def _onAllowMultipleBooksChanged(self, settings: SettingsStore.SettingsSnapshot, changedSettings: FrozenSet[SettingsEnum]):
 		# If there are more books open than allowed, close the extras
-		if SettingsEnum.ALLOW_MULTIPLE_BOOKS in changedSettings and not SettingsStore.getSettingValue(SettingsEnum.ALLOW_MULTIPLE_BOOKS) and self.window.tabView.count() > 3:
+		if not settings.ALLOW_MULTIPLE_BOOKS and self.window.tabView.count() > 3:
 			booksToClose = self.window.tabView.count() - 3
 			for i in range(0, booksToClose):
 				widget: BookDisplayParentWidget = self.window.tabView.widget(4)
 				widget.controller.closeBook(False)
-		# Check to see if we need to update parts of the book display views
-		shouldUpdateImageCaches = False
-		shouldRedrawViews = False
-		for changedSetting in changedSettings:
-			if changedSetting in (SettingsEnum.SHOW_TWO_PAGES, SettingsEnum.GAP_BETWEEN_PAGES, SettingsEnum.DEFAULT_ZOOM_TYPE):
-				shouldRedrawViews = True
-				# Since redrawing the view includes updating the cache, no need to keep checking
-				break
-			elif changedSetting in (SettingsEnum.CACHE_BEHIND_COUNT, SettingsEnum.CACHE_AHEAD_COUNT, SettingsEnum.UNCACHE_EXTRA_RANGE):
-				shouldUpdateImageCaches = True
-				# Don't break, because we might run into a setting that requires redrawing the view entirely
-		if shouldUpdateImageCaches or shouldRedrawViews:
-			for index in range(self.window.bookSelectionTabIndex + 1, self.window.tabView.count()):
-				widget: BookDisplayParentWidget = self.window.tabView.widget(index)
-				# Updating the view also updates the cache, so don't do both
-				if shouldRedrawViews:
-					widget.controller.updateView()
-				elif shouldUpdateImageCaches:
-					widget.controller.updateImageCache()
 
 	def handleKeyPress(self, key) -> bool:
 		startTime = time.perf_counter()
@@ -174,16 +166,30 @@ class MainController:
 				# If there's no higher index, it selects the previous index. So we don't need to manually change tabs
 				break
 
-	def loadComicBook(self, comicBookPath):
-		# Check if the requested book already exists, if so switch to it
+	def preOpenBook(self, comicBookPath: str):
+		"""
+		Start opening a book in the background because it got selected, so it shows up almost instantly if it gets opened. Selecting another book cancels this
+		:param comicBookPath: The path of the selected book
+		"""
+		if self._getBookTabIndex(comicBookPath) is None:
+			self.bookPreOpener.preOpenBook(comicBookPath)
+
+	def _getBookTabIndex(self, comicBookPath: str) -> Union[int, None]:
+		""":return: The index of the tab the provided book is opened in, or None if it isn't opened"""
 		for index in range(0, self.window.tabView.count()):
 			tabWidget = self.window.tabView.widget(index)
-			if not isinstance(tabWidget, BookDisplayParentWidget):
-				continue
-			if comicBookPath == tabWidget.controller.bookPath:
-				self.window.tabView.setCurrentIndex(index)
-				### HistoryStore.currentlySelectedBookPath = comicBookPath
-				return
+			if isinstance(tabWidget, BookDisplayParentWidget) and comicBookPath == tabWidget.controller.bookPath:
+				return index
+		return None
+
+	def loadComicBook(self, comicBookPath):
+		# Check if the requested book already exists, if so switch to it
+		bookTabIndex = self._getBookTabIndex(comicBookPath)
+		if bookTabIndex is not None:
+			self.window.tabView.setCurrentIndex(bookTabIndex)
+			return
+		# If the book is still being pre-opened, stop that, otherwise the book gets opened twice at the same time. If pre-opening finished, the book is in the closed book pool
+		self.bookPreOpener.cancel()
 		# Check if we need to open a new tab or replace a current one
 		if self.window.tabView.count() > 2 and not SettingsStore.getSettingValue(SettingsEnum.ALLOW_MULTIPLE_BOOKS):
 			# There's already a book open, and we can only have one opened book. Ask if we should close that one
@@ -194,7 +200,8 @@ class MainController:
 			bookDisplayWidget: BookDisplayParentWidget = self.window.tabView.widget(self.window.bookSelectionTabIndex + 1)
 			bookDisplayWidget.controller.closeBook(False)
 		displayIndex, displayWidget = self.window.addBookDisplayTab(comicBookPath, True)
-		displayWidget.controller.loadBook(comicBookPath)
+		# If the book was closed recently, it may still be in the closed book pool. Reuse it if so, that's a lot faster than loading it again
+		displayWidget.controller.loadBook(comicBookPath, BookPool.takeBook(comicBookPath))
 		### HistoryStore.currentlySelectedBookPath = comicBookPath
 		self.updateWindowTitle(comicBookPath)
 
@@ -240,4 +247,14 @@ class MainController:
 		self.window.tabView.tabBar().setVisible(setVisible)
 
 	def handleWindowClose(self):
-		HistoryStore.saveHistory()
+		self.bookPreOpener.cancel()
+		# Books still get closed after this, and the history view shouldn't be updated while the window is being destroyed
+		self.window.historyPanel.historyModel.close()
+		HistoryStore.close()
+		BookPool.clearPool()
+		self.coverThumbnailer.close()
+		ThumbnailStore.close()
+		DecodeWorkerPool.shutDown()
+		self.libraryScanner.close()
+		LibraryCatalog.close()
+		SettingsStore.close()
@@ -1,6 +1,6 @@
 import logging, time
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import List, Optional, Union
 
 from comicviewer.images import ImageUtils
 
@@ -38,9 +38,12 @@ class BaseFileOpener(ABC):
 		"""Get the highest index that's requestable from getImageBytesByIndex"""
 		return len(self.imageNames) - 1
 
-	def getImageBytesByIndex(self, index) -> bytes:
-		"""This method returns the image specified by the provided index, or throw an error if that index isn't available"""
-		return self._readFile(self.imageNames[index])
+	def getImageBytesByIndex(self, index) -> Union[bytes, memoryview]:
+		"""
+		This method returns the image specified by the provided index, or throw an error if that index isn't available
+		This can be a memoryview instead of bytes, if the opener can provide the image without copying it. Keep referencing it for as long as it's used
+		"""
+		return self._readFileWithoutCopying(self.imageNames[index])
 
 	def hasComicInfo(self) -> bool:
 		""":return: This method returns whether the opened file contains comic book info"""
@@ -63,3 +66,11 @@ class BaseFileOpener(ABC):
 		:return: The bytes of the file specified by the filename
 		"""
 		pass
+
+	def _readFileWithoutCopying(self, filename: str) -> Union[bytes, memoryview]:
+		"""
+		Return the file specified by the provided filename without making a copy of it, if the opener supports that. By default, this just reads the file
+		:param filename: The filename to load from the archive
+		:return: The bytes of the file, or a read-only memoryview of them
+		"""
+		return self._readFile(filename)
@@ -0,0 +1,86 @@
+import concurrent.futures, logging, threading, time
+from typing import Optional
+
+from PySide6.QtCore import QObject, Signal
+
+from comicviewer.files import FileOpenerFactory
+from comicviewer.files.BaseFileOpener import BaseFileOpener
+from comicviewer.files.ComicInfoParser import ComicInfoParser
+from comicviewer.images.ImageCacheHandler import ImageCacheHandler
+
+
+class BookLoader(QObject):
+	"""
+	Opens a book in stages in a background thread, so the UI stays responsive while large archives get listed, parsed and decoded
+	Each finished stage is reported through a signal. Once 'fileOpened' is emitted, the receiver owns the file opener and is responsible for closing it
+	"""
+	progressChanged = Signal(str)  # A human-readable description of the stage that's currently running
+	fileOpened = Signal(object)  # The BaseFileOpener of the book, with its file list read and sorted
+	comicInfoParsed = Signal(object)  # The ComicInfoParser for the book
+	firstPagesLoaded = Signal(object)  # The ImageCacheHandler for the book, with the start page(s) already decoded and cached
+	loadingFailed = Signal(str)  # The error message of the exception that stopped the loading
+
+	_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)  # Initialize as class variable so all book loaders share it. Separate from the image cache executor so opening books doesn't wait on page caching
+
+	def __init__(self, bookPath: str, startIndex: int):
+		"""
+		Create a loader for a book. Loading doesn't start until 'start()' is called, so connect the signals before that
+		:param bookPath: The path of the book to open
+		:param startIndex: The page index that will be displayed first, this image (and the image after it) will get decoded as part of the loading
+		"""
+		super().__init__()
+		self.bookPath = bookPath
+		self.startIndex = startIndex
+		self._isCancelled = threading.Event()
+		self._future: Optional[concurrent.futures.Future] = None
+
+	def start(self):
+		"""Start loading the book in the background"""
+		self._future = self._executor.submit(self._loadBook)
+
+	def cancel(self):
+		"""Stop loading the book. No more signals will be emitted by the loader after this, except ones that were already emitted but not yet delivered"""
+		self._isCancelled.set()
+		if self._future is not None:
+			self._future.cancel()
+
+	def isCancelled(self) -> bool:
+		""":return: True if loading was cancelled, False otherwise"""
+		return self._isCancelled.is_set()
+
+	def _loadBook(self):
+		startTime = time.perf_counter()
+		fileOpener: Optional[BaseFileOpener] = None
+		try:
+			self.progressChanged.emit("Opening book...")
+			fileOpener = FileOpenerFactory.getFileOpenerForFile(self.bookPath)
+			if self.isCancelled():
+				# The file opener hasn't been handed over yet, so we need to close it ourselves
+				fileOpener.close()
+				return
+			self.fileOpened.emit(fileOpener)
+			logging.debug(f"Opening '{self.bookPath}' took {time.perf_counter() - startTime:.4f} seconds")
+
+			self.progressChanged.emit(f"Reading book info ({fileOpener.getMaximumImageIndex() + 1} pages)...")
+			comicInfoParser = ComicInfoParser(fileOpener)
+			if self.isCancelled():
+				return
+			self.comicInfoParsed.emit(comicInfoParser)
+			logging.debug(f"Opening '{self.bookPath}' and parsing comic info took {time.perf_counter() - startTime:.4f} seconds")
+
+			self.progressChanged.emit("Loading page...")
+			imageCacheHandler = ImageCacheHandler(fileOpener)
+			# Decode the start page and the page after it, since it'll probably be shown next to the start page
+			startIndex = max(0, min(self.startIndex, fileOpener.getMaximumImageIndex()))
+			imageCacheHandler.preloadImages(*range(startIndex, min(startIndex + 1, fileOpener.getMaximumImageIndex()) + 1))
+			if self.isCancelled():
+				return
+			self.firstPagesLoaded.emit(imageCacheHandler)
+			logging.debug(f"Loading '{self.bookPath}' in the background took {time.perf_counter() - startTime:.4f} seconds")
+		except Exception as e:
+			# If loading was cancelled, the receiver may have closed the file opener while we were still using it, so an exception is expected then
+			if self.isCancelled():
+				logging.debug(f"Loading '{self.bookPath}' was cancelled, ignoring {type(e)} exception: {e}")
+				return
+			logging.exception(f"{type(e)} exception while loading book '{self.bookPath}': {e}")
+			self.loadingFailed.emit(f"{e} [{type(e)}]")
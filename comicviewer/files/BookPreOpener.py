@@ -0,0 +1,109 @@
+import logging, os, time
+from typing import Optional
+
+from PySide6.QtCore import QObject, QTimer
+
+from comicviewer.files import FileOpenerFactory
+from comicviewer.files.BaseFileOpener import BaseFileOpener
+from comicviewer.files.BookLoader import BookLoader
+from comicviewer.files.ComicInfoParser import ComicInfoParser
+from comicviewer.images.ImageCacheHandler import ImageCacheHandler
+from comicviewer.misc import BookPool, HistoryStore
+from comicviewer.settings.SettingsEnum import SettingsEnum
+from comicviewer.settings import SettingsStore
+
+_PRE_OPEN_DELAY = 250  # Milliseconds a book has to stay selected before it gets pre-opened, so moving through a list with the arrow keys doesn't start opening every book passed
+
+
+class BookPreOpener(QObject):
+	"""
+	Opens the book that's selected in the library or history in the background, before it's actually opened. The opened archive, comic info and the decoded stored page
+	get put in the closed book pool, so when the book is opened, it's taken from the pool and shows up almost instantly. Selecting another book cancels the pre-opening
+	"""
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._bookPath: Optional[str] = None
+		self._bookLoader: Optional[BookLoader] = None
+		self._fileOpener: Optional[BaseFileOpener] = None
+		self._comicInfoParser: Optional[ComicInfoParser] = None
+		self._startTime: float = 0
+		self._preOpenTimer = QTimer(self)
+		self._preOpenTimer.setSingleShot(True)
+		self._preOpenTimer.setInterval(_PRE_OPEN_DELAY)
+		self._preOpenTimer.timeout.connect(self._startPreOpening)
+
+	def preOpenBook(self, bookPath: str):
+		"""
+		Start opening the provided book in the background after a short delay, cancelling the pre-opening of the previously selected book
+		:param bookPath: The path of the book to pre-open
+		"""
+		if bookPath == self._bookPath:
+			return
+		self.cancel()
+		if not SettingsStore.getSettingValue(SettingsEnum.PRE_OPEN_SELECTED_BOOKS) or SettingsStore.getSettingValue(SettingsEnum.CLOSED_BOOK_POOL_SIZE) <= 0:
+			# Pre-opened books are handed over through the closed book pool, so without it there's nowhere to keep them
+			return
+		if not FileOpenerFactory.isFileSupported(bookPath) or not os.path.isfile(bookPath) or BookPool.hasBook(bookPath):
+			return
+		self._bookPath = bookPath
+		self._preOpenTimer.start()
+
+	def cancel(self):
+		"""Stop pre-opening the selected book. Should be called before a book gets opened, so the pre-opening doesn't compete with the actual opening"""
+		self._preOpenTimer.stop()
+		if self._bookLoader is not None:
+			self._bookLoader.cancel()
+			# The loader may already have handed over the opened file, and since the book isn't in the pool yet, nobody else is going to close it
+			if self._fileOpener is not None:
+				self._fileOpener.close()
+			logging.debug(f"Cancelled pre-opening '{self._bookPath}' after {time.perf_counter() - self._startTime:.4f} seconds")
+		self._reset()
+
+	def _reset(self):
+		self._bookPath = None
+		self._bookLoader = None
+		self._fileOpener = None
+		self._comicInfoParser = None
+
+	def _startPreOpening(self):
+		if self._bookPath is None or BookPool.hasBook(self._bookPath):
+			return
+		self._startTime = time.perf_counter()
+		self._bookLoader = BookLoader(self._bookPath, HistoryStore.getStoredPage(self._bookPath))
+		self._bookLoader.fileOpened.connect(self._onBookFileOpened)
+		self._bookLoader.comicInfoParsed.connect(self._onComicInfoParsed)
+		self._bookLoader.firstPagesLoaded.connect(self._onFirstPagesLoaded)
+		self._bookLoader.loadingFailed.connect(self._onBookLoadingFailed)
+		self._bookLoader.start()
+
+	def _isSignalFromCurrentLoader(self) -> bool:
+		"""Signals from the book loader are delivered asynchronously, so they can arrive after pre-opening was cancelled. This checks if that happened"""
+		return self._bookLoader is not None and self.sender() is self._bookLoader
+
+	def _onBookFileOpened(self, fileOpener: BaseFileOpener):
+		if not self._isSignalFromCurrentLoader():
+			fileOpener.close()
+			return
+		self._fileOpener = fileOpener
+
+	def _onComicInfoParsed(self, comicInfoParser: ComicInfoParser):
+		if self._isSignalFromCurrentLoader():
+			self._comicInfoParser = comicInfoParser
+
+	def _onFirstPagesLoaded(self, imageCacheHandler: ImageCacheHandler):
+		if not self._isSignalFromCurrentLoader():
+			imageCacheHandler.trimCache()
+			return
+		# Keep the pages the loader decoded, those are the ones that get shown first when the book is opened
+		startIndex = max(0, min(self._bookLoader.startIndex, self._fileOpener.getMaximumImageIndex()))
+		BookPool.storeClosedBook(self._fileOpener, self._comicInfoParser, imageCacheHandler, range(startIndex, startIndex + 2))
+		logging.debug(f"Pre-opening '{self._bookPath}' took {time.perf_counter() - self._startTime:.4f} seconds")
+		self._reset()
+
+	def _onBookLoadingFailed(self, errorMessage: str):
+		if self._isSignalFromCurrentLoader():
+			# Don't show an error for a book that was only selected, opening it for real will show the error
+			logging.debug(f"Pre-opening '{self._bookPath}' failed: {errorMessage}")
+			if self._fileOpener is not None:
+				self._fileOpener.close()
+			self._reset()
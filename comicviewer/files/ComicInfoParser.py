@@ -1,5 +1,5 @@
 import io, logging, time
-from typing import Union
+from typing import Dict, Tuple, Union
 
 from lxml import etree
 
@@ -9,6 +9,10 @@ _fieldsToShow = ('Title', 'Series', 'Number', 'Year', 'Month', 'Volume', 'Summar
 				 'Writer', 'Penciller', 'Inker', 'Colorist', 'Letterer', 'CoverArtist', 'Editor', 'Publisher')
 
 
+def getFieldNames() -> Tuple[str, ...]:
+	""":return: The names of the comic info fields that get shown and stored, in display order"""
+	return _fieldsToShow
+
 class ComicInfoParser:
 	def __init__(self, fileOpener: BaseFileOpener):
 		self._fileOpener = fileOpener
@@ -40,6 +44,26 @@ class ComicInfoParser:
 		logging.debug(f"Loading comic info took {time.perf_counter() - startTime:.6f} seconds")
 		return "\n".join(comicInfoLines)
 
+	def getFieldValues(self) -> Dict[str, str]:
+		""":return: The comic info fields that have a value, with the field name as key. Empty if there is no comic info"""
+		if self._xmlRoot is None:
+			return {}
+		fieldValues = {}
+		for fieldName in _fieldsToShow:
+			fieldText = self._xmlRoot.findtext(fieldName)
+			if fieldText:
+				fieldValues[fieldName] = fieldText
+		return fieldValues
+
+	def getFrontCoverIndex(self) -> int:
+		""":return: The index of the image the comic info marks as the front cover, or 0 if it doesn't mark one"""
+		if self._xmlRoot is None:
+			return 0
+		pageTag = self._xmlRoot.find('//Page[@Type="FrontCover"]')
+		if pageTag is not None and pageTag.attrib.get('Image', '').isdigit():
+			return int(pageTag.attrib['Image'], 10)
+		return 0
+
 	def canImageBeDoublePage(self, index) -> Union[bool, None]:
 		"""
 		Checks the comic info to see if the provided imae should be shown on its own, or if it can be shown next to another page
@@ -1,14 +1,34 @@
-import zipfile
-from typing import List
+import logging, mmap, struct, zipfile
+from typing import List, Union
 
 from comicviewer.files.BaseFileOpener import BaseFileOpener
 
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+_LOCAL_HEADER_SIZE = 30
+_LOCAL_HEADER_NAME_LENGTHS_OFFSET = 26  # The filename length and the extra field length are the last two fields of the local file header
+
 
 class ZipFileOpener(BaseFileOpener):
 	SUPPORTED_EXTENSIONS = ('.zip', '.cbz')
 
 	def open(self):
 		self.file = zipfile.ZipFile(self.filepath, 'r')
+		# Images in comic archives are usually stored without compression, since they're already compressed. Mapping the archive into memory allows returning those images without reading and copying them
+		try:
+			self._mappedFile = mmap.mmap(self.file.fp.fileno(), 0, access=mmap.ACCESS_READ)
+		except (OSError, ValueError) as e:
+			logging.debug(f"Unable to memory-map '{self.filepath}', reading images normally: {e}")
+			self._mappedFile = None
+
+	def close(self):
+		super().close()
+		if self._mappedFile is not None:
+			try:
+				self._mappedFile.close()
+			except BufferError:
+				# Images that are still in use reference the mapped file. The mapping gets closed when the last of those is released
+				pass
+			self._mappedFile = None
 
 	def _getFileList(self) -> List[str]:
 		return self.file.namelist()
@@ -16,3 +36,20 @@ class ZipFileOpener(BaseFileOpener):
 	def _readFile(self, filename: str) -> bytes:
 		with self.file.open(filename) as f:
 			return f.read()
+
+	def _readFileWithoutCopying(self, filename: str) -> Union[bytes, memoryview]:
+		mappedFile = self._mappedFile
+		fileInfo = self.file.getinfo(filename)
+		# Compressed and encrypted files need to be unpacked, so those can't be returned as they are stored
+		if mappedFile is None or fileInfo.compress_type != zipfile.ZIP_STORED or fileInfo.flag_bits & 0x1:
+			return self._readFile(filename)
+		headerStart = fileInfo.header_offset
+		if mappedFile[headerStart:headerStart + 4] != _LOCAL_HEADER_SIGNATURE:
+			return self._readFile(filename)
+		# The local header can have a different extra field than the central directory entry, so its own lengths are needed to find where the data starts
+		filenameLength, extraFieldLength = struct.unpack_from('<HH', mappedFile, headerStart + _LOCAL_HEADER_NAME_LENGTHS_OFFSET)
+		dataStart = headerStart + _LOCAL_HEADER_SIZE + filenameLength + extraFieldLength
+		dataEnd = dataStart + fileInfo.file_size
+		if dataEnd > len(mappedFile):
+			return self._readFile(filename)
+		return memoryview(mappedFile)[dataStart:dataEnd]
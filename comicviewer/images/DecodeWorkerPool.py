@@ -0,0 +1,142 @@
+import concurrent.futures, logging, multiprocessing, os, threading, time
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from PySide6.QtGui import QImage
+
+from comicviewer.files import FileOpenerFactory
+from comicviewer.images import ImageUtils
+from comicviewer.images.decoders import ImageDecoderFactory
+from comicviewer.settings.SettingsEnum import SettingsEnum
+from comicviewer.settings import SettingsStore
+
+# Reads and decodes images in separate worker processes, so that work doesn't compete with the UI for Python's global interpreter lock
+# The decoded pixels are handed back through shared memory, and copied from there into an image owned by this process
+
+_MAX_OPENERS_PER_WORKER = 2  # How many books each worker keeps open, so the archive doesn't have to be opened again for every page
+_HANDOFF_TIMEOUT = 30  # Seconds a worker keeps shared memory open on Windows, where it disappears once no process has it open anymore
+
+# The display formats images can be in, by name, since Qt's enums can't be sent to other processes
+_IMAGE_FORMATS = {'RGB32': QImage.Format_RGB32, 'ARGB32_Premultiplied': QImage.Format_ARGB32_Premultiplied, 'Grayscale8': QImage.Format_Grayscale8}
+
+_processPool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+_processPoolLock = threading.Lock()
+_isProcessPoolBroken = False  # Set if a worker process crashed or couldn't be started, after which images get decoded in this process again
+
+# Only used inside the worker processes
+_workerFileOpeners = OrderedDict()
+_workerPendingHandoffs: List[Tuple[float, shared_memory.SharedMemory]] = []
+
+
+def isEnabled() -> bool:
+	""":return: True if images should be decoded in worker processes, False if they should be decoded in this process"""
+	return SettingsStore.getSettings().DECODE_IN_WORKER_PROCESSES and not _isProcessPoolBroken
+
+def decodeImage(bookPath: str, index: int) -> Optional[QImage]:
+	"""
+	Read and decode an image in a worker process. This blocks until the image is decoded, so it should be called from a background thread
+	:param bookPath: The path to the book the image is in
+	:param index: The index of the image in the book
+	:return: The decoded image, in the display format. None if the worker processes can't be used, in which case the caller should decode the image itself
+	:raise ValueError: Raised when the image can't be decoded
+	"""
+	global _isProcessPoolBroken
+	startTime = time.perf_counter()
+	try:
+		# Worker processes get started when the first image is submitted, so this fails if they can't be started
+		imageFuture = _getProcessPool().submit(_decodeImageInWorker, bookPath, index, SettingsStore.getSettings().STORE_GRAYSCALE_PAGES_COMPACTLY,
+											   ImageDecoderFactory.getFastestDecoderNames())
+	except RuntimeError:
+		# The worker processes got shut down in the meantime, because of a settings change or because the program is closing
+		return None
+	except OSError as e:
+		logging.error(f"Starting the decoding worker processes failed with {type(e)} exception, decoding in this process from now on: {e}")
+		_isProcessPoolBroken = True
+		return None
+	try:
+		# Reading and decoding errors in the worker get raised here too, just like they would be when decoding in this process
+		sharedMemoryName, width, height, bytesPerLine, imageFormatName = imageFuture.result()
+	except concurrent.futures.CancelledError:
+		return None
+	except BrokenProcessPool as e:
+		logging.error(f"A decoding worker process crashed, decoding in this process from now on: {e}")
+		_isProcessPoolBroken = True
+		shutDown()
+		return None
+	try:
+		image = _wrapSharedMemory(sharedMemoryName, width, height, bytesPerLine, imageFormatName)
+	except OSError as e:
+		# This can happen on Windows if it took too long to get here, and the worker already released the memory
+		logging.warning(f"Unable to use the shared memory with image {index} from the worker process, decoding it in this process: {e}")
+		return None
+	logging.debug(f"Decoding image {index} in a worker process took {time.perf_counter() - startTime:.4f} seconds")
+	return image
+
+def shutDown():
+	"""Stop the worker processes. They get started again when needed. Should be called when closing, or when the worker settings change"""
+	global _processPool
+	with _processPoolLock:
+		if _processPool is not None:
+			_processPool.shutdown(wait=False, cancel_futures=True)
+			_processPool = None
+
+def _onSettingsChanged(settings: SettingsStore.SettingsSnapshot, changedSettings: FrozenSet[SettingsEnum]):
+	"""Called when the worker process settings change. Restarts the worker processes with the new settings, and tries using them again if they failed before"""
+	global _isProcessPoolBroken
+	_isProcessPoolBroken = False
+	shutDown()
+
+def _getProcessPool() -> concurrent.futures.ProcessPoolExecutor:
+	global _processPool
+	with _processPoolLock:
+		if _processPool is None:
+			# Always spawn new processes instead of forking this one, since a forked copy of a running Qt program isn't safe to use
+			_processPool = concurrent.futures.ProcessPoolExecutor(max_workers=max(1, SettingsStore.getSettingValue(SettingsEnum.DECODE_WORKER_PROCESS_COUNT)),
+																  mp_context=multiprocessing.get_context('spawn'))
+		return _processPool
+
+def _wrapSharedMemory(sharedMemoryName: str, width: int, height: int, bytesPerLine: int, imageFormatName: str) -> QImage:
+	sharedMemory = shared_memory.SharedMemory(sharedMemoryName)
+	try:
+		if os.name != 'nt':
+			# Remove the name, so the memory gets freed once it's closed. On Windows that happens automatically
+			sharedMemory.unlink()
+		# An image made from the shared memory doesn't keep the memory mapped, it only gets a pointer to it, so it would point to unmapped memory once the memory gets closed
+		# Copying the pixels once costs a few milliseconds for a large page, which is still far less than decoding the page in this process
+		sharedImage = QImage(sharedMemory.buf, width, height, bytesPerLine, _IMAGE_FORMATS[imageFormatName])
+		image = sharedImage.copy()
+		del sharedImage
+	finally:
+		sharedMemory.close()
+	return image
+
+def _decodeImageInWorker(bookPath: str, index: int, shouldAllowGrayscale: bool, fastestDecoderNames: Dict[str, str]) -> Tuple[str, int, int, int, str]:
+	"""
+	Runs in a worker process. Read and decode an image, and put the decoded pixels in shared memory
+	:return: A tuple with the name of the shared memory, the width, height, and bytes per line of the image, and the name of the image format
+	"""
+	ImageDecoderFactory.setFastestDecoderNames(fastestDecoderNames)
+	fileOpener = _workerFileOpeners.pop(bookPath, None)
+	if fileOpener is None:
+		fileOpener = FileOpenerFactory.getFileOpenerForFile(bookPath)
+	# Keep the most recently used opener last, and close the least recently used ones
+	_workerFileOpeners[bookPath] = fileOpener
+	while len(_workerFileOpeners) > _MAX_OPENERS_PER_WORKER:
+		_workerFileOpeners.popitem(last=False)[1].close()
+	image = ImageUtils.convertBytesToImage(fileOpener.getImageBytesByIndex(index), shouldAllowGrayscale)
+	imageFormatName = next(formatName for formatName, imageFormat in _IMAGE_FORMATS.items() if imageFormat == image.format())
+	sharedMemory = shared_memory.SharedMemory(create=True, size=image.sizeInBytes())
+	sharedMemory.buf[:image.sizeInBytes()] = image.constBits()
+	if os.name == 'nt':
+		# Windows frees shared memory as soon as no process has it open anymore, so keep it open until the main process has had time to open it too
+		_workerPendingHandoffs.append((time.monotonic(), sharedMemory))
+		while _workerPendingHandoffs and time.monotonic() - _workerPendingHandoffs[0][0] > _HANDOFF_TIMEOUT:
+			_workerPendingHandoffs.pop(0)[1].close()
+	else:
+		sharedMemory.close()
+	return sharedMemory.name, image.width(), image.height(), image.bytesPerLine(), imageFormatName
+
+
+SettingsStore.registerSettingsChangeListener(_onSettingsChanged, SettingsEnum.DECODE_IN_WORKER_PROCESSES, SettingsEnum.DECODE_WORKER_PROCESS_COUNT)
@@ -1,17 +1,31 @@
-import concurrent.futures, logging, time
-from typing import Dict, List
+import concurrent.futures, logging, os, threading, time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
 
+from PySide6.QtCore import QSize, Qt
 from PySide6.QtGui import QImage
 
 from comicviewer.files.BaseFileOpener import BaseFileOpener
-from comicviewer.images import ImageUtils
-from comicviewer.settings.SettingsEnum import SettingsEnum
+from comicviewer.images import DecodeWorkerPool, ImageUtils
+from comicviewer.images.ImageLoadingPipeline import ImageLoadingPipeline, PipelineStageStatistics
 from comicviewer.settings import SettingsStore
 
+_PREVIEW_SIZE = 320  # The maximum width and height of preview images, in pixels
+_MAX_PREVIEW_COUNT = 64  # How many preview images are kept per book. They're small, so they can be kept well beyond the normal cache range
+
 
 class ImageCacheHandler:
 
-	_executor = concurrent.futures.ThreadPoolExecutor()  # Initialize as class variable so all cache handles share it
+	_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)  # Initialize as class variable so all cache handles share it. Only figures out what to load, the loading itself happens in the pipeline
+	_priorityExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=2)  # Loads previews of images that need to be displayed right now, so they don't have to wait for the background caching
+	# Loads the full images, shared by all cache handlers. Reading is mostly waiting on the disk, so it gets few threads. The other stages need the processor, so they get as many as there are cores
+	# The queues are kept short, because they hold the compressed and decoded images that are waiting for the next stage
+	_pipeline = ImageLoadingPipeline((
+		('Read', 2, 0),
+		('Decode', os.cpu_count() or 1, 2 * (os.cpu_count() or 1)),
+		('Convert', max(1, (os.cpu_count() or 1) // 2), 2),
+		('Store', 1, 2),  # Stores the image in the cache of its book, and makes a preview of it
+	))
 
 	def __init__(self, fileOpener: BaseFileOpener):
 		"""
@@ -21,50 +35,147 @@ class ImageCacheHandler:
 		self._fileOpener: BaseFileOpener = fileOpener
 		self._imageCache: Dict[int, QImage] = {}
 		self._indexesBeingLoaded: Dict[int, concurrent.futures.Future] = {}
+		self._previewCache: Dict[int, QImage] = OrderedDict()  # Small versions of the images, shown while the full image is being loaded. The last entry is the most recently used
+		self._previewCacheLock = threading.Lock()
+		self._indexesBeingPreviewed: Dict[int, concurrent.futures.Future] = {}
+		self._imageSizes: Dict[int, QSize] = {}  # The full size of each image we know the size of, even if it's not cached
+		self._onImageLoaded: Optional[Callable[[int, bool], None]] = None
+		self._onImageLoadingFailed: Optional[Callable[[int, str], None]] = None
+
+	def setImageLoadedCallbacks(self, onImageLoaded: Optional[Callable[[int, bool], None]], onImageLoadingFailed: Optional[Callable[[int, str], None]]):
+		"""
+		Set the functions to call when an image is done loading in the background. These get called from a background thread
+		:param onImageLoaded: Called with the index of the loaded image, and a boolean that's True if only the preview was loaded, and False if the full image was loaded. Can be None to not get notified
+		:param onImageLoadingFailed: Called with the index of the image that couldn't be loaded, and the error message. Can be None to not get notified
+		"""
+		self._onImageLoaded = onImageLoaded
+		self._onImageLoadingFailed = onImageLoadingFailed
 
-	def retrieveImages(self, *indexes: int) -> List[QImage]:
+	def retrieveImages(self, *indexes: int, shouldUpdateCache: bool = True) -> Tuple[List[QImage], bool]:
 		"""
-		Get the images for the provided indexes. Also caches ahead 'cacheRange' number of pages in the background
-		:param indexes: The indexes to load, either from the cache if they're there or loaded from disk and stored in the cache
-		:return: The images for the provided indexes
+		Get the images for the provided indexes, without waiting for images that aren't loaded yet. Also caches ahead 'cacheRange' number of pages in the background
+		If an image isn't cached, its preview is returned instead, or a placeholder image if there's no preview yet. The full image then gets loaded in the background,
+		and the image loaded callback gets called when the preview and the full image are ready
+		:param indexes: The indexes to retrieve
+		:param shouldUpdateCache: Whether to update the cache around the provided indexes. Set to False if the caller updates the cache itself, with 'updateCacheInBackground'
+		:return: A tuple with the (preview or placeholder) images for the provided indexes, and a boolean that's True if all the returned images are full images, and False if there are previews or placeholders among them
 		"""
 		images = []
+		areAllImagesFull = True
 		for index in indexes:
-			images.append(self._getImage(index))
-		# Update cache in a thread so we can return the images ASAP
-		self._executor.submit(self.updateCache, *indexes)
+			image = self._imageCache.get(index, None)
+			if image is None:
+				areAllImagesFull = False
+				image = self._getPreviewImage(index)
+				if image is None:
+					self._loadPreviewWithPriority(index)
+					image = ImageUtils.createPlaceholderImage()
+				self._loadImageWithPriority(index)
+			images.append(image)
+		if shouldUpdateCache:
+			self.updateCacheInBackground(*indexes)
+		return images, areAllImagesFull
+
+	def getCachedImages(self, *indexes: int) -> Optional[List[QImage]]:
+		"""
+		Get the images for the provided indexes, but only if they're all cached. This never loads images
+		:param indexes: The indexes of the images to get
+		:return: The images if they're all cached, or None if one or more of them aren't cached
+		"""
+		images = []
+		for index in indexes:
+			image = self._imageCache.get(index, None)
+			if image is None:
+				return None
+			images.append(image)
 		return images
 
+	def preloadImages(self, *indexes: int):
+		"""
+		Load the images for the provided indexes into the cache, without updating the rest of the cache. This blocks until the images are loaded, so it should be called from a background thread
+		:param indexes: The indexes of the images to load
+		"""
+		for index in indexes:
+			self._getImage(index)
+
+	def updateCacheInBackground(self, *indexes: int):
+		"""
+		Update the cache around the provided indexes in a thread, so this returns immediately
+		:param indexes: The indexes to cache around. Images in between the lowest and highest index get cached too
+		"""
+		self._executor.submit(self.updateCache, *indexes)
+
 	def updateCache(self, *indexes: int):
 		startTime = time.perf_counter()
 		self._unchacheDistantImages(*indexes)
 		self._cacheNearbyImages(*indexes)
 		logging.debug(f"Updating cache based on indexes {indexes} took {time.perf_counter() - startTime:.4f} seconds")
+		self._pipeline.logStatistics()
+
+	@classmethod
+	def getLoadingStatistics(cls) -> List[PipelineStageStatistics]:
+		""":return: How busy each stage of the image loading pipeline is, and how long its work takes. The pipeline is shared by all cache handlers"""
+		return cls._pipeline.getStatistics()
+
+	def trimCache(self, *indexesToKeep: int):
+		"""
+		Stop any background image loading, and remove all images from the cache except for the provided indexes
+		:param indexesToKeep: The indexes of the images that should stay cached. If none are provided, the entire cache is cleared
+		"""
+		for loadingDict in (self._indexesBeingLoaded, self._indexesBeingPreviewed):
+			for index, future in list(loadingDict.items()):
+				if future.cancel():
+					loadingDict.pop(index, None)
+		for index in list(self._imageCache.keys()):
+			if index not in indexesToKeep:
+				self._imageCache.pop(index, None)
+		with self._previewCacheLock:
+			for index in list(self._previewCache.keys()):
+				if index not in indexesToKeep:
+					self._previewCache.pop(index, None)
+
+	def getMemoryUsage(self) -> int:
+		""":return: How many bytes the currently cached images and previews take up"""
+		with self._previewCacheLock:
+			previewMemoryUsage = sum(image.sizeInBytes() for image in self._previewCache.values())
+		return previewMemoryUsage + sum(image.sizeInBytes() for image in list(self._imageCache.values()))
+
+	def getKnownImageSize(self, index: int) -> Optional[QSize]:
+		"""
+		Get the full size of the image at the provided index, but only if it's already known. This never reads from the book file, so it's always fast
+		Sizes become known when the preview or the full image is loaded in the background
+		:param index: The index of the image to get the size of
+		:return: The size of the image, or None if it's not known yet
+		"""
+		return self._imageSizes.get(index, None)
 
 	def isImageTwoPageSpread(self, index: int) -> bool:
 		"""
-		Checks whether the image at the provided index is a two-page spread
+		Checks whether the image at the provided index is a two-page spread. This never reads from the book file, so it can be called from the UI thread
+		If the size of the image isn't known yet, its preview gets loaded in the background, which also stores its size. The image loaded callback gets called when that's done
 		:param index: The image index to check
-		:return: True if the image is a two-page spread, False otherwise
+		:return: True if the image is a two-page spread, False if it's not or if its size isn't known yet
 		"""
-		image = self._getImage(index)
-		return image.width() > image.height()
+		imageSize = self._imageSizes.get(index, None)
+		if imageSize is None:
+			self._loadPreviewWithPriority(index)
+			return False
+		return imageSize.width() > imageSize.height()
 
 	def _getImage(self, index):
 		if index not in self._imageCache:
-			# Check if the image is already being loaded. If it is, wait until it's done, otherwise load it ourselves
+			# Check if the image is already being loaded. If it is, try to cancel that and load it ourselves, otherwise wait for it
 			# Use .get() instead of 'if index in indexesBeingLoaded: future = indexesBeingLoaded[index]' because 'get' is atomic, prevents race condition
 			future = self._indexesBeingLoaded.get(index, None)
 			if future is not None:
-				# Image is being loaded, try to cancel it and do it in the main thread
 				startTime = time.perf_counter()
-				wasCancelled = future.cancel()
-				if wasCancelled:
-					# Future was cancelled, load the image now
-					logging.debug(f"Cancelled loading index {index}, loading in main thread")
+				if future.cancel():
+					logging.debug(f"Cancelled loading index {index}, loading in current thread")
 					self._loadAndStoreImage(index)
 				else:
-					# Image loading couldn't be cancelled, probably because it's already running. Wait for it to complete
+					# The pipeline already started on it, so it can't be cancelled anymore. Decoding it here as well would double the work and the memory use,
+					# so wait for it instead. Promote it, so it doesn't have to wait behind the images of other books in the later stages
+					self._pipeline.promote(future)
 					future.result()
 					logging.debug(f"Index {index} not in cache, but it's already being loaded, waited {time.perf_counter() - startTime:.6f} seconds")
 			else:
@@ -72,10 +183,69 @@ class ImageCacheHandler:
 				self._loadAndStoreImage(index)
 		return self._imageCache[index]
 
+	def _isBeingLoaded(self, index: int) -> bool:
+		future = self._indexesBeingLoaded.get(index, None)
+		return future is not None and not future.done()
+
+	def _loadImageWithPriority(self, index: int):
+		"""Make sure the image at the provided index gets loaded as soon as possible, without blocking"""
+		future = self._indexesBeingLoaded.get(index, None)
+		if future is not None and not future.done() and not future.cancel():
+			# The image is already being loaded, the image loaded callback will get called when it's done. Make sure it doesn't have to wait behind other images
+			self._pipeline.promote(future)
+			return
+		logging.debug(f"Index {index} not in cache, loading with priority")
+		self._submitImageLoading(index, True)
+
+	def _loadPreviewWithPriority(self, index: int):
+		future = self._indexesBeingPreviewed.get(index, None)
+		if future is None or future.done():
+			self._indexesBeingPreviewed[index] = self._priorityExecutor.submit(self._loadAndStorePreviewImage, index)
+
+	def _getPreviewImage(self, index: int) -> Optional[QImage]:
+		with self._previewCacheLock:
+			previewImage = self._previewCache.get(index, None)
+			if previewImage is not None:
+				self._previewCache.move_to_end(index)
+			return previewImage
+
+	def _storePreviewImage(self, index: int, previewImage: QImage):
+		with self._previewCacheLock:
+			self._previewCache[index] = previewImage
+			self._previewCache.move_to_end(index)
+			while len(self._previewCache) > _MAX_PREVIEW_COUNT:
+				self._previewCache.popitem(last=False)
+
+	def _getCacheAheadCount(self, *indexes: int) -> int:
+		"""
+		Get how many images ahead of the provided indexes should be cached. This is at least the 'Cache Ahead Count' setting, but grayscale images take less memory, so more of those are cached:
+		Without a cache memory budget, as many images as fit in the memory that 'Cache Ahead Count' colour images would take up. With a budget, as many as fit in the budget,
+		based on the average size of the currently cached images
+		:param indexes: The indexes the cache is centered on
+		:return: How many images ahead to cache
+		"""
+		settings = SettingsStore.getSettings()
+		cacheAheadCount = settings.CACHE_AHEAD_COUNT
+		memoryBudget = settings.CACHE_MEMORY_BUDGET * 1048576  # Setting is in megabytes, convert to bytes
+		cachedImages = list(self._imageCache.values())
+		if not cachedImages:
+			return cacheAheadCount
+		# Grayscale images take less memory, so a book with mostly black-and-white pages gets more pages cached
+		cachedMemoryUsage = sum(image.sizeInBytes() for image in cachedImages)
+		if memoryBudget <= 0:
+			# Colour images are stored with 4 bytes per pixel, so this is how much memory the cached images would take up if they were all in colour
+			colourMemoryUsage = sum(image.width() * image.height() * 4 for image in cachedImages)
+			return max(cacheAheadCount, int(cacheAheadCount * colourMemoryUsage / max(1, cachedMemoryUsage)))
+		averageImageMemoryUsage = cachedMemoryUsage / len(cachedImages)
+		imagesInBudget = int(memoryBudget / max(1.0, averageImageMemoryUsage))
+		rangeCount = max(indexes) - min(indexes) + 1
+		return max(cacheAheadCount, imagesInBudget - rangeCount - settings.CACHE_BEHIND_COUNT)
+
 	def _unchacheDistantImages(self, *indexes: int):
-		uncacheExtraRange = SettingsStore.getSettingValue(SettingsEnum.UNCACHE_EXTRA_RANGE)
-		lowestIndexToKeep = min(indexes) - SettingsStore.getSettingValue(SettingsEnum.CACHE_BEHIND_COUNT) - uncacheExtraRange
-		highestIndexToKeep = max(indexes) + SettingsStore.getSettingValue(SettingsEnum.CACHE_AHEAD_COUNT) + uncacheExtraRange
+		settings = SettingsStore.getSettings()
+		uncacheExtraRange = settings.UNCACHE_EXTRA_RANGE
+		lowestIndexToKeep = min(indexes) - settings.CACHE_BEHIND_COUNT - uncacheExtraRange
+		highestIndexToKeep = max(indexes) + self._getCacheAheadCount(*indexes) + uncacheExtraRange
 		logging.debug(f"Uncaching below index {lowestIndexToKeep} and above index {highestIndexToKeep}")
 		# Find the indexes to remove
 		for index in list(self._imageCache.keys()):
@@ -84,19 +254,94 @@ class ImageCacheHandler:
 				self._imageCache.pop(index, None)
 
 	def _cacheNearbyImages(self, *indexes: int):
-		minIndex = max(min(indexes) - SettingsStore.getSettingValue(SettingsEnum.CACHE_BEHIND_COUNT), 0)
-		maxIndex = min(max(indexes) + SettingsStore.getSettingValue(SettingsEnum.CACHE_AHEAD_COUNT), self._fileOpener.getMaximumImageIndex())
+		minIndex = max(min(indexes) - SettingsStore.getSettings().CACHE_BEHIND_COUNT, 0)
+		maxIndex = min(max(indexes) + self._getCacheAheadCount(*indexes), self._fileOpener.getMaximumImageIndex())
 		logging.debug(f"Caching from {minIndex} to {maxIndex}")
 		cacheStartTime = time.perf_counter()
 		for cacheIndex in range(minIndex, maxIndex + 1):  # 'maxIndex + 1' because range's endpoint is not inclusive
 			# Only load the image if we don't already have it loaded and if we're not already loading it
-			if cacheIndex not in self._imageCache and cacheIndex not in self._indexesBeingLoaded:
-				self._indexesBeingLoaded[cacheIndex] = self._executor.submit(self._loadAndStoreImage, cacheIndex, cacheStartTime)
+			if cacheIndex not in self._imageCache and not self._isBeingLoaded(cacheIndex):
+				self._submitImageLoading(cacheIndex, False)
 		logging.debug(f"Setting up image cache ahead took {time.perf_counter() - cacheStartTime:.4f} seconds")
 
-	def _loadAndStoreImage(self, index, cacheStartTime=None):
-		# startTime = time.perf_counter()
-		self._imageCache[index] = ImageUtils.convertBytesToImage(self._fileOpener.getImageBytesByIndex(index))
-		# Clear this from the 'being updated' list. Use 'pop' instead of 'del' because the index might not be in the list if this wasn't called from a thread
-		self._indexesBeingLoaded.pop(index, None)
-		# logging.debug(f"Loading and storing image index {index} took {time.perf_counter() - startTime:.4f} seconds, {(time.perf_counter() - cacheStartTime) if cacheStartTime else 0:.4f} seconds after cache start")
+	def _submitImageLoading(self, index: int, isPriority: bool):
+		"""Load the image at the provided index through the pipeline. Each of the stage functions does one step of '_loadAndStoreImage'"""
+		future = self._pipeline.submit((lambda _: self._readImageBytes(index),
+										lambda imageBytes: self._decodeImage(index, imageBytes),
+										self._convertImage,
+										lambda image: self._storeImage(index, image)), index, isPriority)
+		self._indexesBeingLoaded[index] = future
+		future.add_done_callback(lambda doneFuture: self._onImageLoadingDone(index, doneFuture))
+
+	def _onImageLoadingDone(self, index: int, future: concurrent.futures.Future):
+		# Only clear this from the 'being loaded' list if it wasn't replaced by a newer load, like a priority load
+		if self._indexesBeingLoaded.get(index, None) is future:
+			self._indexesBeingLoaded.pop(index, None)
+		if not future.cancelled() and future.exception() is not None:
+			self._reportLoadingFailure(index, future.exception())
+
+	def _loadAndStoreImage(self, index):
+		"""Load and store the image at the provided index in the current thread, going through the same steps as the pipeline does"""
+		try:
+			self._storeImage(index, self._convertImage(self._decodeImage(index, self._readImageBytes(index))))
+		except Exception as e:
+			self._reportLoadingFailure(index, e)
+			raise
+		finally:
+			# Clear this from the 'being updated' list. Use 'pop' instead of 'del' because the index might not be in the list if this wasn't called from a thread
+			self._indexesBeingLoaded.pop(index, None)
+
+	def _readImageBytes(self, index: int) -> Optional[ImageUtils.ImageBytes]:
+		""":return: The bytes of the image at the provided index, or None if the image gets decoded in a worker process, which reads the image itself"""
+		if DecodeWorkerPool.isEnabled():
+			return None
+		return self._fileOpener.getImageBytesByIndex(index)
+
+	def _decodeImage(self, index: int, imageBytes: Optional[ImageUtils.ImageBytes]) -> Tuple[QImage, bool]:
+		""":return: A tuple with the decoded image, and a boolean that's True if it's already in the display format"""
+		if imageBytes is None:
+			image = DecodeWorkerPool.decodeImage(self._fileOpener.filepath, index)
+			if image is not None:
+				return image, True
+			# The worker processes can't be used, so decode the image here after all
+			imageBytes = self._fileOpener.getImageBytesByIndex(index)
+		return ImageUtils.decodeImageBytes(imageBytes), False
+
+	@staticmethod
+	def _convertImage(imageAndIsConverted: Tuple[QImage, bool]) -> QImage:
+		image, isConverted = imageAndIsConverted
+		if isConverted:
+			return image
+		return ImageUtils.convertToDisplayFormat(image, SettingsStore.getSettings().STORE_GRAYSCALE_PAGES_COMPACTLY)
+
+	def _storeImage(self, index: int, image: QImage):
+		self._imageCache[index] = image
+		self._imageSizes[index] = image.size()
+		# Since we have the full image now, making a preview is cheap. Store it, so it can be shown if this image gets uncached and requested again later
+		if self._getPreviewImage(index) is None:
+			self._storePreviewImage(index, image.scaled(_PREVIEW_SIZE, _PREVIEW_SIZE, Qt.KeepAspectRatio, Qt.FastTransformation))
+		if self._onImageLoaded:
+			self._onImageLoaded(index, False)
+
+	def _reportLoadingFailure(self, index: int, exception: BaseException):
+		logging.error(f"{type(exception)} exception while loading image index {index}: {exception}")
+		if self._onImageLoadingFailed:
+			self._onImageLoadingFailed(index, f"{exception} [{type(exception)}]")
+
+	def _loadAndStorePreviewImage(self, index):
+		try:
+			if index in self._imageCache:
+				# The full image finished loading before we got to the preview, so it's not needed anymore
+				return
+			previewImage, fullImageSize = ImageUtils.convertBytesToPreviewImage(self._fileOpener.getImageBytesByIndex(index), _PREVIEW_SIZE)
+		except Exception as e:
+			# Loading the full image will probably fail too, and that reports the error, so just log it here
+			logging.debug(f"{type(e)} exception while loading preview for image index {index}: {e}")
+			return
+		finally:
+			self._indexesBeingPreviewed.pop(index, None)
+		self._imageSizes[index] = fullImageSize
+		self._storePreviewImage(index, previewImage)
+		# If the full image got loaded in the meantime, the preview is outdated already, so there's no need to report it
+		if self._onImageLoaded and index not in self._imageCache:
+			self._onImageLoaded(index, True)
@@ -0,0 +1,157 @@
+import concurrent.futures, heapq, itertools, logging, queue, threading, time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+class PipelineStageStatistics:
+	"""A snapshot of how busy a pipeline stage is, and how long its work takes"""
+	def __init__(self, name: str, workerCount: int, queueDepth: int, maxQueueSize: int, processedCount: int, averageWaitTime: float, averageProcessingTime: float, maxProcessingTime: float):
+		self.name = name
+		self.workerCount = workerCount
+		self.queueDepth = queueDepth  # How many jobs are waiting for this stage right now
+		self.maxQueueSize = maxQueueSize  # How many jobs can wait for this stage before the previous stage has to wait. 0 means unlimited
+		self.processedCount = processedCount
+		self.averageWaitTime = averageWaitTime  # Average seconds a job waited in the queue before this stage started on it
+		self.averageProcessingTime = averageProcessingTime  # Average seconds this stage took per job
+		self.maxProcessingTime = maxProcessingTime
+
+	def __str__(self):
+		return f"{self.name}: {self.queueDepth}/{self.maxQueueSize or '-'} queued, {self.processedCount} done, " \
+			f"waited {self.averageWaitTime * 1000:.1f} ms, took {self.averageProcessingTime * 1000:.1f} ms on average ({self.maxProcessingTime * 1000:.1f} ms max)"
+
+
+class _PipelineJob:
+	def __init__(self, stageFunctions: Sequence[Callable[[Any], Any]], value: Any, isPriority: bool):
+		self.stageFunctions = stageFunctions
+		self.value = value
+		self.isPriority = isPriority
+		self.future = concurrent.futures.Future()
+		self.enqueueTime = 0.0
+		self.waitingStage: Optional['_PipelineStage'] = None  # The stage whose queue this job is waiting in, or None if a stage is working on it
+		self.queueEntry: Optional[list] = None  # The entry of this job in the queue it's waiting in. A list, so its priority can be changed while it's queued
+
+
+class _PipelineStage:
+	def __init__(self, pipeline: 'ImageLoadingPipeline', stageIndex: int, name: str, workerCount: int, maxQueueSize: int):
+		self._pipeline = pipeline
+		self._stageIndex = stageIndex
+		self.name = name
+		self.workerCount = workerCount
+		self.maxQueueSize = maxQueueSize
+		# Priority jobs go before other jobs. The sequence number keeps jobs with the same priority in order, and makes sure jobs themselves never get compared
+		self._queue = queue.PriorityQueue(maxsize=maxQueueSize)
+		self._statisticsLock = threading.Lock()
+		self._processedCount = 0
+		self._totalWaitTime = 0.0
+		self._totalProcessingTime = 0.0
+		self._maxProcessingTime = 0.0
+		for workerIndex in range(workerCount):
+			threading.Thread(target=self._work, name=f"Pipeline{name}{workerIndex}", daemon=True).start()
+
+	def put(self, job: _PipelineJob):
+		"""Add a job to this stage. If this stage's queue is full, this blocks until there's room, which slows down the stage before it"""
+		job.enqueueTime = time.perf_counter()
+		job.queueEntry = [0 if job.isPriority else 1, next(self._pipeline.sequenceCounter), job]
+		job.waitingStage = self
+		self._queue.put(job.queueEntry)
+
+	def promote(self, job: _PipelineJob):
+		"""Move the provided job, if it's still waiting in this stage's queue, before the non-priority jobs in it"""
+		# The queue's own lock, so a worker can't take jobs out of the queue while it's being reordered
+		with self._queue.mutex:
+			if job.waitingStage is self and job.queueEntry[0] != 0:
+				job.queueEntry[0] = 0
+				heapq.heapify(self._queue.queue)
+
+	def getStatistics(self) -> PipelineStageStatistics:
+		with self._statisticsLock:
+			processedCount = self._processedCount
+			divisor = max(1, processedCount)
+			return PipelineStageStatistics(self.name, self.workerCount, self._queue.qsize(), self.maxQueueSize, processedCount,
+										   self._totalWaitTime / divisor, self._totalProcessingTime / divisor, self._maxProcessingTime)
+
+	def _work(self):
+		while True:
+			_, _, job = self._queue.get()
+			job.waitingStage = None
+			startTime = time.perf_counter()
+			waitTime = startTime - job.enqueueTime
+			# Jobs can be cancelled until the first stage starts on them, after that they have to finish
+			if self._stageIndex == 0 and not job.future.set_running_or_notify_cancel():
+				continue
+			try:
+				job.value = job.stageFunctions[self._stageIndex](job.value)
+			except Exception as e:
+				job.future.set_exception(e)
+				job = None
+			processingTime = time.perf_counter() - startTime
+			with self._statisticsLock:
+				self._processedCount += 1
+				self._totalWaitTime += waitTime
+				self._totalProcessingTime += processingTime
+				self._maxProcessingTime = max(self._maxProcessingTime, processingTime)
+			if job is not None:
+				self._pipeline.passToNextStage(self._stageIndex, job)
+
+
+class ImageLoadingPipeline:
+	"""
+	Runs jobs through a series of stages, like reading, decoding, and converting images. Each stage has its own worker threads, so slow disk reads don't take up threads
+	that could be decoding, and decoding doesn't hold up reading. Between stages are size-limited queues, so a fast stage can't run far ahead of a slower next stage
+	and fill memory with its results; it waits until the next stage catches up. The first stage's queue is unlimited, so submitting jobs never blocks
+	"""
+	def __init__(self, stageDefinitions: Sequence[Tuple[str, int, int]]):
+		"""
+		Create the pipeline and start its worker threads
+		:param stageDefinitions: For each stage, a tuple with its name, how many worker threads it gets, and how many jobs may wait in its queue (ignored for the first stage)
+		"""
+		self.sequenceCounter = itertools.count()
+		self._futureToJob: Dict[concurrent.futures.Future, _PipelineJob] = {}  # The jobs that aren't done yet, so they can be promoted
+		self._stages: List[_PipelineStage] = []
+		for stageIndex, (name, workerCount, maxQueueSize) in enumerate(stageDefinitions):
+			self._stages.append(_PipelineStage(self, stageIndex, name, max(1, workerCount), maxQueueSize if stageIndex > 0 else 0))
+
+	def submit(self, stageFunctions: Sequence[Callable[[Any], Any]], initialValue: Any, isPriority: bool = False) -> concurrent.futures.Future:
+		"""
+		Run a job through the pipeline
+		:param stageFunctions: A function per stage. Each gets called with what the previous stage's function returned, the first one with the initial value
+		:param initialValue: The value to pass to the first stage's function
+		:param isPriority: Priority jobs go before other waiting jobs in every stage
+		:return: A future that gets the result of the last stage's function, or the exception a stage raised. It can be cancelled until the first stage starts on it
+		"""
+		if len(stageFunctions) != len(self._stages):
+			raise ValueError(f"Expected {len(self._stages)} stage functions, got {len(stageFunctions)}")
+		job = _PipelineJob(stageFunctions, initialValue, isPriority)
+		self._futureToJob[job.future] = job
+		job.future.add_done_callback(lambda doneFuture: self._futureToJob.pop(doneFuture, None))
+		self._stages[0].put(job)
+		return job.future
+
+	def promote(self, future: concurrent.futures.Future) -> bool:
+		"""
+		Make a job that was already submitted a priority job, for instance because its result is needed right now. It then goes before the other jobs
+		in the queue it's waiting in, if any, and in the queues of the stages after that
+		:param future: The future that 'submit' returned for the job
+		:return: True if the job got promoted, False if it's already done
+		"""
+		job = self._futureToJob.get(future, None)
+		if job is None:
+			return False
+		job.isPriority = True
+		waitingStage = job.waitingStage
+		if waitingStage is not None:
+			waitingStage.promote(job)
+		return True
+
+	def passToNextStage(self, stageIndex: int, job: _PipelineJob):
+		if stageIndex + 1 < len(self._stages):
+			self._stages[stageIndex + 1].put(job)
+		else:
+			job.future.set_result(job.value)
+
+	def getStatistics(self) -> List[PipelineStageStatistics]:
+		""":return: The current statistics of each stage, in stage order"""
+		return [stage.getStatistics() for stage in self._stages]
+
+	def logStatistics(self):
+		if logging.getLogger().isEnabledFor(logging.DEBUG):
+			logging.debug("Image loading pipeline: " + " | ".join(str(stageStatistics) for stageStatistics in self.getStatistics()))
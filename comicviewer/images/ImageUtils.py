@@ -1,14 +1,22 @@
-import logging, time, os
-from typing import Iterable, Tuple
+import concurrent.futures, logging, math, time, os
+from typing import Any, Callable, Iterable, List, Tuple, Union
 
-from PySide6.QtCore import QByteArray
-from PySide6.QtGui import QImage
-from PySide6.QtGui import QImageReader
+from PySide6.QtCore import QRect, QSize, Qt
+from PySide6.QtGui import QColor, QImage, QPainter
 
-from comicviewer.settings.SettingsEnum import SettingsEnum
+from comicviewer.images.decoders import ImageDecoderFactory
+from comicviewer.images.decoders.BaseImageDecoder import BaseImageDecoder
 from comicviewer.settings import SettingsStore
 
-supportedImageFormats = ['.' + ext for ext in QImageReader.supportedImageFormats()]
+_GRAYSCALE_SAMPLE_SIZE = 96  # The width and height the image is scaled down to when checking whether it's grayscale
+_GRAYSCALE_TOLERANCE = 12  # How much the colour channels of a pixel can differ for it to still count as gray
+_PARALLEL_SCALING_MIN_PIXELS = 2_000_000  # Images smaller than this get scaled in one go, splitting them up costs more than it saves
+_MIN_STRIPE_HEIGHT = 64  # The minimum height of a scaled stripe, in pixels of the scaled image
+
+_scalingThreadCount = os.cpu_count() or 1
+_scalingExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=_scalingThreadCount, thread_name_prefix='ImageScaler')
+
+supportedImageFormats = ImageDecoderFactory.supportedExtensions  # All the formats that at least one of the available decoders can decode
 
 def isImageSupported(imagePath: str) -> bool:
 	"""
@@ -16,33 +24,184 @@ def isImageSupported(imagePath: str) -> bool:
 	:param imagePath: The path to the image to check
 	:return: True if the image can be loaded, False otherwise
 	"""
-	return os.path.splitext(imagePath)[1] in supportedImageFormats
+	return os.path.splitext(imagePath)[1].lower() in supportedImageFormats
+
+ImageBytes = Union[bytes, memoryview]  # What the file openers return for an image. A memoryview can point straight into a memory-mapped archive
 
-def convertBytesToImage(imageBytes: bytes) -> QImage:
+def convertBytesToImage(imageBytes: ImageBytes, shouldAllowGrayscale: bool = None) -> QImage:
 	"""
 	Converts the provided bytes from reading a file to an Image (not a Pixmap because those can only be made on the main thread)
+	The fastest available decoder for the image format is used, with the other decoders as fallback
 	:param imageBytes: The bytes from the image file
+	:param shouldAllowGrayscale: Whether black-and-white images may be stored as grayscale, see 'convertToDisplayFormat'. Taken from the settings if not provided
 	:return: The QImage
 	:raise ValueError: Raised when the provided bytes can't be loaded as an image
 	"""
 	startTime = time.perf_counter()
-	img = QImage()
-	imgLoadSuccessful = img.loadFromData(QByteArray(imageBytes))
-	if not imgLoadSuccessful:
-		raise ValueError("Unable to load provided image bytes as QImage")
-	logging.debug(f"Converting bytes to image took {time.perf_counter() - startTime:.4f} seconds")
+	img = decodeImageBytes(imageBytes)
+	if shouldAllowGrayscale is None:
+		shouldAllowGrayscale = SettingsStore.getSettings().STORE_GRAYSCALE_PAGES_COMPACTLY
+	img = convertToDisplayFormat(img, shouldAllowGrayscale)
+	logging.debug(f"Converting bytes to {img.width()}x{img.height()} {'grayscale ' if img.format() == QImage.Format_Grayscale8 else ''}image took {time.perf_counter() - startTime:.4f} seconds")
 	return img
 
-def calculateWidthAndHeight(images: Iterable[QImage], includeImageGap: bool = True) -> Tuple[int, int]:
+def decodeImageBytes(imageBytes: ImageBytes) -> QImage:
+	"""
+	Decode the provided bytes from reading a file, without converting the result to the display format. Use 'convertBytesToImage' to do both
+	:param imageBytes: The bytes from the image file
+	:return: The decoded image, in whatever format the decoder produced
+	:raise ValueError: Raised when the provided bytes can't be loaded as an image
+	"""
+	return _decodeWithFallback(imageBytes, lambda decoder: decoder.decodeImage(imageBytes))
+
+def convertBytesToPreviewImage(imageBytes: ImageBytes, maxPreviewSize: int) -> Tuple[QImage, QSize]:
+	"""
+	Converts the provided bytes from reading a file to a reduced-size Image. For formats that support it, like JPEG, decoding at a reduced size is a lot faster than decoding the full image
+	:param imageBytes: The bytes from the image file
+	:param maxPreviewSize: The maximum width and height of the preview image. The image keeps its aspect ratio
+	:return: A tuple with the preview image, and the size of the full image
+	:raise ValueError: Raised when the provided bytes can't be loaded as an image
+	"""
+	startTime = time.perf_counter()
+	img, fullSize = _decodeWithFallback(imageBytes, lambda decoder: decoder.decodePreviewImage(imageBytes, maxPreviewSize))
+	img = convertToDisplayFormat(img)
+	logging.debug(f"Converting bytes to {img.width()}x{img.height()} preview image took {time.perf_counter() - startTime:.4f} seconds")
+	return img, fullSize
+
+def convertToDisplayFormat(image: QImage, shouldAllowGrayscale: bool = False) -> QImage:
+	"""
+	Convert the image to the pixel format that's fastest to scale and draw. Decoders produce all kinds of formats (indexed, 24-bit RGB, etc.),
+	and each of those would otherwise get converted again every time the image is scaled or drawn. This should be called in a background thread, since it can take a while for large images
+	:param image: The image to convert
+	:param shouldAllowGrayscale: If True, images without colour are stored as 8-bit grayscale instead, which takes a quarter of the memory. Scaled versions of them are still in the display format
+	:return: The image in the display format. This is the provided image if it was already in that format
+	"""
+	if shouldAllowGrayscale and _isGrayscale(image):
+		return image if image.format() == QImage.Format_Grayscale8 else image.convertToFormat(QImage.Format_Grayscale8)
+	displayFormat = QImage.Format_ARGB32_Premultiplied if image.hasAlphaChannel() else QImage.Format_RGB32
+	if image.format() == displayFormat:
+		return image
+	return image.convertToFormat(displayFormat)
+
+def scaleImageSmoothly(image: QImage, width: int, height: int, maxThreadCount: int = None) -> QImage:
+	"""
+	Smoothly scale the provided image to the provided size. Large images that get scaled down are split into horizontal stripes, which get scaled in parallel and stitched together again
+	When scaling down, every scaled pixel is the average of the area of the image it covers. So if every stripe starts on a scaled row that starts exactly on a source row,
+	each stripe is scaled by exactly the same factor as the whole image, and gives the same pixels. If the sizes don't allow for such rows, the image is scaled in one go
+	:param image: The image to scale
+	:param width: The width to scale the image to
+	:param height: The height to scale the image to
+	:param maxThreadCount: How many threads to use at most. Defaults to one per processor core
+	:return: The scaled image
+	"""
+	startTime = time.perf_counter()
+	maxThreadCount = min(_scalingThreadCount, maxThreadCount or _scalingThreadCount)
+	stripeCount = min(maxThreadCount, height // _MIN_STRIPE_HEIGHT)
+	# Scaling up interpolates between neighbouring pixels instead of averaging areas, so the stripes would need to overlap. Since scaling up is rare and the source is small then, don't bother
+	if stripeCount <= 1 or image.width() * image.height() < _PARALLEL_SCALING_MIN_PIXELS or width > image.width() or height > image.height():
+		return image.scaled(width, height, mode=Qt.SmoothTransformation)
+	stripeBorders = _calculateStripeBorders(image.height(), height, stripeCount)
+	if not stripeBorders:
+		return image.scaled(width, height, mode=Qt.SmoothTransformation)
+	stripeFutures = []
+	for (sourceStart, scaledStart), (sourceEnd, scaledEnd) in zip(stripeBorders, stripeBorders[1:]):
+		stripeFutures.append(_scalingExecutor.submit(_scaleStripe, image, sourceStart, sourceEnd, width, scaledEnd - scaledStart))
+	scaledStripes = [stripeFuture.result() for stripeFuture in stripeFutures]
+	scaledImage = QImage(width, height, scaledStripes[0].format())
+	painter = QPainter(scaledImage)
+	# Copy the stripes as they are, without blending transparent pixels with the uninitialized image
+	painter.setCompositionMode(QPainter.CompositionMode_Source)
+	for (_, scaledStart), scaledStripe in zip(stripeBorders, scaledStripes):
+		painter.drawImage(0, scaledStart, scaledStripe)
+	painter.end()
+	logging.debug(f"Scaling {image.width()}x{image.height()} image to {width}x{height} in {len(scaledStripes)} stripes took {time.perf_counter() - startTime:.4f} seconds")
+	return scaledImage
+
+def _calculateStripeBorders(sourceHeight: int, scaledHeight: int, stripeCount: int) -> List[Tuple[int, int]]:
+	"""
+	Calculate where the image should be split into stripes. Borders are only placed on scaled rows that start exactly at the start of a source row,
+	so each stripe has exactly the same scale factor as the whole image, and each scaled row only averages source rows from its own stripe
+	:param sourceHeight: The height of the image to scale
+	:param scaledHeight: The height the image gets scaled to
+	:param stripeCount: How many stripes to split the image into at most. Fewer stripes are used if there aren't enough exact rows
+	:return: A list of (source row, scaled row) tuples, one for the start of each stripe and one for the end of the last stripe. Empty if the image can't be split exactly
+	"""
+	# Scaled row 'scaledRow' starts at source row 'scaledRow * sourceHeight / scaledHeight', which is a whole row for every multiple of this step
+	borderStep = scaledHeight // math.gcd(sourceHeight, scaledHeight)
+	stripeBorders = [(0, 0)]
+	for stripeIndex in range(1, stripeCount):
+		# Use the exact row closest to where the stripes would be evenly divided
+		scaledRow = round(stripeIndex * scaledHeight / stripeCount / borderStep) * borderStep
+		if stripeBorders[-1][1] < scaledRow < scaledHeight:
+			stripeBorders.append((scaledRow * sourceHeight // scaledHeight, scaledRow))
+	if len(stripeBorders) == 1:
+		return []
+	stripeBorders.append((sourceHeight, scaledHeight))
+	return stripeBorders
+
+def _scaleStripe(image: QImage, sourceStart: int, sourceEnd: int, width: int, height: int) -> QImage:
+	return image.copy(QRect(0, sourceStart, image.width(), sourceEnd - sourceStart)).scaled(width, height, mode=Qt.SmoothTransformation)
+
+def _isGrayscale(image: QImage) -> bool:
+	"""
+	Check whether the provided image has no colour. Scanned black-and-white pages often have a slight colour tint from the scanner or JPEG compression, so small differences are allowed
+	:param image: The image to check
+	:return: True if the image is grayscale, False if it has colour or transparency
+	"""
+	if image.format() in (QImage.Format_Grayscale8, QImage.Format_Grayscale16, QImage.Format_Mono, QImage.Format_MonoLSB):
+		# The decoder already found out for us
+		return True
+	if image.hasAlphaChannel():
+		return False
+	if image.format() == QImage.Format_Indexed8:
+		# This only checks the colour table, so it's quick
+		return image.isGrayscale()
+	# Check a smoothly downscaled copy, so each checked pixel is the average of an area of the page. That way even small coloured areas are noticed, while only a few thousand pixels need to be checked
+	sampleImage = image.scaled(_GRAYSCALE_SAMPLE_SIZE, _GRAYSCALE_SAMPLE_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation).convertToFormat(QImage.Format_RGB32)
+	pixelBytes = bytes(sampleImage.constBits())
+	# Format_RGB32 stores each pixel as 4 bytes, in the order blue, green, red, unused on little-endian systems. The order doesn't matter for comparing the channels
+	for pixelStart in range(0, len(pixelBytes), 4):
+		blue, green, red = pixelBytes[pixelStart], pixelBytes[pixelStart + 1], pixelBytes[pixelStart + 2]
+		if max(blue, green, red) - min(blue, green, red) > _GRAYSCALE_TOLERANCE:
+			return False
+	return True
+
+def _decodeWithFallback(imageBytes: ImageBytes, decodeFunction: Callable[[BaseImageDecoder], Any]) -> Any:
+	"""
+	Call the provided function with each decoder that can handle the provided image bytes, until one of them succeeds. Decoders don't all support every variant of a format, like CMYK JPEGs
+	:param imageBytes: The bytes from the image file
+	:param decodeFunction: The function to call with a decoder. It should raise a ValueError if the decoder can't handle the image bytes. Other exceptions also make the next decoder get tried
+	:return: What the provided function returned for the first decoder that succeeded
+	:raise ValueError: Raised when none of the decoders can handle the provided image bytes
+	"""
+	errorMessages = []
+	for decoder in ImageDecoderFactory.getDecodersForImage(imageBytes):
+		try:
+			return decodeFunction(decoder)
+		except ValueError as e:
+			errorMessages.append(f"{decoder.NAME}: {e}")
+		except Exception as e:
+			# A decoder shouldn't raise anything else, but if a library has a bug, the other decoders may still be able to handle the image
+			logging.error(f"The {decoder.NAME} decoder failed with an unexpected '{type(e)}' exception: {e}")
+			errorMessages.append(f"{decoder.NAME}: {e} [{type(e)}]")
+	raise ValueError("Unable to decode the provided image bytes. " + ' '.join(errorMessages))
+
+def createPlaceholderImage() -> QImage:
+	""":return: A tiny single-colour image, to show in place of an image that hasn't been loaded yet. It's meant to be scaled to the size of the image it replaces"""
+	placeholderImage = QImage(1, 1, QImage.Format_RGB32)
+	placeholderImage.fill(QColor(Qt.lightGray))
+	return placeholderImage
+
+def calculateWidthAndHeight(images: Iterable[Union[QImage, QSize]], includeImageGap: bool = True) -> Tuple[int, int]:
 	"""
 	Calculate the total width and the maximum height of the provided images
 	This takes the optional image gap from the settings into account
-	:param images: The images to calculate the total width and highest height for
+	:param images: The images, or the sizes of the images, to calculate the total width and highest height for
 	:param includeImageGap: Whether to include the image gap from the settings in the width calculation
 	:return: A tuple where the first entry is the total width and the second entry is the highest height of the provided images
 	"""
 	startTime = time.perf_counter()
-	imageGap = SettingsStore.getSettingValue(SettingsEnum.GAP_BETWEEN_PAGES) if includeImageGap else 0
+	imageGap = SettingsStore.getSettings().GAP_BETWEEN_PAGES if includeImageGap else 0
 	totalWidth = -imageGap  # Start negative because there's one fewer image gap than there are images
 	highestHeight = 0
 	for image in images:
@@ -0,0 +1,76 @@
+import concurrent.futures, logging, threading
+from typing import Callable, Dict, Optional
+
+from PySide6.QtGui import QImage
+
+from comicviewer.files.BaseFileOpener import BaseFileOpener
+from comicviewer.images import ImageUtils, ThumbnailStore
+
+THUMBNAIL_SIZE = 96  # The maximum width and height of page thumbnails, in pixels
+
+
+class ThumbnailHandler:
+	"""Creates small thumbnails of the pages of a book on demand in the background, and stores them on disk so they're instantly available the next time"""
+
+	_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)  # Initialize as class variable so all thumbnail handlers share it. Kept small, so thumbnails don't slow down loading the actual pages
+
+	def __init__(self, fileOpener: BaseFileOpener, onThumbnailLoaded: Callable[[int], None]):
+		"""
+		Create a thumbnail handler for a book
+		:param fileOpener: The opener of the book to create thumbnails for
+		:param onThumbnailLoaded: Called with the page index when a thumbnail is loaded or created. This gets called from a background thread
+		"""
+		self._fileOpener = fileOpener
+		self._bookKey = ThumbnailStore.getBookKey(fileOpener.filepath)
+		self._onThumbnailLoaded = onThumbnailLoaded
+		self._thumbnails: Dict[int, QImage] = {}
+		self._indexesBeingLoaded: Dict[int, concurrent.futures.Future] = {}
+		self._failedIndexes = set()  # Pages that couldn't be turned into a thumbnail, so we don't keep retrying them
+		self._isClosed = threading.Event()
+
+	def getThumbnail(self, index: int) -> Optional[QImage]:
+		"""
+		Get the thumbnail of a page. If it's not loaded yet, it gets loaded in the background, and the thumbnail loaded callback gets called when it's ready
+		:param index: The index of the page to get the thumbnail of
+		:return: The thumbnail if it's already loaded, None otherwise
+		"""
+		thumbnail = self._thumbnails.get(index, None)
+		# Check if the future is done instead of only if it exists, because a quick load can finish before its future is stored
+		future = self._indexesBeingLoaded.get(index, None)
+		if thumbnail is None and (future is None or future.done()) and index not in self._failedIndexes and not self._isClosed.is_set():
+			self._indexesBeingLoaded[index] = self._executor.submit(self._loadThumbnail, index)
+		return thumbnail
+
+	def cancelLoading(self, *indexesToKeep: int):
+		"""
+		Stop loading thumbnails that haven't started loading yet, for instance because they scrolled out of view
+		:param indexesToKeep: The indexes of the thumbnails that should keep loading
+		"""
+		for index, future in list(self._indexesBeingLoaded.items()):
+			if index not in indexesToKeep and future.cancel():
+				self._indexesBeingLoaded.pop(index, None)
+
+	def close(self):
+		"""Stop loading thumbnails. No thumbnail loaded callbacks get called after this"""
+		self._isClosed.set()
+		self.cancelLoading()
+
+	def _loadThumbnail(self, index: int):
+		try:
+			if self._isClosed.is_set():
+				return
+			thumbnail = ThumbnailStore.getThumbnail(self._bookKey, index)
+			if thumbnail is None:
+				# Let the decoder create the thumbnail while decoding, that's a lot faster than decoding the full image and then scaling it down
+				thumbnail, _ = ImageUtils.convertBytesToPreviewImage(self._fileOpener.getImageBytesByIndex(index), THUMBNAIL_SIZE)
+				ThumbnailStore.storeThumbnail(self._bookKey, index, thumbnail)
+			self._thumbnails[index] = thumbnail
+		except Exception as e:
+			self._failedIndexes.add(index)
+			if not self._isClosed.is_set():
+				logging.error(f"{type(e)} exception while creating thumbnail for page index {index} of '{self._fileOpener.filepath}': {e}")
+			return
+		finally:
+			self._indexesBeingLoaded.pop(index, None)
+		if not self._isClosed.is_set():
+			self._onThumbnailLoaded(index)
@@ -0,0 +1,184 @@
+import logging, os, sqlite3, threading, time
+from typing import Dict, List, Optional, Set
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice
+from PySide6.QtGui import QImage
+
+from comicviewer.files import FileUtils
+from comicviewer.settings import SettingsStore
+
+_thumbnailDatabasePath = os.path.join(FileUtils.getStoragePath(), 'thumbnails.sqlite')
+_STORE_VERSION = 1  # Increase when the table layout changes. Thumbnails can always be created again, so an outdated database just gets emptied
+_thumbnailFormat = 'JPG'  # Thumbnails are small and only used for navigation, so a lossy format is fine, and keeps the database small
+_connection: Optional[sqlite3.Connection] = None
+_connectionLock = threading.Lock()  # Thumbnails get stored and retrieved from background threads, and a SQLite connection shouldn't be used by multiple threads at once
+_usedBookKeys: Set[str] = set()  # The books whose thumbnails were used since the program started, so their last use only gets stored once per run
+_isClosing = threading.Event()  # Stops pruning when the program closes
+_PRUNE_BATCH_SIZE = 50  # How many books get removed per database transaction while pruning, so storing and retrieving thumbnails doesn't have to wait long
+
+
+def getBookKey(bookPath: str) -> str:
+	"""
+	Get the key to store thumbnails of the provided book under. The key includes the file size and modification time, so thumbnails of a changed book aren't reused
+	:param bookPath: The path of the book to get the key for
+	:return: The key for the book
+	"""
+	bookPath = os.path.abspath(bookPath)
+	try:
+		fileStats = os.stat(bookPath)
+	except OSError:
+		return bookPath
+	return f"{bookPath}|{fileStats.st_size}|{int(fileStats.st_mtime)}"
+
+def getThumbnail(bookKey: str, pageIndex: int) -> Optional[QImage]:
+	"""
+	Get a stored thumbnail
+	:param bookKey: The key of the book, from 'getBookKey'
+	:param pageIndex: The index of the page to get the thumbnail of
+	:return: The thumbnail, or None if no thumbnail was stored for this page
+	"""
+	try:
+		with _connectionLock:
+			connection = _getConnection()
+			row = connection.execute("SELECT imageData FROM thumbnails WHERE bookKey = ? AND pageIndex = ?", (bookKey, pageIndex)).fetchone()
+			if row is not None and bookKey not in _usedBookKeys:
+				_markBookUsed(connection, bookKey)
+				connection.commit()
+	except sqlite3.Error as e:
+		logging.error(f"Retrieving thumbnail for page {pageIndex} of '{bookKey}' failed with a '{type(e)}' exception: {e}")
+		return None
+	if row is None:
+		return None
+	thumbnail = QImage()
+	if not thumbnail.loadFromData(QByteArray(row[0])):
+		return None
+	return thumbnail
+
+def storeThumbnail(bookKey: str, pageIndex: int, thumbnail: QImage):
+	"""
+	Store a thumbnail, so it doesn't need to be created again the next time the book is opened
+	:param bookKey: The key of the book, from 'getBookKey'
+	:param pageIndex: The index of the page the thumbnail is of
+	:param thumbnail: The thumbnail to store
+	"""
+	storeEncodedThumbnail(bookKey, pageIndex, encodeThumbnail(thumbnail))
+
+def encodeThumbnail(thumbnail: QImage) -> bytes:
+	"""
+	Compress a thumbnail the way it's stored. Useful to create thumbnails in another process, since the encoded thumbnail can be sent back, unlike the image itself
+	:param thumbnail: The thumbnail to encode
+	:return: The encoded thumbnail, which can be passed to 'storeEncodedThumbnail'
+	"""
+	thumbnailBytes = QByteArray()
+	buffer = QBuffer(thumbnailBytes)
+	buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+	thumbnail.save(buffer, _thumbnailFormat, 85)
+	buffer.close()
+	return thumbnailBytes.data()
+
+def storeEncodedThumbnail(bookKey: str, pageIndex: int, thumbnailBytes: bytes):
+	"""
+	Store a thumbnail that's already encoded by 'encodeThumbnail'
+	:param bookKey: The key of the book, from 'getBookKey'
+	:param pageIndex: The index of the page the thumbnail is of
+	:param thumbnailBytes: The encoded thumbnail
+	"""
+	try:
+		with _connectionLock:
+			connection = _getConnection()
+			connection.execute("INSERT OR REPLACE INTO thumbnails (bookKey, pageIndex, imageData) VALUES (?, ?, ?)", (bookKey, pageIndex, thumbnailBytes))
+			if bookKey not in _usedBookKeys:
+				_markBookUsed(connection, bookKey)
+			connection.commit()
+	except sqlite3.Error as e:
+		logging.error(f"Storing thumbnail for page {pageIndex} of '{bookKey}' failed with a '{type(e)}' exception: {e}")
+
+def pruneInBackground():
+	"""Remove outdated thumbnails in a background thread, so it doesn't delay starting up. See 'prune'"""
+	threading.Thread(target=prune, name='ThumbnailPruning', daemon=True).start()
+
+def prune():
+	"""
+	Remove the thumbnails of books that changed, moved or got deleted, since their key doesn't match the file anymore and they'd never be used again.
+	Then, if the stored thumbnails take up more space than the 'Thumbnail Store Size Limit' setting allows, remove the thumbnails of the least recently used books until they fit
+	"""
+	startTime = time.perf_counter()
+	try:
+		with _connectionLock:
+			connection = _getConnection()
+			bookSizes: Dict[str, int] = dict(connection.execute("SELECT bookKey, SUM(length(imageData)) FROM thumbnails GROUP BY bookKey").fetchall())
+			bookKeysByAge: List[str] = [row[0] for row in connection.execute("SELECT thumbnails.bookKey FROM thumbnails LEFT JOIN bookUsage ON thumbnails.bookKey = bookUsage.bookKey "
+																				 "GROUP BY thumbnails.bookKey ORDER BY IFNULL(MAX(bookUsage.lastUsed), 0)").fetchall()]
+		# Checking the files happens outside the lock, since that can take a while for a large library
+		outdatedBookKeys = [bookKey for bookKey in bookKeysByAge if _isBookKeyOutdated(bookKey)]
+		outdatedBookKeySet = set(outdatedBookKeys)
+		storedSize = sum(bookSizes.values()) - sum(bookSizes[bookKey] for bookKey in outdatedBookKeys)
+		sizeLimit = SettingsStore.getSettings().THUMBNAIL_STORE_SIZE_LIMIT * 1048576  # Setting is in megabytes, convert to bytes
+		bookKeysToRemove = outdatedBookKeys
+		for bookKey in bookKeysByAge:
+			if storedSize <= sizeLimit:
+				break
+			# Books used during this run are probably still open or shown, so keep their thumbnails
+			if bookKey not in outdatedBookKeySet and bookKey not in _usedBookKeys:
+				bookKeysToRemove.append(bookKey)
+				storedSize -= bookSizes[bookKey]
+		for batchStart in range(0, len(bookKeysToRemove), _PRUNE_BATCH_SIZE):
+			if _isClosing.is_set():
+				return
+			batch = [(bookKey,) for bookKey in bookKeysToRemove[batchStart:batchStart + _PRUNE_BATCH_SIZE]]
+			with _connectionLock:
+				connection = _getConnection()
+				connection.executemany("DELETE FROM thumbnails WHERE bookKey = ?", batch)
+				connection.executemany("DELETE FROM bookUsage WHERE bookKey = ?", batch)
+				connection.commit()
+		if bookKeysToRemove and not _isClosing.is_set():
+			with _connectionLock:
+				# Removing rows doesn't make the database file smaller by itself, this gives the freed pages back
+				_getConnection().execute("PRAGMA incremental_vacuum")
+	except sqlite3.Error as e:
+		logging.error(f"Pruning the stored thumbnails failed with a '{type(e)}' exception: {e}")
+		return
+	logging.debug(f"Removing the thumbnails of {len(bookKeysToRemove)} outdated or least recently used books took {time.perf_counter() - startTime:.4f} seconds")
+
+def close():
+	"""Close the thumbnail database. Should be called when the program closes. The database gets reopened if it's used again"""
+	global _connection
+	_isClosing.set()
+	with _connectionLock:
+		if _connection is not None:
+			_connection.close()
+			_connection = None
+
+
+def _getConnection() -> sqlite3.Connection:
+	global _connection
+	if _connection is None:
+		if not os.path.isdir(FileUtils.getStoragePath()):
+			os.makedirs(FileUtils.getStoragePath())
+		_connection = sqlite3.connect(_thumbnailDatabasePath, check_same_thread=False)
+		if _connection.execute("PRAGMA user_version").fetchone()[0] != _STORE_VERSION:
+			_connection.execute("DROP TABLE IF EXISTS thumbnails")
+			_connection.execute("DROP TABLE IF EXISTS bookUsage")
+			# Let pruning shrink the file. This only takes effect after a vacuum, which is quick now that the database is empty
+			_connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+			_connection.execute("VACUUM")
+			_connection.execute(f"PRAGMA user_version = {_STORE_VERSION}")
+		_connection.execute("PRAGMA journal_mode=WAL")
+		_connection.execute("CREATE TABLE IF NOT EXISTS thumbnails (bookKey TEXT NOT NULL, pageIndex INTEGER NOT NULL, imageData BLOB NOT NULL, PRIMARY KEY (bookKey, pageIndex))")
+		# When the thumbnails of each book were last used, so the least recently used ones can be removed when the thumbnails take up too much space
+		_connection.execute("CREATE TABLE IF NOT EXISTS bookUsage (bookKey TEXT PRIMARY KEY, lastUsed INTEGER NOT NULL)")
+		_connection.commit()
+	return _connection
+
+def _markBookUsed(connection: sqlite3.Connection, bookKey: str):
+	"""Store that the thumbnails of the provided book were used now. Should be called with the connection lock held"""
+	connection.execute("INSERT OR REPLACE INTO bookUsage (bookKey, lastUsed) VALUES (?, ?)", (bookKey, int(time.time())))
+	_usedBookKeys.add(bookKey)
+
+def _isBookKeyOutdated(bookKey: str) -> bool:
+	""":return: True if the book the key is for changed, moved or got deleted since the key was made, see 'getBookKey'"""
+	keyParts = bookKey.rsplit('|', 2)
+	if len(keyParts) != 3:
+		# Books that couldn't be read when their key was made have just their path as key, their thumbnails can't be trusted
+		return True
+	return getBookKey(keyParts[0]) != bookKey
@@ -0,0 +1,40 @@
+from abc import ABC, abstractmethod
+from typing import Iterable, Tuple, Union
+
+from PySide6.QtCore import QSize
+from PySide6.QtGui import QImage
+
+
+class BaseImageDecoder(ABC):
+	NAME = ''  # Shown when reporting which decoder is used for which format
+
+	@staticmethod
+	def isAvailable() -> bool:
+		""":return: Whether this decoder can be used. Decoders that depend on optional libraries should return False if those aren't installed"""
+		return True
+
+	@abstractmethod
+	def getSupportedExtensions(self) -> Iterable[str]:
+		""":return: The file extensions, including the period, of the image formats this decoder can decode"""
+		pass
+
+	@abstractmethod
+	def decodeImage(self, imageBytes: Union[bytes, memoryview]) -> QImage:
+		"""
+		Decode the provided image bytes at full size
+		:param imageBytes: The bytes from the image file
+		:return: The decoded image, in whatever format is quickest for this decoder to produce
+		:raise ValueError: Raised when the provided bytes can't be decoded
+		"""
+		pass
+
+	@abstractmethod
+	def decodePreviewImage(self, imageBytes: Union[bytes, memoryview], maxPreviewSize: int) -> Tuple[QImage, QSize]:
+		"""
+		Decode the provided image bytes at a reduced size. Decoders should use the quickest way their library offers to do that
+		:param imageBytes: The bytes from the image file
+		:param maxPreviewSize: The maximum width and height of the preview image. The image keeps its aspect ratio
+		:return: A tuple with the preview image, and the size of the full image
+		:raise ValueError: Raised when the provided bytes can't be decoded
+		"""
+		pass
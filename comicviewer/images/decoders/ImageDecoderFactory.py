@@ -0,0 +1,177 @@
+import io, logging, statistics, threading, time
+from typing import Dict, List, Optional, Union
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice, QPointF, Qt
+from PySide6.QtGui import QColor, QImage, QImageWriter, QLinearGradient, QPainter
+
+from comicviewer.images.decoders.BaseImageDecoder import BaseImageDecoder
+from comicviewer.images.decoders.PillowImageDecoder import PillowImageDecoder, Image as PillowImage
+from comicviewer.images.decoders.QtImageDecoder import QtImageDecoder
+from comicviewer.images.decoders.TurboJpegImageDecoder import TurboJpegImageDecoder
+
+_SAMPLE_IMAGE_WIDTH = 1600  # The size of the image that's decoded to find the fastest decoder. Large enough that the decoding itself takes longer than the overhead around it
+_SAMPLE_IMAGE_HEIGHT = 2400
+_SAMPLE_DECODE_COUNT = 3  # How often the sample image is decoded per decoder, the median duration is used
+# The formats comic pages are actually stored in. Only these are benchmarked, other formats just use the first decoder that supports them, since decoding a sample of each takes a while
+_BENCHMARKED_FORMATS = ('jpeg', 'png', 'webp', 'avif')
+
+# Some formats have multiple extensions, store them under a single format name
+_EXTENSION_TO_FORMAT = {'.jpg': 'jpeg', '.jpe': 'jpeg', '.jfif': 'jpeg', '.tif': 'tiff'}
+# The bytes image files of a format start with, and the position of those bytes. Used to find out which format image bytes are, since the file name isn't passed along with them
+_FORMAT_SIGNATURES = (
+	('jpeg', 0, b'\xff\xd8\xff'),
+	('png', 0, b'\x89PNG\r\n\x1a\n'),
+	('gif', 0, b'GIF8'),
+	('webp', 8, b'WEBP'),
+	('avif', 4, b'ftypavif'),
+	('avif', 4, b'ftypavis'),
+	('tiff', 0, b'II*\x00'),
+	('tiff', 0, b'MM\x00*'),
+	('bmp', 0, b'BM'),
+)
+
+# Qt comes first, so it's used for formats that haven't been benchmarked yet, like before there were multiple decoders
+_decoders: List[BaseImageDecoder] = [decoderClass() for decoderClass in (QtImageDecoder, TurboJpegImageDecoder, PillowImageDecoder) if decoderClass.isAvailable()]
+_formatToDecoders: Dict[str, List[BaseImageDecoder]] = {}
+supportedExtensions: List[str] = []
+for _decoder in _decoders:
+	for _extension in _decoder.getSupportedExtensions():
+		_extension = _extension.lower()
+		if _extension not in supportedExtensions:
+			supportedExtensions.append(_extension)
+		_formatDecoders = _formatToDecoders.setdefault(_EXTENSION_TO_FORMAT.get(_extension, _extension[1:]), [])
+		if _decoder not in _formatDecoders:
+			_formatDecoders.append(_decoder)
+_formatToFastestDecoder: Dict[str, BaseImageDecoder] = {}  # Filled in by 'selectFastestDecoders'
+
+
+def getImageFormat(imageBytes: Union[bytes, memoryview]) -> Optional[str]:
+	"""
+	Determine the format of the provided image bytes, by checking how they start
+	:param imageBytes: The bytes from the image file
+	:return: The name of the image format, or None if it's not recognised
+	"""
+	for imageFormat, signatureStart, signature in _FORMAT_SIGNATURES:
+		if imageBytes[signatureStart:signatureStart + len(signature)] == signature:
+			return imageFormat
+	return None
+
+def getDecodersForImage(imageBytes: Union[bytes, memoryview]) -> List[BaseImageDecoder]:
+	"""
+	Get the decoders that can decode the provided image bytes, in the order they should be tried
+	:param imageBytes: The bytes from the image file
+	:return: The decoders to try. The fastest decoder for the image format comes first, the others are fallbacks for if the image can't be decoded by it
+	"""
+	imageFormat = getImageFormat(imageBytes)
+	if imageFormat is None or imageFormat not in _formatToDecoders:
+		# Qt recognises formats by their content itself, so let it figure out what to do
+		return _decoders
+	formatDecoders = _formatToDecoders[imageFormat]
+	fastestDecoder = _formatToFastestDecoder.get(imageFormat, formatDecoders[0])
+	return [fastestDecoder] + [decoder for decoder in formatDecoders if decoder is not fastestDecoder]
+
+def selectFastestDecoders() -> Dict[str, Dict[str, float]]:
+	"""
+	Find out which decoder is fastest for each format that can be decoded by multiple decoders, by letting each of them decode a sample image.
+	Which decoder is fastest depends on the library versions and the computer, so this should be done on the computer the program runs on
+	:return: A dictionary with the format name as key, and as value a dictionary with the decoder names as key and how long decoding took in seconds as value
+	"""
+	startTime = time.perf_counter()
+	formatTimings: Dict[str, Dict[str, float]] = {}
+	sampleImage = None
+	for imageFormat, formatDecoders in _formatToDecoders.items():
+		if len(formatDecoders) <= 1 or imageFormat not in _BENCHMARKED_FORMATS:
+			continue
+		if sampleImage is None:
+			sampleImage = _createSampleImage()
+		sampleBytes = _encodeSampleImage(sampleImage, imageFormat)
+		if sampleBytes is None:
+			logging.debug(f"Unable to create a sample {imageFormat} image, so it's not known which decoder is fastest for it")
+			continue
+		decoderTimings: Dict[str, float] = {}
+		fastestDecoder, fastestDuration = None, None
+		for decoder in formatDecoders:
+			try:
+				decodeDurations = []
+				for _ in range(_SAMPLE_DECODE_COUNT):
+					decodeStartTime = time.perf_counter()
+					decoder.decodeImage(sampleBytes)
+					decodeDurations.append(time.perf_counter() - decodeStartTime)
+			except Exception as e:
+				# Catch everything, a bug in one decoder library shouldn't stop the other decoders from being checked
+				logging.warning(f"The {decoder.NAME} decoder failed to decode the sample {imageFormat} image with a '{type(e)}' exception: {e}")
+				continue
+			decoderTimings[decoder.NAME] = statistics.median(decodeDurations)
+			if fastestDuration is None or decoderTimings[decoder.NAME] < fastestDuration:
+				fastestDecoder, fastestDuration = decoder, decoderTimings[decoder.NAME]
+		if fastestDecoder is not None:
+			_formatToFastestDecoder[imageFormat] = fastestDecoder
+			formatTimings[imageFormat] = decoderTimings
+			timingsString = ', '.join(f"{decoderName} {duration * 1000:.1f} ms" for decoderName, duration in decoderTimings.items())
+			logging.info(f"Using the {fastestDecoder.NAME} decoder for {imageFormat} images ({timingsString})")
+	logging.debug(f"Selecting the fastest decoders took {time.perf_counter() - startTime:.4f} seconds")
+	return formatTimings
+
+def selectFastestDecodersInBackground():
+	"""Select the fastest decoders in a background thread, so it doesn't delay starting up. Until that's done, the default decoder for each format is used"""
+	if any(len(formatDecoders) > 1 and imageFormat in _BENCHMARKED_FORMATS for imageFormat, formatDecoders in _formatToDecoders.items()):
+		threading.Thread(target=selectFastestDecoders, name='DecoderSelection', daemon=True).start()
+
+def getFastestDecoderNames() -> Dict[str, str]:
+	""":return: A dictionary with format names as key, and the name of the decoder that was found to be fastest for that format as value. Empty until the fastest decoders are selected"""
+	return {imageFormat: decoder.NAME for imageFormat, decoder in list(_formatToFastestDecoder.items())}
+
+def setFastestDecoderNames(fastestDecoderNames: Dict[str, str]):
+	"""
+	Use the provided decoders for their formats, for instance because another process already found out they're the fastest
+	:param fastestDecoderNames: A dictionary with format names as key, and decoder names as value, as returned by 'getFastestDecoderNames'
+	"""
+	for imageFormat, decoderName in fastestDecoderNames.items():
+		for decoder in _formatToDecoders.get(imageFormat, ()):
+			if decoder.NAME == decoderName:
+				_formatToFastestDecoder[imageFormat] = decoder
+				break
+
+def getDecoderNames() -> List[str]:
+	""":return: The names of the available decoders"""
+	return [decoder.NAME for decoder in _decoders]
+
+def _createSampleImage() -> QImage:
+	"""Create an image that's somewhat like a comic page, with smooth gradients and hard edges, so decoding it is similar work"""
+	sampleImage = QImage(_SAMPLE_IMAGE_WIDTH, _SAMPLE_IMAGE_HEIGHT, QImage.Format_RGB32)
+	painter = QPainter(sampleImage)
+	gradient = QLinearGradient(QPointF(0, 0), QPointF(_SAMPLE_IMAGE_WIDTH, _SAMPLE_IMAGE_HEIGHT))
+	gradient.setColorAt(0, QColor(240, 220, 180))
+	gradient.setColorAt(1, QColor(60, 90, 160))
+	painter.fillRect(sampleImage.rect(), gradient)
+	painter.setPen(Qt.black)
+	panelSize = 390
+	for panelIndex in range(24):
+		panelLeft, panelTop = (panelIndex % 4) * 400 + 5, (panelIndex // 4) * 400 + 5
+		painter.drawRect(panelLeft, panelTop, panelSize, panelSize)
+		for lineIndex in range(0, panelSize, 13):
+			painter.drawLine(panelLeft, panelTop + lineIndex, panelLeft + (lineIndex * 7 + panelIndex * 31) % panelSize, panelTop + panelSize - lineIndex)
+	painter.end()
+	return sampleImage
+
+def _encodeSampleImage(sampleImage: QImage, imageFormat: str) -> Optional[bytes]:
+	""":return: The sample image encoded in the provided format, or None if none of the available libraries can write that format"""
+	imageBuffer = QBuffer()
+	imageBuffer.open(QIODevice.WriteOnly)
+	if imageFormat.encode() in [writerFormat.data() for writerFormat in QImageWriter.supportedImageFormats()]:
+		imageWriter = QImageWriter(imageBuffer, QByteArray(imageFormat.encode()))
+		if imageWriter.write(sampleImage):
+			return imageBuffer.data().data()
+	if PillowImageDecoder.isAvailable():
+		# Qt can't write this format, but Pillow might
+		pillowFormat = imageFormat.upper()
+		if pillowFormat in PillowImage.SAVE:
+			sampleImage = sampleImage.convertToFormat(QImage.Format_RGB888)
+			pillowImage = PillowImage.frombytes('RGB', (sampleImage.width(), sampleImage.height()), bytes(sampleImage.constBits()), 'raw', 'RGB', sampleImage.bytesPerLine())
+			with io.BytesIO() as outputBytes:
+				try:
+					pillowImage.save(outputBytes, pillowFormat)
+				except (OSError, ValueError):
+					return None
+				return outputBytes.getvalue()
+	return None
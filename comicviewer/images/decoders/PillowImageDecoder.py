@@ -0,0 +1,64 @@
+import io
+from typing import List, Tuple, Union
+
+from PySide6.QtCore import QSize
+from PySide6.QtGui import QImage
+
+from comicviewer.images.decoders.BaseImageDecoder import BaseImageDecoder
+
+# Pillow is optional, it's only used if it's installed
+try:
+	from PIL import Image
+except ImportError:
+	Image = None
+
+# The extensions of the formats comic pages are stored in. Pillow can open a lot more formats, but many of those aren't images, like PSD, EPS and MPEG,
+# or Pillow can only identify them and not decode them, so files with those extensions in a book shouldn't count as pages
+_PAGE_EXTENSIONS = ('.jpg', '.jpeg', '.jpe', '.jfif', '.png', '.webp', '.avif', '.gif', '.bmp', '.tif', '.tiff')
+
+# Which QImage format matches the raw data of a Pillow image mode. Other modes get converted to one of these first
+_PILLOW_MODE_TO_QIMAGE_FORMAT = {
+	'L': (QImage.Format_Grayscale8, 1),
+	'RGB': (QImage.Format_RGB888, 3),
+	'RGBA': (QImage.Format_RGBA8888, 4),
+}
+
+
+class PillowImageDecoder(BaseImageDecoder):
+	"""Decodes images with Pillow, if it's installed. Pillow can decode JPEGs at a reduced size, which makes it quick at creating previews"""
+	NAME = 'Pillow'
+
+	@staticmethod
+	def isAvailable() -> bool:
+		return Image is not None
+
+	def getSupportedExtensions(self) -> List[str]:
+		# Some of the registered formats can only be saved, not opened. Which page formats Pillow can open depends on its version and the plugins installed
+		return [extension for extension, imageFormat in Image.registered_extensions().items() if extension in _PAGE_EXTENSIONS and imageFormat in Image.OPEN]
+
+	def decodeImage(self, imageBytes: Union[bytes, memoryview]) -> QImage:
+		try:
+			with Image.open(io.BytesIO(imageBytes)) as pillowImage:
+				return self._convertToQImage(pillowImage)
+		except (OSError, SyntaxError, ValueError) as e:
+			raise ValueError(f"Unable to load provided image bytes with Pillow: {e}")
+
+	def decodePreviewImage(self, imageBytes: Union[bytes, memoryview], maxPreviewSize: int) -> Tuple[QImage, QSize]:
+		try:
+			with Image.open(io.BytesIO(imageBytes)) as pillowImage:
+				fullSize = QSize(pillowImage.width, pillowImage.height)
+				# For JPEGs this decodes at a reduced size, so only a fraction of the image needs to be decoded
+				pillowImage.thumbnail((maxPreviewSize, maxPreviewSize))
+				return self._convertToQImage(pillowImage), fullSize
+		except (OSError, SyntaxError, ValueError) as e:
+			raise ValueError(f"Unable to load provided image bytes as preview with Pillow: {e}")
+
+	@staticmethod
+	def _convertToQImage(pillowImage: 'Image.Image') -> QImage:
+		if pillowImage.mode not in _PILLOW_MODE_TO_QIMAGE_FORMAT:
+			hasTransparency = pillowImage.mode in ('LA', 'PA', 'RGBa', 'La') or 'transparency' in pillowImage.info
+			pillowImage = pillowImage.convert('RGBA' if hasTransparency else 'RGB')
+		imageFormat, bytesPerPixel = _PILLOW_MODE_TO_QIMAGE_FORMAT[pillowImage.mode]
+		imageData = pillowImage.tobytes()
+		# The QImage only references the data, so copy it into an image that owns its data before the bytes get released
+		return QImage(imageData, pillowImage.width, pillowImage.height, pillowImage.width * bytesPerPixel, imageFormat).copy()
@@ -0,0 +1,59 @@
+from typing import List, Tuple, Union
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice, QSize, Qt
+from PySide6.QtGui import QImage, QImageReader
+
+from comicviewer.images.decoders.BaseImageDecoder import BaseImageDecoder
+
+
+class QtImageDecoder(BaseImageDecoder):
+	"""Decodes images with Qt's image plugins. This is always available, so it's also the fallback for when other decoders fail"""
+	NAME = 'Qt'
+
+	def getSupportedExtensions(self) -> List[str]:
+		return ['.' + imageFormat.data().decode() for imageFormat in QImageReader.supportedImageFormats()]
+
+	def decodeImage(self, imageBytes: Union[bytes, memoryview]) -> QImage:
+		imageBuffer = createReadOnlyBuffer(imageBytes)
+		imageReader = QImageReader(imageBuffer)
+		image = imageReader.read()
+		errorString = imageReader.errorString()
+		# The reader uses the buffer until it's deleted, some image plugins like TIFF's even while it's being deleted. Python doesn't guarantee in which order
+		# local variables get deleted when the function returns, so delete the reader explicitly before the buffer goes. The other functions do the same
+		del imageReader
+		imageBuffer.close()
+		if image.isNull():
+			raise ValueError(f"Unable to load provided image bytes as QImage: {errorString}")
+		return image
+
+	def decodePreviewImage(self, imageBytes: Union[bytes, memoryview], maxPreviewSize: int) -> Tuple[QImage, QSize]:
+		imageBuffer = createReadOnlyBuffer(imageBytes)
+		imageReader = QImageReader(imageBuffer)
+		fullSize = imageReader.size()
+		if fullSize.isValid() and (fullSize.width() > maxPreviewSize or fullSize.height() > maxPreviewSize):
+			imageReader.setScaledSize(fullSize.scaled(maxPreviewSize, maxPreviewSize, Qt.KeepAspectRatio))
+		image = imageReader.read()
+		errorString = imageReader.errorString()
+		del imageReader
+		imageBuffer.close()
+		if image.isNull():
+			raise ValueError(f"Unable to load provided image bytes as preview QImage: {errorString}")
+		if not fullSize.isValid():
+			# Some formats don't report their size before decoding, so the image got decoded at its full size. Shrink it ourselves
+			fullSize = image.size()
+			if image.width() > maxPreviewSize or image.height() > maxPreviewSize:
+				image = image.scaled(maxPreviewSize, maxPreviewSize, Qt.KeepAspectRatio, Qt.FastTransformation)
+		return image, fullSize
+
+
+def createReadOnlyBuffer(imageBytes: Union[bytes, memoryview]) -> QBuffer:
+	"""
+	Create an opened read-only buffer with a copy of the provided bytes. PySide6 can't wrap Python bytes or a memoryview in a QByteArray without copying them,
+	'QByteArray.fromRawData' doesn't accept them, so the bytes get copied into the buffer
+	:param imageBytes: The bytes from the image file. This can be a memoryview, which gets converted to bytes first since QByteArray doesn't accept it
+	:return: The opened buffer
+	"""
+	imageBuffer = QBuffer()
+	imageBuffer.setData(QByteArray(bytes(imageBytes)))
+	imageBuffer.open(QIODevice.ReadOnly)
+	return imageBuffer
@@ -0,0 +1,63 @@
+import sys
+from typing import List, Tuple, Union
+
+from PySide6.QtCore import QSize, Qt
+from PySide6.QtGui import QImage
+
+from comicviewer.images.decoders.BaseImageDecoder import BaseImageDecoder
+
+# PyTurboJPEG is optional, it's only used if it and the libjpeg-turbo library it wraps are installed
+try:
+	import turbojpeg
+	_turboJpeg = turbojpeg.TurboJPEG()
+	# QImage's RGB32 format is a 32-bit number per pixel, so which byte order matches it depends on the system
+	_PIXEL_FORMAT = turbojpeg.TJPF_BGRX if sys.byteorder == 'little' else turbojpeg.TJPF_XRGB
+except (ImportError, OSError, RuntimeError):
+	_turboJpeg = None
+
+
+class TurboJpegImageDecoder(BaseImageDecoder):
+	"""Decodes JPEGs with libjpeg-turbo through PyTurboJPEG, if it's installed. It decodes straight into the pixel format Qt draws fastest, and can decode at a reduced size"""
+	NAME = 'TurboJPEG'
+
+	@staticmethod
+	def isAvailable() -> bool:
+		return _turboJpeg is not None
+
+	def getSupportedExtensions(self) -> List[str]:
+		return ['.jpg', '.jpeg', '.jpe', '.jfif']
+
+	def decodeImage(self, imageBytes: Union[bytes, memoryview]) -> QImage:
+		return self._decode(imageBytes)
+
+	def decodePreviewImage(self, imageBytes: Union[bytes, memoryview], maxPreviewSize: int) -> Tuple[QImage, QSize]:
+		fullSize = self._getImageSize(imageBytes)
+		# libjpeg-turbo can skip detail while decoding, at fixed fractions of the full size. Use the smallest one that's still at least as large as the preview
+		scalingFactor = None
+		largestSide = max(fullSize.width(), fullSize.height())
+		for numerator, denominator in sorted(_turboJpeg.scaling_factors, key=lambda factor: factor[0] / factor[1]):
+			if largestSide * numerator / denominator >= maxPreviewSize and numerator <= denominator:
+				scalingFactor = (numerator, denominator)
+				break
+		image = self._decode(imageBytes, scalingFactor)
+		if image.width() > maxPreviewSize or image.height() > maxPreviewSize:
+			image = image.scaled(maxPreviewSize, maxPreviewSize, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+		return image, fullSize
+
+	@staticmethod
+	def _getImageSize(imageBytes: Union[bytes, memoryview]) -> QSize:
+		try:
+			width, height, _, _ = _turboJpeg.decode_header(imageBytes)
+		except (OSError, ValueError) as e:
+			raise ValueError(f"Unable to determine the image size with TurboJPEG: {e}")
+		return QSize(width, height)
+
+	@staticmethod
+	def _decode(imageBytes: Union[bytes, memoryview], scalingFactor: Tuple[int, int] = None) -> QImage:
+		try:
+			pixelArray = _turboJpeg.decode(imageBytes, pixel_format=_PIXEL_FORMAT, scaling_factor=scalingFactor)
+		except (OSError, ValueError) as e:
+			raise ValueError(f"Unable to load provided image bytes with TurboJPEG: {e}")
+		height, width = pixelArray.shape[0], pixelArray.shape[1]
+		# The QImage only references the array, so copy it into an image that owns its data before the array gets released
+		return QImage(pixelArray.data, width, height, pixelArray.strides[0], QImage.Format_RGB32).copy()
@@ -16,6 +16,7 @@ class KeyboardAction(Enum):
 	ZOOM_OUT = auto()
 	ZOOM_ORIGINAL_SIZE = auto()
 	ZOOM_FIT_SCREEN = auto()
+	TOGGLE_MAGNIFIER = auto()
 	# UI display keys
 	TOGGLE_FULLSCREEN = auto()
 	LEAVE_FULLSCREEN = auto()
@@ -21,6 +21,7 @@ _qtKeyToKeyAction = {
 	# Zooming
 	Qt.Key_Plus: KeyboardAction.ZOOM_IN,
 	Qt.Key_Minus: KeyboardAction.ZOOM_OUT,
+	Qt.Key_M: KeyboardAction.TOGGLE_MAGNIFIER,
 	# UI display
 	Qt.Key_F: KeyboardAction.TOGGLE_FULLSCREEN,
 	Qt.Key_C: KeyboardAction.TOGGLE_CONTROLS_PANEL,
@@ -0,0 +1,149 @@
+import concurrent.futures, logging, multiprocessing, threading, time
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Set
+
+from PySide6.QtCore import QByteArray, QObject, Signal
+from PySide6.QtGui import QImage
+
+from comicviewer.files import FileOpenerFactory
+from comicviewer.files.ComicInfoParser import ComicInfoParser
+from comicviewer.images import ImageUtils, ThumbnailStore
+from comicviewer.settings.SettingsEnum import SettingsEnum
+from comicviewer.settings import SettingsStore
+
+COVER_THUMBNAIL_SIZE = 192  # The maximum width and height of cover thumbnails, in pixels
+_COVER_PAGE_INDEX = -1  # Covers are larger than page thumbnails, so they're stored under their own page index instead of under the index of the cover page
+_MAX_CACHED_COVERS = 400  # How many covers are kept in memory, so scrolling back doesn't load them from the database again
+
+
+class CoverThumbnailer(QObject):
+	"""
+	Creates the cover thumbnails of library books in separate processes, decoding the cover at a reduced size, and stores them in the thumbnail database so they're
+	instantly available afterwards. The database key includes the file size and modification time, so a changed book gets a new cover thumbnail
+	"""
+	coverLoaded = Signal(str)  # Emitted from a background thread with the book path, once its cover is available through 'getCover'
+
+	_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix='CoverThumbnailer')  # Loads stored covers, and waits for the processes creating new ones
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._covers: OrderedDict[str, QImage] = OrderedDict()
+		self._coversLock = threading.Lock()
+		self._pathsBeingLoaded: Dict[str, concurrent.futures.Future] = {}
+		self._failedPaths: Set[str] = set()  # Books whose cover couldn't be created, so we don't keep retrying them
+		self._processPool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+		self._processPoolLock = threading.Lock()
+		self._isClosed = threading.Event()
+
+	def getCover(self, bookPath: str) -> Optional[QImage]:
+		"""
+		Get the cover thumbnail of a book. If it's not loaded yet, it gets loaded or created in the background, and 'coverLoaded' gets emitted when it's ready
+		:param bookPath: The path of the book to get the cover of
+		:return: The cover thumbnail if it's already loaded, None otherwise
+		"""
+		with self._coversLock:
+			cover = self._covers.get(bookPath, None)
+			if cover is not None:
+				self._covers.move_to_end(bookPath)
+				return cover
+		future = self._pathsBeingLoaded.get(bookPath, None)
+		if (future is None or future.done()) and bookPath not in self._failedPaths and not self._isClosed.is_set():
+			self._pathsBeingLoaded[bookPath] = self._executor.submit(self._loadCover, bookPath)
+		return None
+
+	def cancelLoading(self, *pathsToKeep: str):
+		"""
+		Stop loading covers that haven't started loading yet, for instance because they scrolled out of view
+		:param pathsToKeep: The paths of the books whose covers should keep loading
+		"""
+		pathsToKeep = set(pathsToKeep)
+		for bookPath, future in list(self._pathsBeingLoaded.items()):
+			if bookPath not in pathsToKeep and future.cancel():
+				self._pathsBeingLoaded.pop(bookPath, None)
+
+	def close(self):
+		"""Stop creating covers. Should be called when the program closes"""
+		self._isClosed.set()
+		self.cancelLoading()
+		with self._processPoolLock:
+			if self._processPool is not None:
+				self._processPool.shutdown(wait=False, cancel_futures=True)
+				self._processPool = None
+
+	def _loadCover(self, bookPath: str):
+		startTime = time.perf_counter()
+		try:
+			if self._isClosed.is_set():
+				return
+			bookKey = ThumbnailStore.getBookKey(bookPath)
+			cover = ThumbnailStore.getThumbnail(bookKey, _COVER_PAGE_INDEX)
+			if cover is None:
+				coverBytes = self._createCover(bookPath)
+				if coverBytes is None:
+					return
+				ThumbnailStore.storeEncodedThumbnail(bookKey, _COVER_PAGE_INDEX, coverBytes)
+				cover = QImage()
+				if not cover.loadFromData(QByteArray(coverBytes)):
+					raise ValueError("The created cover thumbnail can't be read back")
+				logging.debug(f"Creating the cover thumbnail of '{bookPath}' took {time.perf_counter() - startTime:.4f} seconds")
+			with self._coversLock:
+				self._covers[bookPath] = cover
+				while len(self._covers) > _MAX_CACHED_COVERS:
+					self._covers.popitem(last=False)
+		except Exception as e:
+			self._failedPaths.add(bookPath)
+			if not self._isClosed.is_set():
+				logging.error(f"{type(e)} exception while creating the cover thumbnail of '{bookPath}': {e}")
+			return
+		finally:
+			self._pathsBeingLoaded.pop(bookPath, None)
+		if not self._isClosed.is_set():
+			self.coverLoaded.emit(bookPath)
+
+	def _createCover(self, bookPath: str) -> Optional[bytes]:
+		""":return: The encoded cover thumbnail, or None if the thumbnailer got closed while creating it"""
+		processPool = self._getProcessPool()
+		if processPool is None:
+			return _createEncodedCover(bookPath)
+		try:
+			return processPool.submit(_createEncodedCover, bookPath).result()
+		except BrokenProcessPool as e:
+			# This has to be caught before RuntimeError, since it's a subclass of it
+			# A book that crashes the decoder shouldn't stop all other covers, so start new processes for the next covers
+			logging.error(f"A cover thumbnail process crashed while creating the cover of '{bookPath}': {e}")
+			with self._processPoolLock:
+				if self._processPool is processPool:
+					self._processPool = None
+			raise
+		except RuntimeError:
+			# The process pool got shut down, because the program is closing
+			return None
+
+	def _getProcessPool(self) -> Optional[concurrent.futures.ProcessPoolExecutor]:
+		""":return: The process pool to create covers in, or None if they should be created in the calling thread"""
+		processCount = SettingsStore.getSettingValue(SettingsEnum.COVER_THUMBNAIL_PROCESS_COUNT)
+		if processCount <= 0:
+			return None
+		with self._processPoolLock:
+			if self._processPool is None and not self._isClosed.is_set():
+				# Always spawn new processes instead of forking this one, since a forked copy of a running Qt program isn't safe to use
+				self._processPool = concurrent.futures.ProcessPoolExecutor(max_workers=processCount, mp_context=multiprocessing.get_context('spawn'))
+			return self._processPool
+
+
+def _createEncodedCover(bookPath: str) -> bytes:
+	"""
+	Runs in a thumbnail process, or a background thread. Decode the cover of the book at a reduced size
+	:return: The encoded cover thumbnail, since images can't be sent between processes
+	"""
+	fileOpener = FileOpenerFactory.getFileOpenerForFile(bookPath)
+	try:
+		coverIndex = ComicInfoParser(fileOpener).getFrontCoverIndex()
+		if coverIndex > fileOpener.getMaximumImageIndex():
+			coverIndex = 0
+		# Let the decoder create the thumbnail while decoding, that's a lot faster than decoding the full image and then scaling it down
+		cover, _ = ImageUtils.convertBytesToPreviewImage(fileOpener.getImageBytesByIndex(coverIndex), COVER_THUMBNAIL_SIZE)
+	finally:
+		fileOpener.close()
+	return ThumbnailStore.encodeThumbnail(cover)
@@ -0,0 +1,188 @@
+import logging, os, sqlite3, threading, time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from comicviewer.files import ComicInfoParser, FileUtils
+
+_catalogDatabasePath = os.path.join(FileUtils.getStoragePath(), 'library.sqlite')
+_CATALOG_VERSION = 2  # Increase when the table layout changes, the catalog then gets rebuilt by the next scan
+_connection: Optional[sqlite3.Connection] = None
+_connectionLock = threading.Lock()  # The scanner writes from a background thread while the UI reads, and a SQLite connection shouldn't be used by multiple threads at once
+
+# The columns that describe the book file itself. The comic info fields are stored in a column per field, named after the field
+_fileColumns = ('path', 'folderPath', 'fileName', 'fileSize', 'modifiedTime', 'pageCount', 'coverThumbnailKey', 'scanError')
+_comicInfoColumns = ComicInfoParser.getFieldNames()
+# The columns that can be searched through. They're indexed in a full-text search table, which SQLite keeps up-to-date with the books table through triggers
+_searchColumns = ('fileName',) + _comicInfoColumns
+_isSearchAvailable = True  # False if this SQLite version doesn't have full-text search
+_MAX_PATHS_PER_QUERY = 500  # SQLite limits how many parameters a statement can have, so books looked up by path are looked up in chunks of this size
+
+
+def getComicInfoColumns() -> Tuple[str, ...]:
+	""":return: The names of the comic info fields stored for each book"""
+	return _comicInfoColumns
+
+def getBookStates(folderPath: str) -> Dict[str, Tuple[int, float]]:
+	"""
+	Get the size and modification time of every catalogued book in the provided folder and its subfolders. Used by the scanner to find out which books changed
+	:param folderPath: The folder to get the book states of
+	:return: A dictionary with the book paths as key, and a tuple with the file size and modification time as value
+	"""
+	folderPrefix = os.path.join(os.path.abspath(folderPath), '')
+	try:
+		with _connectionLock:
+			rows = _getConnection().execute("SELECT path, fileSize, modifiedTime FROM books WHERE substr(path, 1, ?) = ?", (len(folderPrefix), folderPrefix)).fetchall()
+	except sqlite3.Error as e:
+		logging.error(f"Retrieving the catalogued books in '{folderPath}' failed with a '{type(e)}' exception: {e}")
+		return {}
+	return {path: (fileSize, modifiedTime) for path, fileSize, modifiedTime in rows}
+
+def getBook(bookPath: str) -> Optional[Dict[str, Any]]:
+	"""
+	Get the catalogued information of a book
+	:param bookPath: The path of the book
+	:return: A dictionary with the column names as key, or None if the book isn't catalogued
+	"""
+	books = _selectBooks("WHERE path = ?", (os.path.abspath(bookPath),))
+	return books[0] if books else None
+
+def getPageCounts(bookPaths: Iterable[str]) -> Dict[str, Optional[int]]:
+	"""
+	Get the page counts of multiple books at once, which is a lot quicker than getting each book separately
+	:param bookPaths: The paths of the books
+	:return: A dictionary with the provided book paths as keys, and their page count as value. The page count is None if the book isn't catalogued or its page count isn't known
+	"""
+	absolutePathToBookPath = {os.path.abspath(bookPath): bookPath for bookPath in bookPaths}
+	pageCounts: Dict[str, Optional[int]] = dict.fromkeys(absolutePathToBookPath.values(), None)
+	absolutePaths = list(absolutePathToBookPath)
+	for chunkStart in range(0, len(absolutePaths), _MAX_PATHS_PER_QUERY):
+		pathChunk = tuple(absolutePaths[chunkStart:chunkStart + _MAX_PATHS_PER_QUERY])
+		for book in _selectBooks(f"WHERE path IN ({', '.join('?' * len(pathChunk))})", pathChunk, 'path, pageCount'):
+			pageCounts[absolutePathToBookPath[book['path']]] = book['pageCount'] or None
+	return pageCounts
+
+def getBooksInFolder(folderPath: str) -> List[Dict[str, Any]]:
+	"""
+	Get the catalogued information of the books directly in the provided folder, so not those in subfolders
+	:param folderPath: The folder to get the books of
+	:return: A list of dictionaries with the column names as key
+	"""
+	return _selectBooks("WHERE folderPath = ?", (os.path.abspath(folderPath),))
+
+def searchBooks(searchText: str, maxResultCount: int = 200) -> List[Dict[str, Any]]:
+	"""
+	Find the books whose filename or comic info contains all the words in the provided search text. Words match at the start of words in the books, so searching while typing works
+	:param searchText: The words to search for
+	:param maxResultCount: The maximum number of books to return
+	:return: A list of dictionaries with the column names as key, the best matching books first. Empty if nothing matched or there's nothing to search for
+	"""
+	# Every word becomes a quoted prefix search, so characters that mean something in a full-text search query don't cause syntax errors
+	searchTerms = ['"' + searchWord.replace('"', '""') + '"*' for searchWord in searchText.split()]
+	if not searchTerms:
+		return []
+	startTime = time.perf_counter()
+	with _connectionLock:
+		_getConnection()
+	if not _isSearchAvailable:
+		return []
+	books = _selectBooks("JOIN bookSearch ON bookSearch.rowid = books.rowid WHERE bookSearch MATCH ? ORDER BY bookSearch.rank LIMIT ?", (' '.join(searchTerms), maxResultCount), 'books.*')
+	logging.debug(f"Searching the library for '{searchText}' found {len(books)} books and took {time.perf_counter() - startTime:.4f} seconds")
+	return books
+
+def storeBooks(books: Iterable[Dict[str, Any]]):
+	"""
+	Store or update the provided books in the catalog, all in one transaction
+	:param books: Dictionaries with at least the 'path', 'fileSize', and 'modifiedTime' keys, and optionally other column names as keys. Missing columns are stored as empty
+	"""
+	allColumns = _fileColumns + _comicInfoColumns
+	rows = []
+	for book in books:
+		bookPath = os.path.abspath(book['path'])
+		book = dict(book, path=bookPath, folderPath=os.path.dirname(bookPath), fileName=os.path.basename(bookPath))
+		rows.append(tuple(book.get(column, None) for column in allColumns))
+	if not rows:
+		return
+	try:
+		with _connectionLock:
+			connection = _getConnection()
+			# Update existing books instead of replacing them, since replacing doesn't trigger the search index update
+			updateClause = ', '.join(f"{column} = excluded.{column}" for column in allColumns[1:])
+			connection.executemany(f"INSERT INTO books ({', '.join(allColumns)}) VALUES ({', '.join('?' * len(allColumns))}) ON CONFLICT (path) DO UPDATE SET {updateClause}", rows)
+			connection.commit()
+	except sqlite3.Error as e:
+		logging.error(f"Storing {len(rows)} books in the library catalog failed with a '{type(e)}' exception: {e}")
+
+def removeBooks(bookPaths: Iterable[str]):
+	"""
+	Remove the provided books from the catalog, for instance because they got deleted
+	:param bookPaths: The paths of the books to remove
+	"""
+	rows = [(os.path.abspath(bookPath),) for bookPath in bookPaths]
+	if not rows:
+		return
+	try:
+		with _connectionLock:
+			connection = _getConnection()
+			connection.executemany("DELETE FROM books WHERE path = ?", rows)
+			connection.commit()
+	except sqlite3.Error as e:
+		logging.error(f"Removing {len(rows)} books from the library catalog failed with a '{type(e)}' exception: {e}")
+
+def close():
+	"""Close the catalog database. Should be called when the program closes. The database gets reopened if it's used again"""
+	global _connection
+	with _connectionLock:
+		if _connection is not None:
+			_connection.close()
+			_connection = None
+
+
+def _selectBooks(whereClause: str, parameters: Tuple, selectedColumns: str = '*') -> List[Dict[str, Any]]:
+	try:
+		with _connectionLock:
+			cursor = _getConnection().execute(f"SELECT {selectedColumns} FROM books {whereClause}", parameters)
+			columnNames = [columnDescription[0] for columnDescription in cursor.description]
+			rows = cursor.fetchall()
+	except sqlite3.Error as e:
+		logging.error(f"Retrieving books from the library catalog failed with a '{type(e)}' exception: {e}")
+		return []
+	return [dict(zip(columnNames, row)) for row in rows]
+
+def _getConnection() -> sqlite3.Connection:
+	global _connection, _isSearchAvailable
+	if _connection is None:
+		if not os.path.isdir(FileUtils.getStoragePath()):
+			os.makedirs(FileUtils.getStoragePath())
+		_connection = sqlite3.connect(_catalogDatabasePath, check_same_thread=False)
+		_connection.execute("PRAGMA journal_mode=WAL")
+		if _connection.execute("PRAGMA user_version").fetchone()[0] != _CATALOG_VERSION:
+			# The catalog can always be rebuilt from the library folder, so an outdated one can just be replaced
+			_connection.execute("DROP TABLE IF EXISTS bookSearch")
+			_connection.execute("DROP TABLE IF EXISTS books")
+			_connection.execute(f"PRAGMA user_version = {_CATALOG_VERSION}")
+		comicInfoColumnDefinitions = ''.join(f", {column} TEXT" for column in _comicInfoColumns)
+		_connection.execute("CREATE TABLE IF NOT EXISTS books (path TEXT PRIMARY KEY, folderPath TEXT NOT NULL, fileName TEXT NOT NULL, fileSize INTEGER NOT NULL, modifiedTime REAL NOT NULL, "
+							f"pageCount INTEGER, coverThumbnailKey TEXT, scanError TEXT{comicInfoColumnDefinitions})")
+		_connection.execute("CREATE INDEX IF NOT EXISTS booksByFolder ON books (folderPath)")
+		_isSearchAvailable = _createSearchIndex(_connection)
+		_connection.commit()
+	return _connection
+
+def _createSearchIndex(connection: sqlite3.Connection) -> bool:
+	""":return: True if the search index exists or got created, False if this SQLite version doesn't support full-text search"""
+	searchColumns = ', '.join(_searchColumns)
+	newSearchValues = ', '.join(f"new.{column}" for column in _searchColumns)
+	oldSearchValues = ', '.join(f"old.{column}" for column in _searchColumns)
+	try:
+		# The index doesn't store its own copy of the text, it reads it from the books table. Indexing two- and three-letter prefixes keeps searching while typing fast
+		connection.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS bookSearch USING fts5({searchColumns}, content='books', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+	except sqlite3.OperationalError as e:
+		logging.warning(f"Unable to create the library search index, so searching the library isn't possible: {e}")
+		return False
+	connection.execute(f"CREATE TRIGGER IF NOT EXISTS bookSearchInsert AFTER INSERT ON books BEGIN "
+					   f"INSERT INTO bookSearch (rowid, {searchColumns}) VALUES (new.rowid, {newSearchValues}); END")
+	connection.execute(f"CREATE TRIGGER IF NOT EXISTS bookSearchDelete AFTER DELETE ON books BEGIN "
+					   f"INSERT INTO bookSearch (bookSearch, rowid, {searchColumns}) VALUES ('delete', old.rowid, {oldSearchValues}); END")
+	connection.execute(f"CREATE TRIGGER IF NOT EXISTS bookSearchUpdate AFTER UPDATE ON books BEGIN "
+					   f"INSERT INTO bookSearch (bookSearch, rowid, {searchColumns}) VALUES ('delete', old.rowid, {oldSearchValues}); "
+					   f"INSERT INTO bookSearch (rowid, {searchColumns}) VALUES (new.rowid, {newSearchValues}); END")
+	return True
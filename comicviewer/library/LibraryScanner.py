@@ -0,0 +1,200 @@
+import concurrent.futures, logging, multiprocessing, os, threading, time
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Set
+
+from PySide6.QtCore import QFileSystemWatcher, QObject, QTimer, Signal
+
+from comicviewer.files import FileOpenerFactory
+from comicviewer.files.ComicInfoParser import ComicInfoParser
+from comicviewer.images import ThumbnailStore
+from comicviewer.library import LibraryCatalog
+from comicviewer.settings.SettingsEnum import SettingsEnum
+from comicviewer.settings import SettingsStore
+
+_STORE_BATCH_SIZE = 50  # How many scanned books get stored in the catalog at once. Storing them in one transaction is much faster than one by one, but the catalog shouldn't lag behind too far
+_RESCAN_DELAY = 1000  # Milliseconds to wait after a watched folder changed before rescanning it, so copying many books into a folder leads to one rescan instead of one per book
+
+
+class LibraryScanner(QObject):
+	"""
+	Keeps the library catalog up-to-date with the library folder. A scan only reads the books that are new or whose size or modification time changed since they were catalogued,
+	and reads them in separate processes, so opening many archives doesn't compete with the UI. Between scans, the library folders are watched, and changed folders get rescanned
+	"""
+	scanProgress = Signal(int, int)  # The number of changed books that have been read, and how many changed books were found in total
+	scanFinished = Signal(str)  # The path of the folder that got scanned
+	catalogChanged = Signal(list)  # The paths of the books that got added, updated, or removed from the catalog
+	_foldersFound = Signal(int, list)  # Internal, used to add found folders to the watcher on the UI thread, since the watcher can't be used from the scanning thread
+
+	_scanExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='LibraryScanner')  # Scans run one at a time, so the catalog never gets updated by two scans at once
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._libraryPath: Optional[str] = None
+		# Increased when the library path changes or the scanner gets closed, so running scans of the previous library know to stop
+		self._scanGeneration = 0
+		self._processPool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+		self._processPoolLock = threading.Lock()
+		self._folderWatcher = QFileSystemWatcher(self)
+		self._folderWatcher.directoryChanged.connect(self._onFolderChanged)
+		self._foldersFound.connect(self._watchFolders)
+		self._changedFolders: Set[str] = set()
+		self._rescanTimer = QTimer(self)
+		self._rescanTimer.setSingleShot(True)
+		self._rescanTimer.setInterval(_RESCAN_DELAY)
+		self._rescanTimer.timeout.connect(self._rescanChangedFolders)
+
+	def scanLibrary(self, libraryPath: str):
+		"""
+		Scan the provided library folder in the background, and watch it for changes from then on. Stops scanning and watching the previous library folder
+		:param libraryPath: The library folder to scan
+		"""
+		self._scanGeneration += 1
+		self._rescanTimer.stop()
+		self._changedFolders.clear()
+		watchedFolders = self._folderWatcher.directories()
+		if watchedFolders:
+			self._folderWatcher.removePaths(watchedFolders)
+		if not libraryPath or not os.path.isdir(libraryPath):
+			self._libraryPath = None
+			return
+		self._libraryPath = os.path.abspath(libraryPath)
+		self._submitScan(self._libraryPath)
+
+	def close(self):
+		"""Stop scanning and watching. Should be called when the program closes"""
+		self._scanGeneration += 1
+		self._rescanTimer.stop()
+		self._scanExecutor.shutdown(wait=False, cancel_futures=True)
+		self._shutDownProcessPool()
+
+	def _submitScan(self, folderPath: str):
+		scanFuture = self._scanExecutor.submit(self._scanFolder, folderPath, self._scanGeneration)
+		scanFuture.add_done_callback(self._onScanDone)
+
+	@staticmethod
+	def _onScanDone(scanFuture: concurrent.futures.Future):
+		if not scanFuture.cancelled() and scanFuture.exception() is not None:
+			logging.error(f"Scanning the library failed with a '{type(scanFuture.exception())}' exception: {scanFuture.exception()}")
+
+	def _scanFolder(self, folderPath: str, scanGeneration: int):
+		"""Runs on the scanning thread. Find the books in the folder and its subfolders, and update the catalog for the books that changed"""
+		startTime = time.perf_counter()
+		foundFolders = []
+		foundBookStates = {}
+		for currentFolderPath, _, fileNames in os.walk(folderPath):
+			if scanGeneration != self._scanGeneration:
+				return
+			foundFolders.append(currentFolderPath)
+			for fileName in fileNames:
+				if FileOpenerFactory.isFileSupported(fileName):
+					bookPath = os.path.join(currentFolderPath, fileName)
+					try:
+						fileStats = os.stat(bookPath)
+					except OSError:
+						# The book got removed while scanning, or isn't accessible
+						continue
+					foundBookStates[bookPath] = (fileStats.st_size, fileStats.st_mtime)
+		self._foldersFound.emit(scanGeneration, foundFolders)
+		catalogedBookStates = LibraryCatalog.getBookStates(folderPath)
+		removedBookPaths = [bookPath for bookPath in catalogedBookStates if bookPath not in foundBookStates]
+		LibraryCatalog.removeBooks(removedBookPaths)
+		changedBookPaths = [bookPath for bookPath, bookState in foundBookStates.items() if catalogedBookStates.get(bookPath, None) != bookState]
+		logging.debug(f"Finding {len(changedBookPaths)} changed and {len(removedBookPaths)} removed books out of {len(foundBookStates)} in '{folderPath}' took {time.perf_counter() - startTime:.4f} seconds")
+		if removedBookPaths:
+			self.catalogChanged.emit(removedBookPaths)
+		if changedBookPaths:
+			self._readAndStoreBooks(changedBookPaths, foundBookStates, scanGeneration)
+			self._shutDownProcessPool()
+		if scanGeneration == self._scanGeneration:
+			logging.info(f"Scanning library folder '{folderPath}' took {time.perf_counter() - startTime:.4f} seconds")
+			self.scanFinished.emit(folderPath)
+
+	def _readAndStoreBooks(self, bookPaths: List[str], bookStates: Dict[str, tuple], scanGeneration: int):
+		processPool = self._getProcessPool()
+		if processPool is None:
+			bookInfos = map(_readBookInfo, bookPaths)
+		else:
+			bookInfos = processPool.map(_readBookInfo, bookPaths, chunksize=4)
+		booksToStore = []
+		try:
+			for bookIndex, bookInfo in enumerate(bookInfos, start=1):
+				if scanGeneration != self._scanGeneration:
+					return
+				bookPath = bookInfo['path']
+				# Use the state from before the book was read, so if it changed while it was being read, the next scan sees it as changed again
+				bookInfo['fileSize'], bookInfo['modifiedTime'] = bookStates[bookPath]
+				bookInfo['coverThumbnailKey'] = ThumbnailStore.getBookKey(bookPath)
+				booksToStore.append(bookInfo)
+				if len(booksToStore) >= _STORE_BATCH_SIZE or bookIndex == len(bookPaths):
+					LibraryCatalog.storeBooks(booksToStore)
+					self.catalogChanged.emit([book['path'] for book in booksToStore])
+					booksToStore = []
+					self.scanProgress.emit(bookIndex, len(bookPaths))
+		except (concurrent.futures.CancelledError, BrokenProcessPool) as e:
+			# The scanner got closed while reading, or a reading process crashed. What's already stored is fine, the rest gets read by the next scan
+			logging.warning(f"Reading the library books stopped with {type(e)} exception: {e}")
+		finally:
+			if booksToStore:
+				LibraryCatalog.storeBooks(booksToStore)
+
+	def _getProcessPool(self) -> Optional[concurrent.futures.ProcessPoolExecutor]:
+		""":return: The process pool to read books in, or None if books should be read in the scanning thread"""
+		processCount = SettingsStore.getSettingValue(SettingsEnum.LIBRARY_SCAN_PROCESS_COUNT)
+		if processCount <= 0:
+			return None
+		with self._processPoolLock:
+			if self._processPool is None:
+				# Always spawn new processes instead of forking this one, since a forked copy of a running Qt program isn't safe to use
+				self._processPool = concurrent.futures.ProcessPoolExecutor(max_workers=processCount, mp_context=multiprocessing.get_context('spawn'))
+			return self._processPool
+
+	def _shutDownProcessPool(self):
+		# The processes are only needed while reading books, so don't keep them around between scans
+		with self._processPoolLock:
+			if self._processPool is not None:
+				self._processPool.shutdown(wait=False, cancel_futures=True)
+				self._processPool = None
+
+	def _watchFolders(self, scanGeneration: int, folderPaths: List[str]):
+		if scanGeneration != self._scanGeneration:
+			return
+		watchedFolders = set(self._folderWatcher.directories())
+		foldersToWatch = [folderPath for folderPath in folderPaths if folderPath not in watchedFolders]
+		if foldersToWatch:
+			self._folderWatcher.addPaths(foldersToWatch)
+
+	def _onFolderChanged(self, folderPath: str):
+		self._changedFolders.add(folderPath)
+		# Restart the timer, so the rescan only happens once the folder stops changing
+		self._rescanTimer.start()
+
+	def _rescanChangedFolders(self):
+		changedFolders = sorted(self._changedFolders)
+		self._changedFolders.clear()
+		for folderIndex, folderPath in enumerate(changedFolders):
+			# A scan of a folder includes its subfolders, so subfolders of changed folders don't need their own scan
+			if any(folderPath.startswith(os.path.join(otherFolderPath, '')) for otherFolderPath in changedFolders[:folderIndex]):
+				continue
+			if self._libraryPath and (folderPath == self._libraryPath or folderPath.startswith(os.path.join(self._libraryPath, ''))):
+				logging.debug(f"Library folder '{folderPath}' changed, rescanning it")
+				self._submitScan(folderPath)
+
+
+def _readBookInfo(bookPath: str) -> Dict[str, Any]:
+	"""
+	Runs in a reading process, or the scanning thread. Open the book and read its page count and comic info
+	:return: A dictionary with the catalog column names as keys. If the book couldn't be read, 'scanError' contains why
+	"""
+	bookInfo: Dict[str, Any] = {'path': bookPath}
+	fileOpener = None
+	try:
+		fileOpener = FileOpenerFactory.getFileOpenerForFile(bookPath)
+		bookInfo['pageCount'] = fileOpener.getMaximumImageIndex() + 1
+		bookInfo.update(ComicInfoParser(fileOpener).getFieldValues())
+	except Exception as e:
+		# Broken archives and unparsable comic info shouldn't stop the scan, but they should be catalogued, so they're not read again until they change
+		bookInfo['scanError'] = f"{type(e).__name__}: {e}"
+	finally:
+		if fileOpener is not None:
+			fileOpener.close()
+	return bookInfo
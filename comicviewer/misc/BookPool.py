@@ -0,0 +1,122 @@
+import logging, os, time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, FrozenSet, Iterable, Optional
+
+from PySide6.QtCore import QTimer
+
+from comicviewer.settings import SettingsStore
+from comicviewer.settings.SettingsEnum import SettingsEnum
+
+if TYPE_CHECKING:
+	from comicviewer.files.BaseFileOpener import BaseFileOpener
+	from comicviewer.files.ComicInfoParser import ComicInfoParser
+	from comicviewer.images.ImageCacheHandler import ImageCacheHandler
+
+
+class PooledBook:
+	"""A book that was closed, but whose opened archive, parsed comic info and cached images are kept around so reopening it is near-instant"""
+	def __init__(self, fileOpener, comicInfoParser, imageCacheHandler):
+		self.fileOpener: BaseFileOpener = fileOpener
+		self.comicInfoParser: ComicInfoParser = comicInfoParser
+		self.imageCacheHandler: ImageCacheHandler = imageCacheHandler
+		self.bookPath: str = fileOpener.filepath
+		self.storedTime: float = time.monotonic()
+		# Store when the file was last modified, so we can check if the pooled data is still valid when it's retrieved
+		self.fileModifiedTime: float = _getFileModifiedTime(self.bookPath)
+
+	def getMemoryUsage(self) -> int:
+		""":return: How many bytes the cached images of this book take up"""
+		return self.imageCacheHandler.getMemoryUsage()
+
+	def isExpired(self) -> bool:
+		""":return: True if this book has been in the pool longer than allowed, False otherwise"""
+		return time.monotonic() - self.storedTime > SettingsStore.getSettingValue(SettingsEnum.CLOSED_BOOK_POOL_TIMEOUT)
+
+	def isStillValid(self) -> bool:
+		""":return: True if the book file wasn't changed or removed since it was put in the pool, False otherwise"""
+		return self.fileModifiedTime is not None and self.fileModifiedTime == _getFileModifiedTime(self.bookPath)
+
+	def close(self):
+		"""Fully close the book. This pooled book can't be used anymore after this"""
+		self.imageCacheHandler.trimCache()
+		self.fileOpener.close()
+
+
+_pooledBooks: Dict[str, PooledBook] = OrderedDict()  # The pooled books, keyed by their path. The last entry is the most recently closed book
+
+
+def storeClosedBook(fileOpener: 'BaseFileOpener', comicInfoParser: 'ComicInfoParser', imageCacheHandler: 'ImageCacheHandler', indexesToKeep: Iterable[int] = ()):
+	"""
+	Store a closed book in the pool, so it can be reopened quickly. If the pool is disabled, the book gets closed immediately
+	:param fileOpener: The opener of the closed book. This will be closed by the pool when the book gets removed from the pool
+	:param comicInfoParser: The comic info parser of the closed book
+	:param imageCacheHandler: The image cache of the closed book
+	:param indexesToKeep: The image indexes that should be kept in the image cache, usually the images that were displayed when the book was closed. Other images get uncached
+	"""
+	imageCacheHandler.trimCache(*indexesToKeep)
+	pooledBook = PooledBook(fileOpener, comicInfoParser, imageCacheHandler)
+	if SettingsStore.getSettingValue(SettingsEnum.CLOSED_BOOK_POOL_SIZE) <= 0:
+		pooledBook.close()
+		return
+	# If this book was somehow already in the pool, replace the old entry
+	oldPooledBook = _pooledBooks.pop(pooledBook.bookPath, None)
+	if oldPooledBook is not None and oldPooledBook.fileOpener is not fileOpener:
+		oldPooledBook.close()
+	_pooledBooks[pooledBook.bookPath] = pooledBook
+	logging.debug(f"Stored '{pooledBook.bookPath}' in the closed book pool, using {pooledBook.getMemoryUsage() / 1048576:.2f} MB of image memory")
+	trimPool()
+	# Make sure the book gets removed once it expires, even if the pool isn't used in the meantime. Add a second to make sure it's actually expired when the timer fires
+	QTimer.singleShot((SettingsStore.getSettingValue(SettingsEnum.CLOSED_BOOK_POOL_TIMEOUT) + 1) * 1000, trimPool)
+
+def takeBook(bookPath: str) -> Optional[PooledBook]:
+	"""
+	Retrieve a book from the pool. The retrieved book is removed from the pool, so the caller is responsible for closing it
+	:param bookPath: The path of the book to retrieve
+	:return: The pooled book if it's in the pool and still valid, or None if it isn't available
+	"""
+	pooledBook = _pooledBooks.pop(bookPath, None)
+	if pooledBook is None:
+		return None
+	if pooledBook.isExpired() or not pooledBook.isStillValid():
+		logging.debug(f"Pooled book '{bookPath}' expired or changed on disk, not reusing it")
+		pooledBook.close()
+		return None
+	logging.debug(f"Reopening '{bookPath}' from the closed book pool")
+	return pooledBook
+
+def hasBook(bookPath: str) -> bool:
+	""":return: True if the provided book is in the pool, False otherwise. Doesn't check if the pooled book is still valid"""
+	return bookPath in _pooledBooks
+
+def trimPool():
+	"""Close and remove the pooled books that are expired, and the oldest books if the pool is larger than the book count or memory limit allow"""
+	maxPoolSize = SettingsStore.getSettingValue(SettingsEnum.CLOSED_BOOK_POOL_SIZE)
+	maxMemoryUsage = SettingsStore.getSettingValue(SettingsEnum.CLOSED_BOOK_POOL_MEMORY_LIMIT) * 1048576  # Setting is in megabytes, convert to bytes
+	memoryUsage = sum(pooledBook.getMemoryUsage() for pooledBook in _pooledBooks.values())
+	# The pooled books are ordered from oldest to newest, so we remove from the start
+	for bookPath in list(_pooledBooks.keys()):
+		pooledBook = _pooledBooks[bookPath]
+		if pooledBook.isExpired() or len(_pooledBooks) > maxPoolSize or memoryUsage > maxMemoryUsage:
+			_pooledBooks.pop(bookPath)
+			memoryUsage -= pooledBook.getMemoryUsage()
+			pooledBook.close()
+			logging.debug(f"Removed '{bookPath}' from the closed book pool")
+
+def clearPool():
+	"""Close and remove all the pooled books. Should be called when the program closes"""
+	for pooledBook in _pooledBooks.values():
+		pooledBook.close()
+	_pooledBooks.clear()
+
+
+def _getFileModifiedTime(filePath: str) -> Optional[float]:
+	try:
+		return os.path.getmtime(filePath)
+	except OSError:
+		return None
+
+def _onPoolSettingsChanged(settings: SettingsStore.SettingsSnapshot, changedSettings: FrozenSet[SettingsEnum]):
+	trimPool()
+
+
+SettingsStore.registerSettingsChangeListener(_onPoolSettingsChanged, SettingsEnum.CLOSED_BOOK_POOL_SIZE, SettingsEnum.CLOSED_BOOK_POOL_TIMEOUT, SettingsEnum.CLOSED_BOOK_POOL_MEMORY_LIMIT)
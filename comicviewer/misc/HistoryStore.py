@@ -1,17 +1,33 @@
-import json, logging, os
-from typing import List, Optional
+import concurrent.futures, json, logging, os, sqlite3, threading, time
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional
 
 from comicviewer.files import FileUtils
 from comicviewer.settings import SettingsStore
 from comicviewer.settings.SettingsEnum import SettingsEnum
 
-_historyFilePath = os.path.join(FileUtils.getStoragePath(), 'history.json')
-_bookOpenedHistory = []  # The order in which books were loaded, basically the history. Index 0 is the most recently loaded book
-_bookToPage = {}  # Which page each book is at
+# The history is kept in memory, so reading it is instant, and every change is also written to a SQLite database in the background, one row at a time
+# That way, opening a book or turning a page doesn't rewrite the whole history on the UI thread, and a crash loses at most the changes still being written
+_historyDatabasePath = os.path.join(FileUtils.getStoragePath(), 'history.sqlite')
+_legacyHistoryFilePath = os.path.join(FileUtils.getStoragePath(), 'history.json')  # Where the history was stored before, it gets moved into the database once
+_connection: Optional[sqlite3.Connection] = None
+_connectionLock = threading.Lock()
+_writeExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='HistoryWriter')  # A single thread, so changes get written in the order they were made
+
+_bookOpenedHistory: Dict[str, int] = OrderedDict()  # The order in which books were loaded, basically the history. The last entry is the most recently loaded book. The value is the order number stored in the database
+_lastOpenedCounter = 0  # The order number of the most recently opened book
+# The position of each book in '_bookOpenedHistory', with 0 being the oldest book. Page turns need the history index of their book, so this saves searching the history for it every time
+# Changing the order of the history changes the positions, so then this is set to None, and it's rebuilt the next time it's needed
+_bookToHistoryPosition: Optional[Dict[str, int]] = None
+_bookToPage: Dict[str, int] = {}  # Which page each book is at
 _currentSession = []  # Which books are currently open
 _currentlySelectedBookPath = None  # Which book is currently selected
 
-_needsSaving: bool = False
+# Functions that get called with a book path, its old index in the history and its new index, when the history changes. Index 0 is the most recently loaded book
+# The old index is None if the book got added, the new index is None if it got removed, and they're the same if only the stored page of the book changed
+_historyChangeListeners: List[Callable[[str, Optional[int], Optional[int]], None]] = []
+
+_needsSaving: bool = False  # Whether the session or the selected book changed since they were last saved. History and page changes are saved immediately
 
 
 def storeBookOpened(bookPath: str):
@@ -19,11 +35,18 @@ def storeBookOpened(bookPath: str):
 	Store that a book was opened
 	:param bookPath: The path of the book that was opened
 	"""
-	if bookPath in _bookOpenedHistory:
-		_bookOpenedHistory.remove(bookPath)
-	_bookOpenedHistory.insert(0, bookPath)
+	global _lastOpenedCounter
+	_lastOpenedCounter += 1
+	oldHistoryIndex = _getHistoryIndex(bookPath)
+	_bookOpenedHistory.pop(bookPath, None)
+	_bookOpenedHistory[bookPath] = _lastOpenedCounter
+	_clearHistoryPositions()
+	if oldHistoryIndex != 0:
+		_notifyHistoryChangeListeners(bookPath, oldHistoryIndex, 0)
+	_submitWrite("INSERT INTO books (path, page, lastOpened) VALUES (?, 0, ?) ON CONFLICT (path) DO UPDATE SET lastOpened = excluded.lastOpened", (bookPath, _lastOpenedCounter))
 	if bookPath not in _currentSession:
 		_currentSession.append(bookPath)
+		_setNeedsSaving()
 	trimHistory()
 	saveHistory()
 
@@ -31,18 +54,17 @@ def storeBookClosed(bookPath: str, shouldSave: bool = True):
 	"""
 	Store that a book was closed
 	:param bookPath: The path of the book that was closed
-	:param shouldSave: Whether the session change should be saved to file. Should usually be left on True. If set to False, be sure to call 'saveHistory()' manually
+	:param shouldSave: Whether the session change should be saved. Should usually be left on True. If set to False, be sure to call 'saveHistory()' manually
 	"""
 	_currentSession.remove(bookPath)
+	_setNeedsSaving()
 	if shouldSave:
 		saveHistory()
-	else:
-		_setNeedsSaving()
 
 def setCurrentBook(bookPath: str or None):
 	"""
 	Set which book is currently opened and displayed. Used to show the same book when the program is closed and reopened
-	:param bookPath: The bookpath to store at the currently displayed book. Set to None to clear the stored book khkhkhuhhuhuhuh
+	:param bookPath: The bookpath to store at the currently displayed book. Set to None to clear the stored book
 	"""
 	global _currentlySelectedBookPath
 	_currentlySelectedBookPath = bookPath
@@ -56,17 +78,22 @@ def getStoredPage(bookPath: str):
 	return _bookToPage.get(bookPath, 0)
 
 def setStoredPage(bookPath: str, index: int):
+	if _bookToPage.get(bookPath, 0) == index:
+		return
 	# No need to store that we're at the first page
 	if index == 0:
 		_bookToPage.pop(bookPath, None)
 	else:
 		_bookToPage[bookPath] = index
-	_setNeedsSaving()
+	if _historyChangeListeners and bookPath in _bookOpenedHistory:
+		historyIndex = _getHistoryIndex(bookPath)
+		_notifyHistoryChangeListeners(bookPath, historyIndex, historyIndex)
+	_submitWrite("INSERT INTO books (path, page) VALUES (?, ?) ON CONFLICT (path) DO UPDATE SET page = excluded.page", (bookPath, index))
 
 def getHistory() -> List[str]:
 	""":return:	Returns a list with the book history. Index 0 is the most recently loaded book.
 	This is a copy of the actual list, so modifications to the history list aren't reflected in the returned list"""
-	return _bookOpenedHistory[:]
+	return list(reversed(_bookOpenedHistory))
 
 def getSession() -> List[str]:
 	"""Get a copy of the current session list. Since it's a copy, modifications to the session list aren't reflected in the returned list"""
@@ -79,9 +106,12 @@ def removeFromHistory(bookPath: str) -> bool:
 	:return: True if the book was removed, False if it wasn't removed because it's currently open
 	"""
 	if bookPath in _bookOpenedHistory and bookPath not in _currentSession:
-		_bookOpenedHistory.remove(bookPath)
+		historyIndex = _getHistoryIndex(bookPath)
+		del _bookOpenedHistory[bookPath]
+		_clearHistoryPositions()
+		_notifyHistoryChangeListeners(bookPath, historyIndex, None)
 		_bookToPage.pop(bookPath, None)
-		_setNeedsSaving()
+		_submitWrite("DELETE FROM books WHERE path = ?", (bookPath,))
 		return True
 	return False
 
@@ -90,72 +120,193 @@ def clearHistory() -> bool:
 	Clear the entire history, except for books currently opened
 	:return: True if the entire history was cleared, False if one or more books were kept because they're curently opened
 	"""
-	global _bookOpenedHistory
 	wasFullyCleared = True
-	for bookPath in _bookOpenedHistory[:]:
+	removedBookPaths = []
+	# Go from the oldest to the newest book, so the index of the books that still need to be checked doesn't change by removing one
+	for historyIndex, bookPath in zip(range(len(_bookOpenedHistory) - 1, -1, -1), list(_bookOpenedHistory)):
 		# Only remove the books from history that aren't currently open
 		if bookPath not in _currentSession:
-			_bookOpenedHistory.remove(bookPath)
+			del _bookOpenedHistory[bookPath]
+			_clearHistoryPositions()
+			_notifyHistoryChangeListeners(bookPath, historyIndex, None)
 			_bookToPage.pop(bookPath, None)
+			removedBookPaths.append(bookPath)
 		else:
 			wasFullyCleared = False
-	saveHistory()
+	_submitWrite("DELETE FROM books WHERE path = ?", [(bookPath,) for bookPath in removedBookPaths], True)
 	return wasFullyCleared
 
 def trimHistory():
 	"""Make sure the history doesn't get larger than allowed"""
-	global _bookOpenedHistory
 	maxHistorySize = SettingsStore.getSettingValue(SettingsEnum.BOOK_HISTORY_SIZE)
-	if maxHistorySize == 0:
-		# Keep no history, only update the list if we weren't already storing nothing
-		if len(_bookOpenedHistory) > 0:
-			_bookOpenedHistory = []
-			_setNeedsSaving()
-	elif len(_bookOpenedHistory) > maxHistorySize:
-		# Remove the oldest book(s) from the history to shrink it back to the required size
-		for bookPath in _bookOpenedHistory[maxHistorySize:]:
-			if bookPath not in _currentSession:
-				_bookToPage.pop(bookPath, None)
-		_bookOpenedHistory = _bookOpenedHistory[:maxHistorySize]
-		_setNeedsSaving()
+	if len(_bookOpenedHistory) <= maxHistorySize:
+		return
+	# Remove the oldest book(s) from the history to shrink it back to the required size. The history is ordered from oldest to newest, so remove from the start
+	trimmedBookPaths = []
+	while len(_bookOpenedHistory) > maxHistorySize:
+		bookPath, _ = _bookOpenedHistory.popitem(last=False)
+		_clearHistoryPositions()
+		trimmedBookPaths.append(bookPath)
+		_notifyHistoryChangeListeners(bookPath, len(_bookOpenedHistory), None)
+	# Opened books keep their page, so they still continue where they were while they're open
+	removedBookPaths = [bookPath for bookPath in trimmedBookPaths if bookPath not in _currentSession]
+	for bookPath in removedBookPaths:
+		_bookToPage.pop(bookPath, None)
+	_submitWrite("DELETE FROM books WHERE path = ?", [(bookPath,) for bookPath in removedBookPaths], True)
+	_submitWrite("UPDATE books SET lastOpened = NULL WHERE path = ?", [(bookPath,) for bookPath in trimmedBookPaths if bookPath in _currentSession], True)
+
+def registerHistoryChangeListener(listener: Callable[[str, Optional[int], Optional[int]], None]):
+	"""
+	Register a function to be called when the history changes, so views of the history can be updated without reloading the whole history
+	:param listener: Gets called with the book path, its old index in the history, and its new index. Index 0 is the most recently loaded book.
+		The old index is None if the book got added, the new index is None if it got removed, and they're the same if only the stored page of the book changed
+	"""
+	_historyChangeListeners.append(listener)
+
+def unregisterHistoryChangeListener(listener: Callable[[str, Optional[int], Optional[int]], None]):
+	if listener in _historyChangeListeners:
+		_historyChangeListeners.remove(listener)
 
 def saveHistory():
+	"""Save the session and the selected book, if they changed. Changes to the history and the stored pages are saved as they happen, in the background"""
 	if not _needsSaving:
 		return
-	if not os.path.isdir(FileUtils.getStoragePath()):
-		os.makedirs(FileUtils.getStoragePath())
-	historyData = {'loadOrder': _bookOpenedHistory, 'bookToPage': _bookToPage}
-	if SettingsStore.getSettingValue(SettingsEnum.RESTORE_PREVIOUS_SESSION):
-		historyData['session'] = _currentSession
-	if _currentlySelectedBookPath:
-		historyData['selectedBook'] = _currentlySelectedBookPath
-	with open(_historyFilePath, 'w') as historyFile:
-		json.dump(historyData, historyFile)
+	sessionData = {'session': _currentSession[:] if SettingsStore.getSettingValue(SettingsEnum.RESTORE_PREVIOUS_SESSION) else [], 'selectedBook': _currentlySelectedBookPath}
+	_submitWrite("INSERT OR REPLACE INTO sessionState (name, value) VALUES (?, ?)", [(name, json.dumps(value)) for name, value in sessionData.items()], True)
 	_setNeedsSaving(False)
 
+def close():
+	"""Save the session, and wait until all changes are written. Should be called when the program closes"""
+	global _connection
+	saveHistory()
+	_writeExecutor.shutdown(wait=True)
+	with _connectionLock:
+		if _connection is not None:
+			_connection.close()
+			_connection = None
+
+
+def _getHistoryIndex(bookPath: str) -> Optional[int]:
+	""":return: The index of the book in the history, with index 0 being the most recently loaded book, or None if it's not in the history"""
+	global _bookToHistoryPosition
+	if bookPath not in _bookOpenedHistory:
+		return None
+	if _bookToHistoryPosition is None:
+		_bookToHistoryPosition = {historyBookPath: position for position, historyBookPath in enumerate(_bookOpenedHistory)}
+	# The most recently loaded book is at the end of the history, but has index 0
+	return len(_bookOpenedHistory) - 1 - _bookToHistoryPosition[bookPath]
+
+def _clearHistoryPositions():
+	"""Should be called after books got added to or removed from the history, or got moved in it, since that changes the positions of the books"""
+	global _bookToHistoryPosition
+	_bookToHistoryPosition = None
+
+def _notifyHistoryChangeListeners(bookPath: str, oldIndex: Optional[int], newIndex: Optional[int]):
+	for listener in _historyChangeListeners:
+		listener(bookPath, oldIndex, newIndex)
+
+def _onHistorySizeChanged(settings: SettingsStore.SettingsSnapshot, changedSettings: FrozenSet[SettingsEnum]):
+	trimHistory()
+
+def _submitWrite(sqlStatement: str, parameters: Iterable, isMultipleRows: bool = False):
+	"""
+	Write a change to the database in the background
+	:param sqlStatement: The SQL statement to execute
+	:param parameters: The parameters for the statement, or if 'isMultipleRows' is True, a list with the parameters for each row
+	:param isMultipleRows: If True, the statement is executed once for each entry in 'parameters', in a single transaction
+	"""
+	if isMultipleRows and not parameters:
+		return
+	try:
+		_writeExecutor.submit(_write, sqlStatement, parameters, isMultipleRows)
+	except RuntimeError:
+		# The writer was already shut down because the program is closing. Write it directly instead of losing the change
+		_write(sqlStatement, parameters, isMultipleRows)
+
+def _write(sqlStatement: str, parameters: Iterable, isMultipleRows: bool):
+	startTime = time.perf_counter()
+	try:
+		with _connectionLock:
+			connection = _getConnection()
+			if isMultipleRows:
+				connection.executemany(sqlStatement, parameters)
+			else:
+				connection.execute(sqlStatement, parameters)
+			connection.commit()
+	except sqlite3.Error as e:
+		logging.error(f"Saving history change failed with a '{type(e)}' exception: {e}")
+		return
+	logging.debug(f"Saving history change took {time.perf_counter() - startTime:.4f} seconds")
+
+def _getConnection() -> sqlite3.Connection:
+	global _connection
+	if _connection is None:
+		if not os.path.isdir(FileUtils.getStoragePath()):
+			os.makedirs(FileUtils.getStoragePath())
+		_connection = sqlite3.connect(_historyDatabasePath, check_same_thread=False)
+		_connection.execute("PRAGMA journal_mode=WAL")
+		# In WAL mode this is still safe against corruption from crashes, it just doesn't wait for the disk after every single change
+		_connection.execute("PRAGMA synchronous=NORMAL")
+		_connection.execute("CREATE TABLE IF NOT EXISTS books (path TEXT PRIMARY KEY, page INTEGER NOT NULL DEFAULT 0, lastOpened INTEGER)")
+		_connection.execute("CREATE INDEX IF NOT EXISTS booksByLastOpened ON books (lastOpened)")
+		_connection.execute("CREATE TABLE IF NOT EXISTS sessionState (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+		_connection.commit()
+	return _connection
+
+def _migrateLegacyHistory(connection: sqlite3.Connection):
+	"""Move the history from the JSON file it used to be stored in into the database. The JSON file is kept with another name, in case something goes wrong"""
+	try:
+		with open(_legacyHistoryFilePath, 'r') as historyFile:
+			historyData = json.load(historyFile)
+	except Exception as e:
+		logging.error(f"Loading the old history file failed with a '{type(e)}' exception, not migrating it: {e}")
+		return
+	loadOrder: List[str] = historyData.get('loadOrder', [])
+	bookToPage: Dict[str, int] = historyData.get('bookToPage', {})
+	bookRows = {bookPath: [bookToPage.get(bookPath, 0), len(loadOrder) - loadOrderIndex] for loadOrderIndex, bookPath in enumerate(loadOrder)}
+	for bookPath, page in bookToPage.items():
+		bookRows.setdefault(bookPath, [page, None])
+	connection.executemany("INSERT OR REPLACE INTO books (path, page, lastOpened) VALUES (?, ?, ?)", [(bookPath, page, lastOpened) for bookPath, (page, lastOpened) in bookRows.items()])
+	connection.executemany("INSERT OR REPLACE INTO sessionState (name, value) VALUES (?, ?)", [('session', json.dumps(historyData.get('session', []))), ('selectedBook', json.dumps(historyData.get('selectedBook', None)))])
+	connection.commit()
+	os.replace(_legacyHistoryFilePath, _legacyHistoryFilePath + '.migrated')
+	logging.info(f"Moved {len(loadOrder)} history entries from '{_legacyHistoryFilePath}' into the history database")
+
 def _loadHistory():
-	global _bookOpenedHistory, _bookToPage, _currentSession, _currentlySelectedBookPath
-	historyData = {}
-	if os.path.isfile(_historyFilePath):
-		try:
-			with open(_historyFilePath, 'r') as historyFile:
-				historyData = json.load(historyFile)
-		except Exception as e:
-			logging.error(f"Loading the history data failed with a '{type(e)}' exception: {e}")
-	# Parse the loaded data (or use defaults if it's missing)
-	_bookOpenedHistory = historyData.get('loadOrder', [])
-	_bookToPage = historyData.get('bookToPage', {})
+	global _lastOpenedCounter, _currentSession, _currentlySelectedBookPath
+	startTime = time.perf_counter()
+	sessionData = {}
+	try:
+		with _connectionLock:
+			connection = _getConnection()
+			if os.path.isfile(_legacyHistoryFilePath):
+				_migrateLegacyHistory(connection)
+			# Books that aren't in the history and are on the first page don't need to be stored anymore
+			connection.execute("DELETE FROM books WHERE lastOpened IS NULL AND page = 0")
+			connection.commit()
+			bookRows = connection.execute("SELECT path, page, lastOpened FROM books ORDER BY lastOpened").fetchall()
+			sessionData = {name: json.loads(value) for name, value in connection.execute("SELECT name, value FROM sessionState")}
+	except (sqlite3.Error, ValueError) as e:
+		logging.error(f"Loading the history data failed with a '{type(e)}' exception: {e}")
+		bookRows = []
+	for bookPath, page, lastOpened in bookRows:
+		if page:
+			_bookToPage[bookPath] = page
+		if lastOpened is not None:
+			_bookOpenedHistory[bookPath] = lastOpened
+			_lastOpenedCounter = max(_lastOpenedCounter, lastOpened)
 	if SettingsStore.getSettingValue(SettingsEnum.RESTORE_PREVIOUS_SESSION):
-		_currentSession = historyData.get('session', [])
-		_currentlySelectedBookPath = historyData.get('selectedBook', None)
+		_currentSession = sessionData.get('session', [])
+		_currentlySelectedBookPath = sessionData.get('selectedBook', None)
 	else:
 		_currentSession = []
 		_currentlySelectedBookPath = None
 	_setNeedsSaving(False)
+	logging.debug(f"Loading {len(_bookOpenedHistory)} history entries took {time.perf_counter() - startTime:.4f} seconds")
 
 def _setNeedsSaving(needsSaving: bool = True):
 	"""
-	Set that the in-memory data differs from the on-disk data, so that we need to save
+	Set that the in-memory session data differs from the stored data, so that we need to save
 	:param needsSaving: When True (the default), set that we need to save. When False, store that there is no in-memory data we need to save at the moment
 	"""
 	global _needsSaving
@@ -163,3 +314,4 @@ def _setNeedsSaving(needsSaving: bool = True):
 
 
 _loadHistory()
+SettingsStore.registerSettingsChangeListener(_onHistorySizeChanged, SettingsEnum.BOOK_HISTORY_SIZE)
@@ -9,17 +9,33 @@ class SettingsEnum(Enum):
 	CACHE_AHEAD_COUNT = 2, "How many pages ahead of the current one will be loaded in advance to speed up changing page"
 	CACHE_BEHIND_COUNT = 2, "How many pages behind the current one will be loaded in advance to speed up changing page"
 	UNCACHE_EXTRA_RANGE = 2, "How far a page has to be beyond the Cache Behind and Cache Ahead ranges to be removed from the cache. Makes it a bit quicker to go back a page to quickly check something and then going to the next page again"
+	CACHE_MEMORY_BUDGET = 0, "How many megabytes of decoded pages may be cached per book. If set, this replaces 'Cache Ahead Count' as the limit on how many pages ahead are cached, whenever more pages fit in the budget. It applies to each open book separately, so with several books open, the memory use adds up. Set to 0 to only use the page counts, with black-and-white pages counting for less because they take up less memory"
+	STORE_GRAYSCALE_PAGES_COMPACTLY = True, "If true, black-and-white pages are stored in a quarter of the memory colour pages take up, so more of them get cached ahead in the same memory. Without a cache memory budget, up to four times 'Cache Ahead Count' pages then get cached ahead"
+	CLOSED_BOOK_POOL_SIZE = 3, "How many recently closed books are kept open in the background, so reopening them is near-instant. Set to 0 to fully close books immediately"
+	CLOSED_BOOK_POOL_TIMEOUT = 120, "How many seconds a closed book is kept open in the background before it gets fully closed"
+	CLOSED_BOOK_POOL_MEMORY_LIMIT = 250, "How many megabytes of page images the recently closed books are allowed to keep in memory together"
+	PRE_OPEN_SELECTED_BOOKS = True, "If true, a book selected in the library or history starts opening in the background, so it shows up almost instantly when it's opened. Needs 'Closed Book Pool Size' to be at least 1"
+	DECODE_IN_WORKER_PROCESSES = False, "If true, pages are read and decoded in separate processes, which keeps the program responsive while many pages are loading. Uses more memory, since each process has its own copy of the libraries"
+	DECODE_WORKER_PROCESS_COUNT = 2, "If 'Decode In Worker Processes' is on, how many processes decode pages at the same time"
+	COVER_THUMBNAIL_PROCESS_COUNT = 2, "How many processes create the cover thumbnails shown in the library cover grid. Set to 0 to create them in background threads of this process instead"
+	THUMBNAIL_STORE_SIZE_LIMIT = 200, "How many megabytes the stored page and cover thumbnails may take up on disk. If they take up more, the thumbnails of the least recently used books get removed when the program starts"
+	LIBRARY_SCAN_PROCESS_COUNT = 2, "How many processes read new and changed books when the library folder gets scanned. Set to 0 to read them in a background thread of this process instead"
 	# Book display settings
 	LIBRARY_PATH = "", "The folder of the comic book library", True
+	LIBRARY_SHOW_COVERS = False, "If true, the library is shown as a grid of book covers instead of as a list of filenames", True
+	LIBRARY_SORT_BY_SERIES = False, "If true, books in the library view are sorted by series and issue number instead of by filename", True
 	ALLOW_MULTIPLE_BOOKS = True, "If this is true, multiple books can be opened. If this is false, only one book can be opened at a time"
 	SHOW_TWO_PAGES = True, "If true, two pages will be shown side-by-side, to emulate a physical comic book. The front and back cover and two-page spreads will still be shown on their own"
+	CONTINUOUS_SCROLLING = False, "If true, all pages are shown below each other without gaps, so they can be scrolled through continuously. Useful for long-strip comics like webtoons. 'Show Two Pages' is ignored when this is on"
 	GAP_BETWEEN_PAGES = 5, "If 'Show Two Pages' is on, this setting determines the size in pixels of the gap between the two pages"
 	DEFAULT_ZOOM_TYPE = ZoomEnum.FIT_SCREEN, "The default image zoom level"
+	MAGNIFIER_MAGNIFICATION = 2.5, "How much the magnifier enlarges the part of the page under the mouse cursor, compared to how large the page is displayed"
 	# Scrolling settings
 	CHANGE_PAGE_WHEN_SCROLL_PAST_EDGE = True, "If this is true, scrolling past the edge of a page changes to the next page. If false, changing pages can only be done with the dedicated page change buttons"
 	TIME_BEFORE_SCROLL_CHANGES_PAGE = 0.2, "To prevent changing pages by scrolling too quickly, this setting sets the minimum time between reaching the image edge and actually changing page on persistent scrolling"
 	# History settings
 	BOOK_HISTORY_SIZE = 5, "How many opened books are saved in the History list"
+	HISTORY_SHOW_COVERS = False, "If true, the History list shows the cover of each book next to its path", True
 	RESTORE_PREVIOUS_SESSION = True, "When reopening the application, whether to open the comic book(s) that were open when the application was closed"
 	# Misc
 	LOGGING_LEVEL = LoggingLevelEnum.INFO, "The lowest message level to log. Keep at 'INFO' unless you have a good reason to change it"
@@ -1,72 +1,121 @@
-import json, logging, os
+import concurrent.futures, json, logging, os, time
 from enum import Enum
-from typing import Any, Dict
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple
 
 from comicviewer.files import FileUtils
 from comicviewer.settings.SettingsEnum import SettingsEnum
 
+# An immutable copy of all the setting values, with one field per setting, named after the setting, for instance 'getSettings().GAP_BETWEEN_PAGES'
+# Enum values are already converted, so reading a field is as quick as reading an attribute. When settings change, a new snapshot replaces the old one,
+# so code that uses a snapshot during a page change or a background task sees the same values throughout, even if the settings get changed halfway
+SettingsSnapshot = NamedTuple('SettingsSnapshot', [(setting.name, type(setting.defaultValue)) for setting in SettingsEnum])
 
-_currentValues: Dict[str, Any] = {}
+_currentValues: Dict[str, Any] = {}  # The values that differ from the default, by setting name
+_currentSettings: SettingsSnapshot = SettingsSnapshot(*[setting.defaultValue for setting in SettingsEnum])
+
+# Which functions to call when a setting changes. They get called with the new settings snapshot and the settings that changed
+_settingToListeners: Dict[SettingsEnum, List[Callable[[SettingsSnapshot, FrozenSet[SettingsEnum]], None]]] = {}
 
 _settingsFilePath = os.path.join(FileUtils.getStoragePath(), 'settings.json')
+_saveExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='SettingsSaver')  # A single thread, so the last saved settings are the ones that end up in the file
+
+def getSettings() -> SettingsSnapshot:
+	""":return: The current settings. Cheap to call, so it can be used in code that runs often, like page changes and scrolling"""
+	return _currentSettings
 
 def getSettingValue(setting: SettingsEnum):
-	if setting.name not in _currentValues:
-		return setting.defaultValue
-	if isinstance(setting.defaultValue, Enum) and not isinstance(_currentValues[setting.name], Enum):
-		# First time this Enum setting is retrieved after being loaded from file, convert it from a string to the right Enum value
-		enumClass = type(setting.defaultValue)
-		currentEnumEntryName = _currentValues[setting.name]
-		for name, enumEntry in enumClass.__members__.items():
-			# Update the stored enum name entry to the actual enum entry
-			if name == currentEnumEntryName:
-				_currentValues[setting.name] = enumEntry
-				break
-		else:
-			# If no matching name was found, revert to the default setting value
-			logging.error(f"No matching enum entry found for value '{currentEnumEntryName}' for setting {setting}, reverting to default value")
-			_currentValues.pop(setting.name, None)
-			return setting.defaultValue
-	return _currentValues[setting.name]
+	return getattr(_currentSettings, setting.name)
 
 def setSettingValue(setting: SettingsEnum, value, shouldSaveSettings=True):
-	# If the new value is the default value, no need to store it
-	if value == setting.defaultValue:
-		_currentValues.pop(setting.name, None)
-	else:
-		_currentValues[setting.name] = value
+	updateSettingValues({setting: value}, shouldSaveSettings)
+
+def updateSettingValues(newSettingValues: Dict[SettingsEnum, Any], shouldSaveSettings=True):
+	"""
+	Change the provided settings, and let the listeners of the settings that changed know about the change
+	:param newSettingValues: The settings to change, with their new value
+	:param shouldSaveSettings: Whether to save the settings to file. The saving happens in the background
+	"""
+	global _currentSettings
+	changedSettings = frozenset(setting for setting, value in newSettingValues.items() if getattr(_currentSettings, setting.name) != value)
+	for setting, value in newSettingValues.items():
+		# If the new value is the default value, no need to store it
+		if value == setting.defaultValue:
+			_currentValues.pop(setting.name, None)
+		else:
+			_currentValues[setting.name] = value
 	if shouldSaveSettings:
 		saveSettings()
+	if not changedSettings:
+		return
+	_currentSettings = _createSnapshot()
+	_notifySettingsChangeListeners(changedSettings)
 
-def updateSettingValues(newSettingValues: Dict[SettingsEnum, Any]):
-	for setting, value in newSettingValues.items():
-		setSettingValue(setting, value, False)
-	saveSettings()
+def registerSettingsChangeListener(listener: Callable[[SettingsSnapshot, FrozenSet[SettingsEnum]], None], *settings: SettingsEnum):
+	"""
+	Register a function to be called when one or more of the provided settings change. It gets called once per change, even if multiple of its settings changed at the same time
+	:param listener: The function to call, with the new settings snapshot and the settings that changed
+	:param settings: The settings the listener depends on
+	"""
+	for setting in settings:
+		_settingToListeners.setdefault(setting, []).append(listener)
+
+def unregisterSettingsChangeListener(listener: Callable[[SettingsSnapshot, FrozenSet[SettingsEnum]], None]):
+	for listeners in _settingToListeners.values():
+		if listener in listeners:
+			listeners.remove(listener)
 
 def saveSettings():
-	if not _currentValues:
-		# If we don't have any values to save, delete the settings file
-		if os.path.isfile(_settingsFilePath):
-			os.remove(_settingsFilePath)
-	else:
-		# Create the settings folder if it doesn't exist yet
-		if not os.path.isdir(FileUtils.getStoragePath()):
-			os.makedirs(FileUtils.getStoragePath())
-		# Convert values if necessary
-		settingsToSave = {}
-		for setting, value in _currentValues.items():
-			if isinstance(value, Enum):
-				settingsToSave[setting] = value.name
-			else:
-				settingsToSave[setting] = value
-		try:
-			with open(_settingsFilePath, 'w') as settingsFile:
+	"""Save the settings to file in the background, so the UI doesn't have to wait for the disk"""
+	# Copy the values, so changes made while saving don't end up half-saved
+	settingsToSave = {setting: value.name if isinstance(value, Enum) else value for setting, value in _currentValues.items()}
+	try:
+		_saveExecutor.submit(_writeSettingsFile, settingsToSave)
+	except RuntimeError:
+		# The saver was already shut down because the program is closing. Save directly instead of losing the change
+		_writeSettingsFile(settingsToSave)
+
+def close():
+	"""Wait until the settings are saved. Should be called when the program closes"""
+	_saveExecutor.shutdown(wait=True)
+
+def _notifySettingsChangeListeners(changedSettings: FrozenSet[SettingsEnum]):
+	listenersToNotify = []
+	for setting in SettingsEnum:
+		if setting in changedSettings:
+			for listener in _settingToListeners.get(setting, ()):
+				if listener not in listenersToNotify:
+					listenersToNotify.append(listener)
+	for listener in listenersToNotify:
+		# An earlier listener may have caused this one to unregister, for instance by closing a book, so don't call it anymore if that happened
+		if any(listener in listeners for listeners in _settingToListeners.values()):
+			listener(_currentSettings, changedSettings)
+
+def _createSnapshot() -> SettingsSnapshot:
+	return SettingsSnapshot(*[_currentValues.get(setting.name, setting.defaultValue) for setting in SettingsEnum])
+
+def _writeSettingsFile(settingsToSave: Dict[str, Any]):
+	startTime = time.perf_counter()
+	try:
+		if not settingsToSave:
+			# If we don't have any values to save, delete the settings file
+			if os.path.isfile(_settingsFilePath):
+				os.remove(_settingsFilePath)
+		else:
+			# Create the settings folder if it doesn't exist yet
+			if not os.path.isdir(FileUtils.getStoragePath()):
+				os.makedirs(FileUtils.getStoragePath())
+			# Write to a temporary file first and then replace the settings file with it, so a crash while saving doesn't leave a half-written settings file
+			temporaryFilePath = _settingsFilePath + '.tmp'
+			with open(temporaryFilePath, 'w') as settingsFile:
 				json.dump(settingsToSave, settingsFile)
-		except Exception as e:
-			logging.error(f"Saving the settings file to '{_settingsFilePath}' failed with exception {type(e)}: {e}")
+			os.replace(temporaryFilePath, _settingsFilePath)
+	except Exception as e:
+		logging.error(f"Saving the settings file to '{_settingsFilePath}' failed with exception {type(e)}: {e}")
+		return
+	logging.debug(f"Saving the settings took {time.perf_counter() - startTime:.4f} seconds")
 
 def _loadSettings():
-	global _currentValues
+	global _currentValues, _currentSettings
 	_currentValues = {}
 	if os.path.isfile(_settingsFilePath):
 		try:
@@ -74,6 +123,18 @@ def _loadSettings():
 				_currentValues = json.load(settingsFile)
 		except Exception as e:
 			logging.error(f"Loading the settings file failed with a '{type(e)}' exception: {e}")
+	# Enum settings are stored by name, convert them to the actual Enum value now, so that doesn't have to happen every time the setting is read
+	for setting in SettingsEnum:
+		if isinstance(setting.defaultValue, Enum) and setting.name in _currentValues:
+			enumClass = type(setting.defaultValue)
+			currentEnumEntryName = _currentValues[setting.name]
+			if currentEnumEntryName in enumClass.__members__:
+				_currentValues[setting.name] = enumClass.__members__[currentEnumEntryName]
+			else:
+				# If no matching name was found, revert to the default setting value
+				logging.error(f"No matching enum entry found for value '{currentEnumEntryName}' for setting {setting}, reverting to default value")
+				_currentValues.pop(setting.name, None)
+	_currentSettings = _createSnapshot()
 
 
 _loadSettings()
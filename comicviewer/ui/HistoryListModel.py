@@ -0,0 +1,162 @@
+import concurrent.futures, logging, os, time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from PySide6 import QtCore, QtGui
+
+from comicviewer.library import LibraryCatalog
+from comicviewer.library.CoverThumbnailer import CoverThumbnailer
+from comicviewer.misc import HistoryStore
+
+
+class HistoryListModel(QtCore.QAbstractListModel):
+	"""
+	Shows the book history, most recently opened book first. HistoryStore tells the model exactly which book got added, moved or removed, so the view only
+	updates the rows that changed instead of reloading the whole history. Views only ask for the data of rows they show, so covers and page counts are only looked up for visible books
+	Page counts come from the library catalog, which can be busy with a scan, so they're looked up in the background. Until then, only the page number is shown
+	"""
+	_pageCountExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='HistoryPageCounts')  # Initialize as class variable so the lookups of all models share it
+	_pageCountsLoaded = QtCore.Signal(dict)  # Emitted from the background thread with the looked up page counts, so they get stored on the UI thread
+
+	def __init__(self, coverThumbnailer: CoverThumbnailer, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._coverThumbnailer = coverThumbnailer
+		self._bookPaths: List[str] = HistoryStore.getHistory()
+		self._shouldShowCovers: bool = False
+		self._coverIcons: Dict[str, QtGui.QIcon] = {}
+		self._pageCounts: Dict[str, Optional[int]] = {}  # The page count of each book, from the library catalog. None if the book isn't in the catalog
+		self._bookPathsToLookUp: Set[str] = set()  # Books whose page count was asked for but isn't known yet, and isn't being looked up yet
+		self._bookPathsBeingLookedUp: Set[str] = set()
+		# A view asks for the data of all its visible rows at once, so collect the page counts it asks for, and look them up together once it's done
+		self._pageCountLookupTimer = QtCore.QTimer(self)
+		self._pageCountLookupTimer.setSingleShot(True)
+		self._pageCountLookupTimer.setInterval(0)
+		self._pageCountLookupTimer.timeout.connect(self._lookUpPageCounts)
+		self._pageCountsLoaded.connect(self._onPageCountsLoaded)
+		HistoryStore.registerHistoryChangeListener(self._onHistoryChanged)
+		self._coverThumbnailer.coverLoaded.connect(self._onCoverLoaded)
+
+	def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+		return 0 if parent.isValid() else len(self._bookPaths)
+
+	def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole) -> Any:
+		if not index.isValid() or index.row() >= len(self._bookPaths):
+			return None
+		bookPath = self._bookPaths[index.row()]
+		if role == QtCore.Qt.DisplayRole:
+			return f"{bookPath}  ({self._getReadingProgress(bookPath)})"
+		if role == QtCore.Qt.ToolTipRole:
+			if not os.path.isfile(bookPath):
+				return f"{bookPath}\nThis book doesn't exist anymore"
+			return f"{bookPath}\n{self._getReadingProgress(bookPath).capitalize()}"
+		if role == QtCore.Qt.DecorationRole and self._shouldShowCovers:
+			return self._getCoverIcon(bookPath)
+		return None
+
+	def getBookPath(self, index: QtCore.QModelIndex) -> Optional[str]:
+		""":return: The path of the book at the provided index, or None if the index is invalid"""
+		if not index.isValid() or index.row() >= len(self._bookPaths):
+			return None
+		return self._bookPaths[index.row()]
+
+	def setShowCovers(self, shouldShowCovers: bool):
+		if shouldShowCovers == self._shouldShowCovers:
+			return
+		self._shouldShowCovers = shouldShowCovers
+		if not shouldShowCovers:
+			self._coverIcons.clear()
+		if self._bookPaths:
+			self.dataChanged.emit(self.index(0), self.index(len(self._bookPaths) - 1), [QtCore.Qt.DecorationRole])
+
+	def refreshReadingProgress(self):
+		"""Look up the page counts again in the background, for instance because the library scan found new books or changed books. Only the rows whose page count changed get updated"""
+		self._bookPathsToLookUp.update(self._pageCounts)
+		self._pageCountLookupTimer.start()
+
+	def close(self):
+		HistoryStore.unregisterHistoryChangeListener(self._onHistoryChanged)
+		self._pageCountLookupTimer.stop()
+
+	def _getReadingProgress(self, bookPath: str) -> str:
+		if bookPath not in self._pageCounts and bookPath not in self._bookPathsBeingLookedUp:
+			self._bookPathsToLookUp.add(bookPath)
+			self._pageCountLookupTimer.start()
+		pageCount = self._pageCounts.get(bookPath, None)
+		pageNumber = HistoryStore.getStoredPage(bookPath) + 1
+		if pageCount is None:
+			return f"page {pageNumber}"
+		return f"page {min(pageNumber, pageCount)} of {pageCount}, {min(pageNumber, pageCount) * 100 // pageCount}%"
+
+	def _lookUpPageCounts(self):
+		bookPathsToLookUp = self._bookPathsToLookUp - self._bookPathsBeingLookedUp
+		# Books that are already being looked up may get an outdated page count from that, so keep them to look up again once that's done
+		self._bookPathsToLookUp.intersection_update(self._bookPathsBeingLookedUp)
+		if not bookPathsToLookUp:
+			return
+		self._bookPathsBeingLookedUp.update(bookPathsToLookUp)
+		self._pageCountExecutor.submit(self._lookUpPageCountsInBackground, bookPathsToLookUp)
+
+	def _lookUpPageCountsInBackground(self, bookPaths: Iterable[str]):
+		startTime = time.perf_counter()
+		pageCounts = LibraryCatalog.getPageCounts(bookPaths)
+		logging.debug(f"Looking up the page counts of {len(pageCounts)} history books took {time.perf_counter() - startTime:.4f} seconds")
+		self._pageCountsLoaded.emit(pageCounts)
+
+	def _onPageCountsLoaded(self, pageCounts: Dict[str, Optional[int]]):
+		self._bookPathsBeingLookedUp.difference_update(pageCounts)
+		if self._bookPathsToLookUp:
+			self._pageCountLookupTimer.start()
+		changedBookPaths = set()
+		for bookPath, pageCount in pageCounts.items():
+			# The first lookup always counts as a change, since before that the page count wasn't shown at all
+			if bookPath not in self._pageCounts or self._pageCounts[bookPath] != pageCount:
+				self._pageCounts[bookPath] = pageCount
+				changedBookPaths.add(bookPath)
+		if not changedBookPaths:
+			return
+		for row, bookPath in enumerate(self._bookPaths):
+			if bookPath in changedBookPaths:
+				changedIndex = self.index(row)
+				self.dataChanged.emit(changedIndex, changedIndex, [QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole])
+
+	def _getCoverIcon(self, bookPath: str) -> Optional[QtGui.QIcon]:
+		coverIcon = self._coverIcons.get(bookPath, None)
+		if coverIcon is None:
+			cover = self._coverThumbnailer.getCover(bookPath)
+			if cover is None:
+				return None
+			# An icon gets scaled to the icon size of the view, an image would be drawn at its full size
+			coverIcon = QtGui.QIcon(QtGui.QPixmap.fromImage(cover))
+			self._coverIcons[bookPath] = coverIcon
+		return coverIcon
+
+	def _onHistoryChanged(self, bookPath: str, oldIndex: Optional[int], newIndex: Optional[int]):
+		if oldIndex is None:
+			self.beginInsertRows(QtCore.QModelIndex(), newIndex, newIndex)
+			self._bookPaths.insert(newIndex, bookPath)
+			self.endInsertRows()
+		elif newIndex is None:
+			self.beginRemoveRows(QtCore.QModelIndex(), oldIndex, oldIndex)
+			del self._bookPaths[oldIndex]
+			self.endRemoveRows()
+			self._coverIcons.pop(bookPath, None)
+			self._pageCounts.pop(bookPath, None)
+		elif oldIndex == newIndex:
+			changedIndex = self.index(newIndex)
+			self.dataChanged.emit(changedIndex, changedIndex, [QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole])
+		else:
+			# When moving a row down, Qt expects the destination to be the row it'll end up above, so the row after the new index
+			destinationRow = newIndex + 1 if newIndex > oldIndex else newIndex
+			self.beginMoveRows(QtCore.QModelIndex(), oldIndex, oldIndex, QtCore.QModelIndex(), destinationRow)
+			self._bookPaths.insert(newIndex, self._bookPaths.pop(oldIndex))
+			self.endMoveRows()
+
+	def _onCoverLoaded(self, bookPath: str):
+		if not self._shouldShowCovers:
+			return
+		# Recent books are at the top, and those are the most likely to be visible, so searching from the top is quick
+		try:
+			row = self._bookPaths.index(bookPath)
+		except ValueError:
+			return
+		changedIndex = self.index(row)
+		self.dataChanged.emit(changedIndex, changedIndex, [QtCore.Qt.DecorationRole])
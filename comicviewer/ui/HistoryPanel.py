@@ -1,13 +1,18 @@
 import os
 from typing import TYPE_CHECKING
 
-from PySide6 import QtWidgets
+from PySide6 import QtCore, QtWidgets
 
 from comicviewer.misc import HistoryStore
+from comicviewer.settings.SettingsEnum import SettingsEnum
+from comicviewer.settings import SettingsStore
 from comicviewer.ui import UiUtils
+from comicviewer.ui.HistoryListModel import HistoryListModel
 if TYPE_CHECKING:
 	from comicviewer.MainController import MainController
 
+_HISTORY_COVER_SIZE = 48  # The height of the covers shown in the history list, in pixels
+
 class HistoryPanel(QtWidgets.QWidget):
 	def __init__(self, windowController, *args, **kwargs):
 		super().__init__(*args, **kwargs)
@@ -18,51 +23,72 @@ class HistoryPanel(QtWidgets.QWidget):
 		self.setLayout(layout)
 
 		layout.addWidget(QtWidgets.QLabel("History"))
-		self.historyList = QtWidgets.QListWidget()
-		self.historyList.setSelectionMode(QtWidgets.QListWidget.SelectionMode.SingleSelection)
-		self.historyList.itemActivated.connect(self._openSelectedBook)
+		# The model gets told about every change to the history, so the list is always up-to-date without having to be refilled
+		self.historyModel = HistoryListModel(windowController.coverThumbnailer, self)
+		self.historyList = QtWidgets.QListView()
+		self.historyList.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.SingleSelection)
+		self.historyList.setUniformItemSizes(True)
+		self.historyList.setTextElideMode(QtCore.Qt.ElideMiddle)
+		self.historyList.setModel(self.historyModel)
+		self.historyList.activated.connect(self._openSelectedBook)
+		self.historyList.selectionModel().currentChanged.connect(self._onCurrentItemChanged)
+		self.historyList.selectionModel().selectionChanged.connect(self._updateButtonState)
+		self.historyModel.rowsInserted.connect(self._updateButtonState)
+		self.historyModel.rowsRemoved.connect(self._updateButtonState)
 		layout.addWidget(self.historyList)
 
+		self.showCoversCheckbox = QtWidgets.QCheckBox("Show covers")
+		self.showCoversCheckbox.setChecked(SettingsStore.getSettingValue(SettingsEnum.HISTORY_SHOW_COVERS))
+		self.showCoversCheckbox.toggled.connect(self._onShowCoversToggled)
+		self._onShowCoversToggled(self.showCoversCheckbox.isChecked())
+		layout.addWidget(self.showCoversCheckbox)
 		self.openButton = UiUtils.createButton("Open selected book", self._openSelectedBook, layout)
 		self.removeButton = UiUtils.createButton("Remove selected book from history", self._removeSelectedBook, layout)
 		self.clearHistoryButton = UiUtils.createButton("Clear history", self._clearHistory, layout)
-		self.historyList.itemSelectionChanged.connect(self._updateButtonState)
-
-		self.updateHistoryView()
+		# The library scan can find the page count of books in the history, which is used to show the reading progress
+		self.windowController.libraryScanner.scanFinished.connect(self.historyModel.refreshReadingProgress)
 
-	def updateHistoryView(self):
-		self.historyList.clear()
-		# Fill the view with the history
-		for bookPath in HistoryStore.getHistory():
-			self.historyList.addItem(QtWidgets.QListWidgetItem(bookPath))
 		self._updateButtonState()
 
+	def _getSelectedBookPath(self) -> str or None:
+		return self.historyModel.getBookPath(self.historyList.currentIndex())
+
 	def _updateButtonState(self):
-		isItemSelected = self.historyList.currentItem() is not None
+		isItemSelected = self._getSelectedBookPath() is not None
 		self.openButton.setEnabled(isItemSelected)
 		self.removeButton.setEnabled(isItemSelected)
-		self.clearHistoryButton.setEnabled(self.historyList.count() > 0)
+		self.clearHistoryButton.setEnabled(self.historyModel.rowCount() > 0)
+
+	def _onShowCoversToggled(self, shouldShowCovers: bool):
+		if shouldShowCovers != SettingsStore.getSettingValue(SettingsEnum.HISTORY_SHOW_COVERS):
+			SettingsStore.setSettingValue(SettingsEnum.HISTORY_SHOW_COVERS, shouldShowCovers)
+		# Covers are taller than they're wide, so leave room for them next to the book path
+		self.historyList.setIconSize(QtCore.QSize(_HISTORY_COVER_SIZE * 2 // 3, _HISTORY_COVER_SIZE) if shouldShowCovers else QtCore.QSize())
+		self.historyModel.setShowCovers(shouldShowCovers)
+
+	def _onCurrentItemChanged(self, currentIndex: QtCore.QModelIndex):
+		bookPath = self.historyModel.getBookPath(currentIndex)
+		if bookPath is not None:
+			# The selected book will probably be opened next, so start opening it already
+			self.windowController.preOpenBook(bookPath)
+		self._updateButtonState()
 
 	def _openSelectedBook(self):
-		selectedItem = self.historyList.currentItem()
-		if selectedItem is not None:
-			bookPath = selectedItem.text()
+		bookPath = self._getSelectedBookPath()
+		if bookPath is not None:
 			if os.path.isfile(bookPath):
 				self.windowController.loadComicBook(bookPath)
 			else:
 				UiUtils.showErrorMessagePopup("File missing", f"The selected comic book\n{bookPath}\ndoesn't exist anymore")
 
 	def _removeSelectedBook(self):
-		selectedItem = self.historyList.currentItem()
-		if selectedItem is not None:
-			wasRemoved = HistoryStore.removeFromHistory(selectedItem.text())
+		bookPath = self._getSelectedBookPath()
+		if bookPath is not None:
+			wasRemoved = HistoryStore.removeFromHistory(bookPath)
 			if not wasRemoved:
 				QtWidgets.QMessageBox.critical(self, "Can't remove", "The selected book is opened.\nPlease close it before removing it\nfrom the history")
-			else:
-				self.updateHistoryView()
 
 	def _clearHistory(self):
 		wasFullyCleared = HistoryStore.clearHistory()
-		self.updateHistoryView()
 		if not wasFullyCleared:
 			QtWidgets.QMessageBox.warning(self, "Not fully cleared", "The history could not be\nfully cleared because there are still\nsome books opened.\n\nClose all books to fully clear\nthe history")
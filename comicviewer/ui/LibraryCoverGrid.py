@@ -0,0 +1,134 @@
+import os
+from typing import TYPE_CHECKING, Any
+
+from PySide6 import QtCore, QtGui, QtWidgets
+
+from comicviewer.library.CoverThumbnailer import COVER_THUMBNAIL_SIZE, CoverThumbnailer
+from comicviewer.ui import UiUtils
+from comicviewer.ui.LibraryTreeModel import LibraryTreeModel
+if TYPE_CHECKING:
+	from comicviewer.MainController import MainController
+
+_COVER_ROW_MARGIN = 1  # How many rows of covers above and below the visible ones keep loading, so they're ready when scrolling a bit
+
+
+class _CoverModel(QtCore.QIdentityProxyModel):
+	"""Adds the cover thumbnails to the library model. Views only ask for the data of the items they show, so only the covers of visible books get loaded"""
+	def __init__(self, libraryModel: LibraryTreeModel, coverThumbnailer: CoverThumbnailer, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._libraryModel = libraryModel
+		self._coverThumbnailer = coverThumbnailer
+		self._folderIcon = QtWidgets.QApplication.style().standardIcon(QtWidgets.QStyle.StandardPixmap.SP_DirIcon)
+		self.setSourceModel(libraryModel)
+		self._coverThumbnailer.coverLoaded.connect(self._onCoverLoaded)
+
+	def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole) -> Any:
+		if role == QtCore.Qt.DecorationRole and index.isValid():
+			sourceIndex = self.mapToSource(index)
+			if self._libraryModel.isFolder(sourceIndex):
+				return self._folderIcon
+			return self._coverThumbnailer.getCover(self._libraryModel.getPath(sourceIndex))
+		return super().data(index, role)
+
+	def _onCoverLoaded(self, bookPath: str):
+		coverIndex = self.mapFromSource(self._libraryModel.getIndexForPath(bookPath))
+		if coverIndex.isValid():
+			self.dataChanged.emit(coverIndex, coverIndex, [QtCore.Qt.DecorationRole])
+
+
+class LibraryCoverGrid(QtWidgets.QWidget):
+	"""Shows the books in a library folder as a grid of covers. Activating a folder shows the books in that folder"""
+	def __init__(self, windowController, libraryModel: LibraryTreeModel, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.windowController: MainController = windowController
+		self._libraryModel = libraryModel
+		self._coverThumbnailer: CoverThumbnailer = windowController.coverThumbnailer
+		self._coverModel = _CoverModel(libraryModel, self._coverThumbnailer, self)
+
+		layout = QtWidgets.QVBoxLayout(self)
+		layout.setContentsMargins(0, 0, 0, 0)
+		self.setLayout(layout)
+		navigationLayout = QtWidgets.QHBoxLayout()
+		self.upButton = UiUtils.createButton("⮤", self._goToParentFolder, navigationLayout, "Go to the parent folder", 30)
+		self.folderLabel = QtWidgets.QLabel()
+		self.folderLabel.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse)
+		navigationLayout.addWidget(self.folderLabel, 10)
+		layout.addLayout(navigationLayout)
+
+		self.coverView = QtWidgets.QListView()
+		self.coverView.setViewMode(QtWidgets.QListView.ViewMode.IconMode)
+		self.coverView.setMovement(QtWidgets.QListView.Movement.Static)
+		self.coverView.setResizeMode(QtWidgets.QListView.ResizeMode.Adjust)
+		self.coverView.setIconSize(QtCore.QSize(COVER_THUMBNAIL_SIZE, COVER_THUMBNAIL_SIZE))
+		self.coverView.setGridSize(QtCore.QSize(COVER_THUMBNAIL_SIZE + 24, COVER_THUMBNAIL_SIZE + 48))
+		self.coverView.setWordWrap(True)
+		self.coverView.setTextElideMode(QtCore.Qt.ElideMiddle)
+		# All cells are the same size, and they get laid out in batches, so a folder with thousands of books doesn't block while it's laid out
+		self.coverView.setUniformItemSizes(True)
+		self.coverView.setLayoutMode(QtWidgets.QListView.LayoutMode.Batched)
+		self.coverView.setBatchSize(200)
+		self.coverView.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollMode.ScrollPerPixel)
+		self.coverView.setModel(self._coverModel)
+		self.coverView.activated.connect(self._onItemActivated)
+		self.coverView.selectionModel().currentChanged.connect(self._onCurrentItemChanged)
+		self.coverView.verticalScrollBar().valueChanged.connect(self._cancelInvisibleCovers)
+		self._coverModel.modelReset.connect(self._updateFolderLabel)
+		layout.addWidget(self.coverView, 10)
+		self._updateFolderLabel()
+
+	def resizeEvent(self, event: QtGui.QResizeEvent):
+		super().resizeEvent(event)
+		self._cancelInvisibleCovers()
+
+	def hideEvent(self, event: QtGui.QHideEvent):
+		super().hideEvent(event)
+		self._coverThumbnailer.cancelLoading()
+
+	def _onItemActivated(self, index: QtCore.QModelIndex):
+		sourceIndex = self._coverModel.mapToSource(index)
+		if self._libraryModel.isFolder(sourceIndex):
+			self._showFolder(index)
+		else:
+			self.windowController.loadComicBook(self._libraryModel.getPath(sourceIndex))
+
+	def _onCurrentItemChanged(self, currentIndex: QtCore.QModelIndex):
+		sourceIndex = self._coverModel.mapToSource(currentIndex)
+		if currentIndex.isValid() and not self._libraryModel.isFolder(sourceIndex):
+			self.windowController.preOpenBook(self._libraryModel.getPath(sourceIndex))
+
+	def _goToParentFolder(self):
+		rootIndex = self.coverView.rootIndex()
+		if rootIndex.isValid():
+			self._showFolder(rootIndex.parent())
+
+	def _showFolder(self, index: QtCore.QModelIndex):
+		self._coverThumbnailer.cancelLoading()
+		if self._coverModel.canFetchMore(index):
+			self._coverModel.fetchMore(index)
+		self.coverView.setRootIndex(index)
+		self.coverView.scrollToTop()
+		self._updateFolderLabel()
+
+	def _updateFolderLabel(self):
+		rootIndex = self.coverView.rootIndex()
+		self.upButton.setEnabled(rootIndex.isValid())
+		folderPath = self._libraryModel.getPath(self._coverModel.mapToSource(rootIndex))
+		self.folderLabel.setText(os.path.basename(folderPath) or folderPath)
+		self.folderLabel.setToolTip(folderPath)
+
+	def _cancelInvisibleCovers(self):
+		"""Stop loading the covers of books that scrolled out of view. Visible covers get requested by the view itself when it draws them"""
+		rowCount = self._coverModel.rowCount(self.coverView.rootIndex())
+		if rowCount == 0 or not self.isVisible():
+			return
+		viewportRect = self.coverView.viewport().rect()
+		firstVisibleRow = self.coverView.indexAt(viewportRect.topLeft()).row()
+		lastVisibleRow = self.coverView.indexAt(viewportRect.bottomRight()).row()
+		if firstVisibleRow < 0:
+			firstVisibleRow = 0
+		if lastVisibleRow < 0:
+			lastVisibleRow = rowCount - 1
+		coversPerRow = max(1, viewportRect.width() // self.coverView.gridSize().width())
+		rowsToKeep = range(max(0, firstVisibleRow - coversPerRow * _COVER_ROW_MARGIN), min(rowCount, lastVisibleRow + coversPerRow * _COVER_ROW_MARGIN + 1))
+		rootIndex = self.coverView.rootIndex()
+		self._coverThumbnailer.cancelLoading(*[self._libraryModel.getPath(self._coverModel.mapToSource(self._coverModel.index(row, 0, rootIndex))) for row in rowsToKeep])
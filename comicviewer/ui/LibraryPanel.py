@@ -1,9 +1,13 @@
-from typing import TYPE_CHECKING
+import concurrent.futures, os
+from typing import TYPE_CHECKING, Any, Dict, List
 
 from PySide6 import QtCore, QtWidgets
 
 from comicviewer.files import FileOpenerFactory
+from comicviewer.library import LibraryCatalog
 from comicviewer.ui import UiUtils
+from comicviewer.ui.LibraryCoverGrid import LibraryCoverGrid
+from comicviewer.ui.LibraryTreeModel import LibraryTreeModel
 from comicviewer.settings.SettingsEnum import SettingsEnum
 from comicviewer.settings import SettingsStore
 if TYPE_CHECKING:
@@ -11,6 +15,9 @@ if TYPE_CHECKING:
 
 class LibraryPanel(QtWidgets.QWidget):
 	"""This panel shows the library view, including buttons to change it or load a non-library book"""
+	_searchResultsFound = QtCore.Signal(str, list)  # Emitted from the search thread with the search text and the found books, so the results get shown on the UI thread
+	_searchExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='LibrarySearch')
+
 	def __init__(self, windowController, *args, **kwargs):
 		super().__init__(*args, **kwargs)
 		self.windowController: MainController = windowController
@@ -18,25 +25,54 @@ class LibraryPanel(QtWidgets.QWidget):
 		layout = QtWidgets.QVBoxLayout()
 		self.setLayout(layout)
 		layout.addWidget(QtWidgets.QLabel("Choose a comic book:"))
-		# Create a book selection widget
-		self.selectionModel = QtWidgets.QFileSystemModel()
-		# Only show supported comic books
-		self.selectionModel.setNameFilterDisables(False)
-		self.selectionModel.setNameFilters(['*' + ext for ext in FileOpenerFactory.supportedExtensions])
+		# Search field, searches through the filenames and comic info of the books in the library catalog
+		self.searchField = QtWidgets.QLineEdit()
+		self.searchField.setPlaceholderText("Search the library by filename, title, series, creators...")
+		self.searchField.setClearButtonEnabled(True)
+		self.searchField.textChanged.connect(self._onSearchTextChanged)
+		self.searchField.returnPressed.connect(self._openFirstSearchResult)
+		layout.addWidget(self.searchField)
+		# The search results replace the library view while there's something to search for
+		self.searchResultsList = QtWidgets.QListWidget()
+		self.searchResultsList.itemActivated.connect(self._onSearchResultActivated)
+		self.searchResultsList.currentItemChanged.connect(self._onCurrentSearchResultChanged)
+		self.searchResultsList.hide()
+		self._latestSearchText = ''  # Kept separately from the search field, since the field can't be read from the search thread
+		layout.addWidget(self.searchResultsList, 10)
+		self._searchResultsFound.connect(self._showSearchResults)
+		# Newer catalog information can change the results, so search again when a scan is done
+		self.windowController.libraryScanner.scanFinished.connect(self._repeatSearch)
+		# Create a book selection widget. The model lists folders in the background, so large and remote folders don't block the UI
+		self.selectionModel = LibraryTreeModel(self)
+		self.selectionModel.setSortBySeries(SettingsStore.getSettingValue(SettingsEnum.LIBRARY_SORT_BY_SERIES))
+		self.windowController.libraryScanner.scanFinished.connect(self.selectionModel.refreshFolder)
 
 		self.selectionView = QtWidgets.QTreeView()
+		# All rows are the same height, so the view only has to lay out the rows that are visible, instead of measuring every row in a large folder
+		self.selectionView.setUniformRowHeights(True)
+		self.selectionView.setTextElideMode(QtCore.Qt.ElideMiddle)
 		self.selectionView.setModel(self.selectionModel)
 		self._setBookSelectionPath(SettingsStore.getSettingValue(SettingsEnum.LIBRARY_PATH))
-		# Hide all columns except the name
-		for i in range(1, self.selectionView.header().count()):
-			self.selectionView.header().hideSection(i)
 		self.selectionView.header().hide()
-		# Make sure a horizontal scrollbar appears as needed
-		self.selectionView.header().setStretchLastSection(False)
-		self.selectionView.header().setSectionResizeMode(0, QtWidgets.QHeaderView.ResizeToContents)
 		# Handle selection changes
 		self.selectionView.activated.connect(self._onSelectionChange)
-		layout.addWidget(self.selectionView, 10)
+		self.selectionView.selectionModel().currentChanged.connect(self._onCurrentBookChanged)
+		# The cover grid shows the same library as the tree, so they share the model
+		self.coverGrid = LibraryCoverGrid(self.windowController, self.selectionModel)
+		self.libraryViews = QtWidgets.QStackedWidget()
+		self.libraryViews.addWidget(self.selectionView)
+		self.libraryViews.addWidget(self.coverGrid)
+		layout.addWidget(self.libraryViews, 10)
+		self.showCoversCheckbox = QtWidgets.QCheckBox("Show covers")
+		self.showCoversCheckbox.setChecked(SettingsStore.getSettingValue(SettingsEnum.LIBRARY_SHOW_COVERS))
+		self.showCoversCheckbox.toggled.connect(self._onShowCoversToggled)
+		self._onShowCoversToggled(self.showCoversCheckbox.isChecked())
+		layout.addWidget(self.showCoversCheckbox)
+		self.sortBySeriesCheckbox = QtWidgets.QCheckBox("Sort books by series")
+		self.sortBySeriesCheckbox.setToolTip("Sort books by the series and issue number in their comic info, once the library scan has read them")
+		self.sortBySeriesCheckbox.setChecked(SettingsStore.getSettingValue(SettingsEnum.LIBRARY_SORT_BY_SERIES))
+		self.sortBySeriesCheckbox.toggled.connect(self._onSortBySeriesToggled)
+		layout.addWidget(self.sortBySeriesCheckbox)
 		# Button to change the base folder of the file selector
 		UiUtils.createButton('Change comic book library folder', self._onLibraryBrowseButtonPress, layout)
 		# Button to load a single book
@@ -46,11 +82,81 @@ class LibraryPanel(QtWidgets.QWidget):
 		SettingsStore.setSettingValue(SettingsEnum.LIBRARY_PATH, path)
 		# Set the root folder of the view
 		self.selectionModel.setRootPath(path)
-		# Update the selection
-		self.selectionView.setRootIndex(self.selectionModel.index(path))
+		# Bring the library catalog up-to-date with the new folder
+		self.windowController.libraryScanner.scanLibrary(path)
+
+	def _onSearchTextChanged(self, searchText: str):
+		self._latestSearchText = searchText
+		isSearching = bool(searchText.strip())
+		self.libraryViews.setVisible(not isSearching)
+		self.searchResultsList.setVisible(isSearching)
+		if isSearching:
+			self._searchExecutor.submit(self._searchLibrary, searchText)
+		else:
+			self.searchResultsList.clear()
+
+	def _searchLibrary(self, searchText: str):
+		# Searches are fast, but they run in the background anyway, so typing never has to wait for the catalog while the scanner is storing books
+		if searchText == self._latestSearchText:
+			self._searchResultsFound.emit(searchText, LibraryCatalog.searchBooks(searchText))
+
+	def _repeatSearch(self):
+		self._onSearchTextChanged(self.searchField.text())
+
+	def _showSearchResults(self, searchText: str, foundBooks: List[Dict[str, Any]]):
+		if searchText != self._latestSearchText:
+			# The user typed more while this search was running, the results of the newer search will arrive soon
+			return
+		self.searchResultsList.clear()
+		for book in foundBooks:
+			resultItem = QtWidgets.QListWidgetItem(self._getSearchResultText(book))
+			resultItem.setData(QtCore.Qt.UserRole, book['path'])
+			resultItem.setToolTip(book['path'])
+			self.searchResultsList.addItem(resultItem)
+
+	@staticmethod
+	def _getSearchResultText(book: Dict[str, Any]) -> str:
+		resultText = book['Series'] or book['Title'] or ''
+		if book['Series'] and book['Number']:
+			resultText += f" #{book['Number']}"
+		if book['Series'] and book['Title']:
+			resultText += f": {book['Title']}"
+		return f"{resultText}  ({book['fileName']})" if resultText else book['fileName']
+
+	def _onCurrentSearchResultChanged(self, currentItem: QtWidgets.QListWidgetItem):
+		if currentItem is not None:
+			self.windowController.preOpenBook(currentItem.data(QtCore.Qt.UserRole))
+
+	def _openFirstSearchResult(self):
+		if self.searchResultsList.count() > 0:
+			self._onSearchResultActivated(self.searchResultsList.item(0))
+
+	def _onSearchResultActivated(self, resultItem: QtWidgets.QListWidgetItem):
+		bookPath = resultItem.data(QtCore.Qt.UserRole)
+		if os.path.isfile(bookPath):
+			self.windowController.loadComicBook(bookPath)
+		else:
+			UiUtils.showErrorMessagePopup("File missing", f"The selected comic book\n{bookPath}\ndoesn't exist anymore")
+
+	def _onShowCoversToggled(self, shouldShowCovers: bool):
+		if shouldShowCovers != SettingsStore.getSettingValue(SettingsEnum.LIBRARY_SHOW_COVERS):
+			SettingsStore.setSettingValue(SettingsEnum.LIBRARY_SHOW_COVERS, shouldShowCovers)
+		self.libraryViews.setCurrentWidget(self.coverGrid if shouldShowCovers else self.selectionView)
+
+	def _onSortBySeriesToggled(self, shouldSortBySeries: bool):
+		SettingsStore.setSettingValue(SettingsEnum.LIBRARY_SORT_BY_SERIES, shouldSortBySeries)
+		self.selectionModel.setSortBySeries(shouldSortBySeries)
+
+	def _onCurrentBookChanged(self, currentIndex: QtCore.QModelIndex):
+		# The selected book will probably be opened next, so start opening it already
+		if currentIndex.isValid() and not self.selectionModel.isFolder(currentIndex):
+			self.windowController.preOpenBook(self.selectionModel.getPath(currentIndex))
 
 	def _onSelectionChange(self, selectedIndex: QtCore.QModelIndex):
-		selectedPath = self.selectionModel.filePath(selectedIndex)
+		if self.selectionModel.isFolder(selectedIndex):
+			# Activating a folder expands or collapses it
+			return
+		selectedPath = self.selectionModel.getPath(selectedIndex)
 		# Actually change the comic book
 		self.windowController.loadComicBook(selectedPath)
 
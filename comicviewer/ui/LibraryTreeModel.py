@@ -0,0 +1,265 @@
+import concurrent.futures, itertools, logging, math, os, re, time
+from typing import Any, Dict, List, Optional
+
+from PySide6 import QtCore
+
+from comicviewer.files import FileOpenerFactory
+from comicviewer.library import LibraryCatalog
+
+_LISTING_BATCH_SIZE = 500  # How many folder entries get added to the model at once. Adding them one by one makes the view relayout far too often, adding them all at once makes large folders show up late
+
+
+class _LibraryNode:
+	def __init__(self, parent: Optional['_LibraryNode'], name: str, path: str, isFolder: bool):
+		self.parent = parent
+		self.name = name
+		self.path = path
+		self.isFolder = isFolder
+		self.row = 0  # The position of this node in its parent's children
+		self.children: List[_LibraryNode] = []
+		self.childrenByName: Dict[str, _LibraryNode] = {}
+		self.listingToken: Optional[int] = None  # Set while the folder contents are being listed, to recognise results of an outdated listing
+		self.isListed = False
+		self.toolTip: Optional[str] = None
+
+
+class LibraryTreeModel(QtCore.QAbstractItemModel):
+	"""
+	A model of the library folder that doesn't block on the disk. Folder contents are listed on a background thread when a folder gets expanded, and get added in batches,
+	so a folder with thousands of books on a network share shows its first entries right away. Sort keys get calculated and sorted on the background thread too, and the
+	information about books comes from the library catalog instead of from opening them
+	"""
+	_entriesListed = QtCore.Signal(str, int, list, object)  # Emitted from the listing thread with the folder path, the listing token, a batch of entries, and when the listing is done, the sorted entry names
+	_listingExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix='LibraryListing')
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._rootNode = _LibraryNode(None, '', '', True)
+		self._shouldSortBySeries = False
+		self._listingTokens = itertools.count()
+		self._entriesListed.connect(self._onEntriesListed)
+
+	def setRootPath(self, rootPath: str):
+		"""Show the contents of the provided folder. This returns immediately, the contents get added once they're listed"""
+		self.beginResetModel()
+		self._rootNode = _LibraryNode(None, os.path.basename(rootPath), rootPath, True)
+		self.endResetModel()
+		if rootPath and os.path.isdir(rootPath):
+			self._listFolder(self._rootNode)
+
+	def setSortBySeries(self, shouldSortBySeries: bool):
+		"""
+		Change how books are sorted. Folders always come before books and are sorted by name
+		:param shouldSortBySeries: If True, books are sorted by series, volume, and issue number from their comic info, and books without comic info by name. If False, books are sorted by name
+		"""
+		if shouldSortBySeries != self._shouldSortBySeries:
+			self._shouldSortBySeries = shouldSortBySeries
+			self.refreshFolder(self._rootNode.path)
+
+	def refreshFolder(self, folderPath: str):
+		"""List the provided folder and its already listed subfolders again, for instance because their contents or the catalog information about them changed"""
+		folderPrefix = os.path.join(os.path.abspath(folderPath), '')
+		nodesToCheck = [self._rootNode]
+		while nodesToCheck:
+			node = nodesToCheck.pop()
+			if node.isListed or node.listingToken is not None:
+				if os.path.join(os.path.abspath(node.path), '').startswith(folderPrefix):
+					self._listFolder(node)
+				nodesToCheck.extend(childNode for childNode in node.children if childNode.isFolder)
+
+	def getPath(self, index: QtCore.QModelIndex) -> str:
+		return self._getNode(index).path
+
+	def isFolder(self, index: QtCore.QModelIndex) -> bool:
+		return self._getNode(index).isFolder
+
+	def getIndexForPath(self, path: str) -> QtCore.QModelIndex:
+		""":return: The index of the entry with the provided path, or an invalid index if that entry isn't listed (yet)"""
+		try:
+			relativePath = os.path.relpath(path, self._rootNode.path)
+		except ValueError:
+			# There's no root path, or the path is on another drive
+			return QtCore.QModelIndex()
+		if relativePath.startswith(os.pardir):
+			return QtCore.QModelIndex()
+		node = self._rootNode
+		for pathPart in relativePath.split(os.sep):
+			node = node.childrenByName.get(pathPart, None)
+			if node is None:
+				return QtCore.QModelIndex()
+		return self._getIndex(node)
+
+	def index(self, row: int, column: int, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> QtCore.QModelIndex:
+		parentNode = self._getNode(parent)
+		if column != 0 or row < 0 or row >= len(parentNode.children):
+			return QtCore.QModelIndex()
+		return self.createIndex(row, column, parentNode.children[row])
+
+	def parent(self, index: QtCore.QModelIndex = QtCore.QModelIndex()) -> QtCore.QModelIndex:
+		if not index.isValid():
+			return QtCore.QModelIndex()
+		parentNode = index.internalPointer().parent
+		if parentNode is None or parentNode is self._rootNode:
+			return QtCore.QModelIndex()
+		return self.createIndex(parentNode.row, 0, parentNode)
+
+	def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+		if parent.column() > 0:
+			return 0
+		return len(self._getNode(parent).children)
+
+	def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+		return 1
+
+	def hasChildren(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> bool:
+		node = self._getNode(parent)
+		# Unlisted folders might have contents, and they only get listed when expanded
+		return node.isFolder and (not node.isListed or len(node.children) > 0)
+
+	def canFetchMore(self, parent: QtCore.QModelIndex) -> bool:
+		node = self._getNode(parent)
+		return node.isFolder and not node.isListed and node.listingToken is None
+
+	def fetchMore(self, parent: QtCore.QModelIndex):
+		self._listFolder(self._getNode(parent))
+
+	def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole) -> Any:
+		if not index.isValid():
+			return None
+		node: _LibraryNode = index.internalPointer()
+		if role == QtCore.Qt.DisplayRole:
+			return node.name
+		if role == QtCore.Qt.ToolTipRole:
+			return node.toolTip or node.path
+		return None
+
+	def _getNode(self, index: QtCore.QModelIndex) -> _LibraryNode:
+		return index.internalPointer() if index.isValid() else self._rootNode
+
+	def _getIndex(self, node: _LibraryNode) -> QtCore.QModelIndex:
+		return QtCore.QModelIndex() if node is self._rootNode else self.createIndex(node.row, 0, node)
+
+	def _listFolder(self, node: _LibraryNode):
+		node.listingToken = next(self._listingTokens)
+		self._listingExecutor.submit(self._listFolderInBackground, node.path, node.listingToken, self._shouldSortBySeries)
+
+	def _listFolderInBackground(self, folderPath: str, listingToken: int, shouldSortBySeries: bool):
+		"""Runs on a listing thread. List the folders and supported books in the provided folder, and report them in batches"""
+		startTime = time.perf_counter()
+		catalogedBooks = {book['fileName']: book for book in LibraryCatalog.getBooksInFolder(folderPath)}
+		entryBatch = []
+		sortKeysByName = {}
+		try:
+			with os.scandir(folderPath) as folderEntries:
+				for folderEntry in folderEntries:
+					try:
+						isFolder = folderEntry.is_dir()
+					except OSError:
+						continue
+					if not isFolder and not FileOpenerFactory.isFileSupported(folderEntry.name):
+						continue
+					book = catalogedBooks.get(folderEntry.name, None)
+					sortKeysByName[folderEntry.name] = _getSortKey(folderEntry.name, isFolder, book if shouldSortBySeries else None)
+					entryBatch.append((folderEntry.name, isFolder, _getBookToolTip(folderEntry.path, book)))
+					if len(entryBatch) >= _LISTING_BATCH_SIZE:
+						self._entriesListed.emit(folderPath, listingToken, entryBatch, None)
+						entryBatch = []
+		except OSError as e:
+			logging.warning(f"Listing library folder '{folderPath}' failed: {e}")
+		sortedNames = sorted(sortKeysByName, key=sortKeysByName.__getitem__)
+		self._entriesListed.emit(folderPath, listingToken, entryBatch, sortedNames)
+		logging.debug(f"Listing {len(sortedNames)} entries in library folder '{folderPath}' took {time.perf_counter() - startTime:.4f} seconds")
+
+	def _onEntriesListed(self, folderPath: str, listingToken: int, entries: List[tuple], sortedNames: Optional[List[str]]):
+		node = self._findListingNode(self._rootNode, listingToken)
+		if node is None:
+			# The folder got listed again, or the root path changed, so these entries are outdated
+			return
+		parentIndex = self._getIndex(node)
+		newEntries = []
+		for entryName, isFolder, toolTip in entries:
+			childNode = node.childrenByName.get(entryName, None)
+			if childNode is None or childNode.isFolder != isFolder:
+				newEntries.append((entryName, isFolder, toolTip))
+			else:
+				childNode.toolTip = toolTip
+		if newEntries:
+			self.beginInsertRows(parentIndex, len(node.children), len(node.children) + len(newEntries) - 1)
+			for entryName, isFolder, toolTip in newEntries:
+				childNode = _LibraryNode(node, entryName, os.path.join(folderPath, entryName), isFolder)
+				childNode.row = len(node.children)
+				childNode.toolTip = toolTip
+				node.children.append(childNode)
+				node.childrenByName[entryName] = childNode
+			self.endInsertRows()
+		if sortedNames is not None:
+			node.listingToken = None
+			node.isListed = True
+			self._removeMissingChildren(node, set(sortedNames))
+			self._applySortOrder(node, sortedNames)
+
+	def _findListingNode(self, node: _LibraryNode, listingToken: int) -> Optional[_LibraryNode]:
+		if node.listingToken == listingToken:
+			return node
+		for childNode in node.children:
+			if childNode.isFolder and (childNode.isListed or childNode.listingToken is not None):
+				foundNode = self._findListingNode(childNode, listingToken)
+				if foundNode is not None:
+					return foundNode
+		return None
+
+	def _removeMissingChildren(self, node: _LibraryNode, listedNames: set):
+		"""Remove the entries that were shown before the folder got listed again, but don't exist anymore"""
+		parentIndex = self._getIndex(node)
+		for row in range(len(node.children) - 1, -1, -1):
+			childNode = node.children[row]
+			if childNode.name not in listedNames or node.childrenByName[childNode.name] is not childNode:
+				self.beginRemoveRows(parentIndex, row, row)
+				del node.children[row]
+				if node.childrenByName.get(childNode.name, None) is childNode:
+					del node.childrenByName[childNode.name]
+				self.endRemoveRows()
+		for row, childNode in enumerate(node.children):
+			childNode.row = row
+
+	def _applySortOrder(self, node: _LibraryNode, sortedNames: List[str]):
+		sortedChildren = [node.childrenByName[entryName] for entryName in sortedNames if entryName in node.childrenByName]
+		if sortedChildren == node.children:
+			return
+		self.layoutAboutToBeChanged.emit()
+		# Make sure the selection and expanded folders stay on the same entries, at their new positions
+		oldPersistentIndexes = [persistentIndex for persistentIndex in self.persistentIndexList() if persistentIndex.isValid() and persistentIndex.internalPointer().parent is node]
+		node.children = sortedChildren
+		for row, childNode in enumerate(node.children):
+			childNode.row = row
+		self.changePersistentIndexList(oldPersistentIndexes, [self.createIndex(persistentIndex.internalPointer().row, persistentIndex.column(), persistentIndex.internalPointer()) for persistentIndex in oldPersistentIndexes])
+		self.layoutChanged.emit()
+
+
+def _getNaturalSortKey(text: str) -> List:
+	"""Sort numbers by value instead of per character, so 'Issue 2' comes before 'Issue 10'. Splitting on numbers alternates text and numbers, so keys can always be compared"""
+	return [int(textPart) if textPart.isdigit() else textPart.casefold() for textPart in re.split(r'(\d+)', text)]
+
+def _getNumericValue(text: Optional[str]) -> float:
+	"""Comic info numbers are text, and can be things like '1.5' or '1A'. Unusable ones go after the usable ones"""
+	try:
+		return float(text)
+	except (TypeError, ValueError):
+		return math.inf
+
+def _getSortKey(entryName: str, isFolder: bool, book: Optional[Dict[str, Any]]) -> tuple:
+	entryNameKey = _getNaturalSortKey(entryName)
+	if book is not None and book['Series']:
+		return 1, _getNaturalSortKey(book['Series']), _getNumericValue(book['Volume']), _getNumericValue(book['Number']), entryNameKey
+	return 0 if isFolder else 1, entryNameKey, -math.inf, -math.inf, entryNameKey
+
+def _getBookToolTip(bookPath: str, book: Optional[Dict[str, Any]]) -> Optional[str]:
+	if book is None or book['scanError']:
+		return None
+	toolTipLines = [bookPath]
+	if book['Series']:
+		toolTipLines.append(f"{book['Series']}{' #' + book['Number'] if book['Number'] else ''}")
+	if book['Title']:
+		toolTipLines.append(book['Title'])
+	toolTipLines.append(f"{book['pageCount']} pages")
+	return '\n'.join(toolTipLines)
@@ -36,6 +36,7 @@ class BookDisplayContextMenu(QMenu):
 		self.zoomOptionsMenu.addAction(separator)
 		self.zoomInAction = self._createAction("Zoom In", self.zoomOptionsMenu, self.controller.zoomIn)
 		self.zoomOutAction = self._createAction("Zoom Out", self.zoomOptionsMenu, self.controller.zoomOut)
+		self.toggleMagnifierAction = self._createAction("Magnifier", self.zoomOptionsMenu, self.controller.setMagnifierEnabled, "Show an enlarged view of the page under the mouse cursor", isCheckable=True)
 
 		self.navigateOptionsMenu = self._createMenu("Navigate")
 		self.firstPageAction = self._createAction("First Page", self.navigateOptionsMenu, self.controller.goToFirstPage)
@@ -52,6 +53,7 @@ class BookDisplayContextMenu(QMenu):
 		self.toggleFullscreenAction.setChecked(self.parentWidget.windowController.isFullscreen())
 		self.toggleControlsPanelAction.setChecked(self.controller.isControlsPanelVisible())
 		self.toggleTabBarAction.setChecked(self.parentWidget.windowController.isTabBarVisible())
+		self.toggleMagnifierAction.setChecked(self.controller.isMagnifierEnabled())
 		# Don't allow adjusting the index when we're showing two pages, or when we're at the limits
 		self.showWithPreviousPageAction.setDisabled(self.controller.isFirstPage() or self.controller.isTwoPageSpread())
 		self.showWithNextPageAction.setDisabled(self.controller.isLastPage() or self.controller.isTwoPageSpread())
@@ -1,10 +1,12 @@
-from typing import TYPE_CHECKING, Callable, Dict, Union
+from typing import TYPE_CHECKING, Callable, Dict, FrozenSet, List, Optional, Union
 import logging, time
 
-from PySide6.QtCore import QEvent
+from PySide6.QtCore import QEvent, QObject, QSize, QTimer, Signal
+from PySide6.QtGui import QImage
 
-from comicviewer.files import FileOpenerFactory
+from comicviewer.files.BookLoader import BookLoader
 from comicviewer.images.ImageCacheHandler import ImageCacheHandler
+from comicviewer.images.ThumbnailHandler import ThumbnailHandler
 from comicviewer.ui.ZoomEnum import ZoomEnum
 from comicviewer.settings.SettingsEnum import SettingsEnum
 from comicviewer.settings import SettingsStore
@@ -12,15 +14,30 @@ from comicviewer.misc.DirectionEnum import DirectionEnum
 from comicviewer.files.ComicInfoParser import ComicInfoParser
 from comicviewer.keyboard.KeyboardAction import KeyboardAction
 from comicviewer.ui import UiUtils
-from comicviewer.misc import HistoryStore
+from comicviewer.misc import BookPool, HistoryStore
 
 if TYPE_CHECKING:
 	from comicviewer.ui.bookdisplay.BookDisplayParentWidget import BookDisplayParentWidget
 	from comicviewer.files.BaseFileOpener import BaseFileOpener
+	from comicviewer.misc.BookPool import PooledBook
 
 
-class BookDisplayController:
+# Changing these settings changes how pages are laid out, so the displayed pages need to be redrawn
+_REDRAW_SETTINGS = (SettingsEnum.SHOW_TWO_PAGES, SettingsEnum.CONTINUOUS_SCROLLING, SettingsEnum.GAP_BETWEEN_PAGES, SettingsEnum.DEFAULT_ZOOM_TYPE)
+# Changing these settings only changes which pages should be cached
+_CACHE_SETTINGS = (SettingsEnum.CACHE_AHEAD_COUNT, SettingsEnum.CACHE_BEHIND_COUNT, SettingsEnum.UNCACHE_EXTRA_RANGE, SettingsEnum.CACHE_MEMORY_BUDGET)
+# The size a placeholder is laid out at while the size of its image isn't known yet. Most comic pages have about this aspect ratio
+_PLACEHOLDER_PAGE_SIZE = QSize(800, 1200)
+
+
+class BookDisplayController(QObject):
+	# The image cache handler reports loaded images from a background thread. Pass them through signals, so they get handled on the UI thread
+	_imageLoaded = Signal(int, bool)
+	_imageLoadingFailed = Signal(int, str)
+	_thumbnailLoaded = Signal(int)
+
 	def __init__(self, parent):
+		super().__init__()
 		self.parent: BookDisplayParentWidget = parent
 		# Initialize some variables
 		self.isInitialized: bool = False
@@ -33,7 +50,16 @@ class BookDisplayController:
 		self.bookFileReader: BaseFileOpener or None = None
 		self.imageCacheHandler: ImageCacheHandler or None = None
 		self.comicInfoParser: ComicInfoParser or None = None
+		self._bookLoader: BookLoader or None = None  # Set while the book is being opened in the background
+		self._loadStartTime: float = 0
+		self._isShowingPreviewImages: bool = False  # True if one or more of the displayed images is a preview or placeholder, because the full image is still loading
+		self._thumbnailHandler: ThumbnailHandler or None = None
+		self._needsRedraw: bool = False  # Set if settings that affect the page layout changed while this book display wasn't visible, so it gets redrawn once it's shown
+		self._imageLoaded.connect(self._onImageLoaded)
+		self._imageLoadingFailed.connect(self._onImageLoadingFailed)
+		self._thumbnailLoaded.connect(self._onThumbnailLoaded)
 		self._setUpKeyboardActions()
+		SettingsStore.registerSettingsChangeListener(self._onSettingsChanged, *_REDRAW_SETTINGS, *_CACHE_SETTINGS)
 
 	def _setUpKeyboardActions(self):
 		self._keyboardActionToFunction: Dict[KeyboardAction, Callable] = {
@@ -47,6 +73,7 @@ class BookDisplayController:
 			KeyboardAction.ZOOM_OUT: self.zoomOut,
 			KeyboardAction.ZOOM_FIT_SCREEN: lambda: self.setZoomType(ZoomEnum.FIT_SCREEN),
 			KeyboardAction.ZOOM_ORIGINAL_SIZE: lambda: self.setZoomType(ZoomEnum.ORIGINAL_SIZE),
+			KeyboardAction.TOGGLE_MAGNIFIER: self.setMagnifierEnabled,
 			# UI controls
 			KeyboardAction.TOGGLE_CONTROLS_PANEL: self.setControlsPanelVisible
 		}
@@ -71,23 +98,39 @@ class BookDisplayController:
 		if self.bookPath is not None:
 			if not self.isInitialized:
 				self.loadBookData()
+			elif self._needsRedraw:
+				self.updateView()
+			self._needsRedraw = False
 			HistoryStore.setCurrentBook(self.bookPath)
 
 	def closeBook(self, shouldUpdateDisplays=True):
-		if self.bookFileReader:
+		if self._bookLoader is not None:
+			# The book is still being opened, stop that
+			self._cancelBookLoading()
+		elif self.bookFileReader:
 			# Store where we were
 			HistoryStore.storeBookClosed(self.bookFileReader.filepath)
-			self.parent.windowController.onComicBookClosed(self.parent)
-			self.parent.view.clearImages()
-			self.comicInfoParser = None
-			self.imageCacheHandler = None
-			self.bookFileReader.close()
-			self.bookFileReader = None
-			self.currentImageIndex = -1
-			self.maxImageIndex = 0
-			if shouldUpdateDisplays:
-				self.updatePageCountDisplay()
-				self.updateZoomDisplay()
+			# Don't close the book file immediately, but keep it and the displayed pages around for a while, in case the book gets reopened
+			self.imageCacheHandler.setImageLoadedCallbacks(None, None)
+			BookPool.storeClosedBook(self.bookFileReader, self.comicInfoParser, self.imageCacheHandler, self.getDisplayedIndexes())
+		else:
+			return
+		# This book display is done, its tab gets removed, so it doesn't need to react to settings changes anymore
+		SettingsStore.unregisterSettingsChangeListener(self._onSettingsChanged)
+		if self._thumbnailHandler is not None:
+			self._thumbnailHandler.close()
+			self._thumbnailHandler = None
+		self.parent.controlsColumn.pageNavigator.setPageCount(0)
+		self.parent.windowController.onComicBookClosed(self.parent)
+		self.parent.view.clearImages()
+		self.comicInfoParser = None
+		self.imageCacheHandler = None
+		self.bookFileReader = None
+		self.currentImageIndex = -1
+		self.maxImageIndex = 0
+		if shouldUpdateDisplays:
+			self.updatePageCountDisplay()
+			self.updateZoomDisplay()
 
 	def initializeWithPath(self, bookPath):
 		"""
@@ -100,49 +143,134 @@ class BookDisplayController:
 		self.bookPath = bookPath
 		HistoryStore.storeBookOpened(self.bookPath)
 
-	def loadBook(self, bookPath: str):
+	def loadBook(self, bookPath: str, pooledBook: 'PooledBook' = None):
+		"""
+		Load the provided book immediately
+		:param bookPath: The path to the book to load
+		:param pooledBook: Optionally, the book retrieved from the closed book pool. Its already opened file, comic info and cached images will be used instead of loading them again
+		"""
 		# Close the previous book, if there is any
 		self.closeBook(False)
 		# Load the book
 		self.bookPath = bookPath
-		self.loadBookData()
+		self.loadBookData(pooledBook)
 
-	def loadBookData(self):
-		"""Load the previously stored book path. Store a bookpath with 'initializeWithPath'. Or call 'loadBook' with a path to load the book immediately"""
+	def loadBookData(self, pooledBook: 'PooledBook' = None):
+		"""
+		Load the previously stored book path. Store a bookpath with 'initializeWithPath'. Or call 'loadBook' with a path to load the book immediately
+		Unless a pooled book is provided, the book is opened in the background, and the view gets updated as the loading progresses
+		:param pooledBook: Optionally, the book retrieved from the closed book pool, so the file doesn't need to be opened and parsed again
+		"""
 		if self.bookPath is None:
 			raise AttributeError("Bookpath hasn't been initialized yet")
-		if self.isInitialized:
+		if self.isInitialized or self._bookLoader is not None:
 			return
-		startTime = time.perf_counter()
-		self.bookFileReader: BaseFileOpener = FileOpenerFactory.getFileOpenerForFile(self.bookPath)
+		self._loadStartTime = time.perf_counter()
+		if pooledBook is not None:
+			self.bookFileReader = pooledBook.fileOpener
+			self.maxImageIndex = self.bookFileReader.getMaximumImageIndex()
+			self.comicInfoParser = pooledBook.comicInfoParser
+			self.parent.controlsColumn.updateBookInfoButton()
+			self.imageCacheHandler = pooledBook.imageCacheHandler
+			self._onBookLoaded()
+		else:
+			self._bookLoader = BookLoader(self.bookPath, HistoryStore.getStoredPage(self.bookPath))
+			self._bookLoader.progressChanged.connect(self._onBookLoadingProgress)
+			self._bookLoader.fileOpened.connect(self._onBookFileOpened)
+			self._bookLoader.comicInfoParsed.connect(self._onComicInfoParsed)
+			self._bookLoader.firstPagesLoaded.connect(self._onFirstPagesLoaded)
+			self._bookLoader.loadingFailed.connect(self._onBookLoadingFailed)
+			self._bookLoader.start()
+
+	def isLoading(self) -> bool:
+		""":return: True if the book is currently being opened in the background, False otherwise"""
+		return self._bookLoader is not None
+
+	def _cancelBookLoading(self):
+		self._bookLoader.cancel()
+		self._bookLoader = None
+		# The loader may already have handed over the opened file. Since the book never fully loaded, it's not worth keeping in the closed book pool
+		if self.bookFileReader:
+			self.bookFileReader.close()
+		if self.bookPath in HistoryStore.getSession():
+			HistoryStore.storeBookClosed(self.bookPath)
+		logging.debug(f"Cancelled loading '{self.bookPath}' after {time.perf_counter() - self._loadStartTime:.4f} seconds")
+
+	def _isSignalFromCurrentLoader(self) -> bool:
+		"""
+		Signals from the book loader are delivered asynchronously, so they can arrive after loading was cancelled. This checks if that happened
+		:return: True if the signal currently being handled is from the active book loader, False if it's from a loader that was cancelled
+		"""
+		return self._bookLoader is not None and self.sender() is self._bookLoader
+
+	def _onBookLoadingProgress(self, progressMessage: str):
+		if self._isSignalFromCurrentLoader():
+			self.parent.view.showMessage(progressMessage)
+
+	def _onBookFileOpened(self, fileOpener: 'BaseFileOpener'):
+		if not self._isSignalFromCurrentLoader():
+			# Loading was cancelled before this signal arrived, so nobody else is going to close this opener
+			fileOpener.close()
+			return
+		self.bookFileReader = fileOpener
 		self.maxImageIndex = self.bookFileReader.getMaximumImageIndex()
-		self.imageCacheHandler: ImageCacheHandler = ImageCacheHandler(self.bookFileReader)
-		self.comicInfoParser = ComicInfoParser(self.bookFileReader)
-		self.parent.controlsColumn.updateBookInfoButton()
-		startIndex = HistoryStore.getStoredPage(self.bookPath)
+		self.parent.controlsColumn.updateCurrentPageCountDisplay(0, self.maxImageIndex + 1)
+
+	def _onComicInfoParsed(self, comicInfoParser: ComicInfoParser):
+		if self._isSignalFromCurrentLoader():
+			self.comicInfoParser = comicInfoParser
+			self.parent.controlsColumn.updateBookInfoButton()
+
+	def _onFirstPagesLoaded(self, imageCacheHandler: ImageCacheHandler):
+		if not self._isSignalFromCurrentLoader():
+			imageCacheHandler.trimCache()
+			return
+		self._bookLoader = None
+		self.imageCacheHandler = imageCacheHandler
+		self._onBookLoaded()
+
+	def _onBookLoadingFailed(self, errorMessage: str):
+		if not self._isSignalFromCurrentLoader():
+			return
+		bookPath = self.bookPath
+		self.closeBook()
+		UiUtils.showErrorMessagePopup("Error", f"Something went wrong while opening\n{bookPath}\nPlease make sure your comic book file isn't corrupt\n"
+										f"If this error persists, please report this exception:\n{errorMessage}")
+
+	def _onBookLoaded(self):
+		"""Called when the book file, comic info, and the first pages are loaded, so the book can be shown"""
+		self.isInitialized = True
+		self.imageCacheHandler.setImageLoadedCallbacks(self._imageLoaded.emit, self._imageLoadingFailed.emit)
+		self._thumbnailHandler = ThumbnailHandler(self.bookFileReader, self._thumbnailLoaded.emit)
+		self.parent.controlsColumn.pageNavigator.setPageCount(self.maxImageIndex + 1)
+		startIndex = min(HistoryStore.getStoredPage(self.bookPath), self.maxImageIndex)
 		self._goToPageIndex(startIndex)
 		HistoryStore.storeBookOpened(self.bookPath)
-		logging.debug(f"Loading comic book took {time.perf_counter() - startTime:.4f} seconds")
-		self.isInitialized = True
+		logging.debug(f"Loading comic book took {time.perf_counter() - self._loadStartTime:.4f} seconds")
 
 	def goToPreviousPage(self) -> bool:
-		if self.bookFileReader is None:
+		if self.imageCacheHandler is None:
 			return False
 		if self.currentImageIndex == 0:
 			return False
-		if not self.isLastPage() and SettingsStore.getSettingValue(SettingsEnum.SHOW_TWO_PAGES) and not self.isTwoPageSpread(self.currentImageIndex - 1):
-			newIndex = max(0, self.currentImageIndex - 2)
-		else:
-			newIndex = self.currentImageIndex - 1
-		didPageChange = self._goToPageIndex(newIndex)
-		if didPageChange:
+		didPageChange = self._goToPageIndex(self._getPreviousPageIndex())
+		if didPageChange and not self._isShowingContinuousPages():
 			# If you're going up a page, scroll to the bottom
 			self.parent.view.scrollToBottom()
 		return didPageChange
 
 	def goToNextPage(self) -> bool:
-		newIndex = self.currentImageIndex + (2 if self.isShowingTwoPages else 1)
-		return self._goToPageIndex(newIndex)
+		return self._goToPageIndex(self._getNextPageIndex())
+
+	def _getPreviousPageIndex(self) -> int:
+		""":return: The index that going to the previous page would show. Shouldn't be called when on the first page"""
+		if not self.isLastPage() and self._shouldShowTwoPagesSetting() and not self.isTwoPageSpread(self.currentImageIndex - 1):
+			return max(0, self.currentImageIndex - 2)
+		return self.currentImageIndex - 1
+
+	def _getNextPageIndex(self) -> int:
+		""":return: The index that going to the next page would show. This is beyond the maximum index if we're on the last page"""
+		return self.currentImageIndex + (2 if self.isShowingTwoPages else 1)
 
 	def goToFirstPage(self) -> bool:
 		if self.currentImageIndex == 0:
@@ -152,13 +280,23 @@ class BookDisplayController:
 			return self._goToPageIndex(0)
 
 	def goToLastPage(self) -> bool:
+		if self.imageCacheHandler is None:
+			return False
 		# If the last page isn't a back cover or a wide image, show it with the second-to-last image
-		if self.comicInfoParser.canImageBeDoublePage(self.maxImageIndex) and not self.isTwoPageSpread(self.maxImageIndex):
+		if self._shouldShowTwoPagesSetting() and self.comicInfoParser.canImageBeDoublePage(self.maxImageIndex) and not self.isTwoPageSpread(self.maxImageIndex):
 			newIndex = self.maxImageIndex - 1
 		else:
 			newIndex = self.maxImageIndex
 		return self._goToPageIndex(newIndex)
 
+	def goToPage(self, index: int) -> bool:
+		"""
+		Go to the provided page
+		:param index: The index of the page to go to
+		:return: True if the page changed, False otherwise
+		"""
+		return self._goToPageIndex(index)
+
 	def showWithPreviousPage(self) -> bool:
 		"""
 		Show one index lower. This is used as a correction for when we accidentally show two images that shouldn't be shown together, for instance if you go to the last page but it's not a backcover
@@ -179,34 +317,26 @@ class BookDisplayController:
 		:param newIndex: The absolute index to show
 		:return: True if the page changed, False otherwise
 		"""
-		if not self.bookFileReader:
+		if not self.imageCacheHandler:
 			return False
 		if not forceRedraw and newIndex == self.currentImageIndex:
 			return False
 		if newIndex < 0 or newIndex > self.maxImageIndex:
 			return False
+		if SettingsStore.getSettings().CONTINUOUS_SCROLLING:
+			return self._goToPageIndexContinuously(newIndex, forceRedraw)
+		elif self._isShowingContinuousPages():
+			# Continuous scrolling was turned off, so go back to showing a single spread
+			self.parent.view.clearImages()
 
 		startTime = time.perf_counter()
-		# Show a second image if this isn't a cover or a two-page spread, and if the user wants two show to pages at once
-		self.isShowingTwoPages = newIndex < self.maxImageIndex and SettingsStore.getSettingValue(SettingsEnum.SHOW_TWO_PAGES)
-		if self.isShowingTwoPages:
-			self.isShowingTwoPages = self.comicInfoParser.canImageBeDoublePage(newIndex)
-			# If the comic info parser doesn't know if it can be double page, check if it's the first image or a wide image
-			if self.isShowingTwoPages is None:
-				self.isShowingTwoPages = newIndex != 0 and not self.isTwoPageSpread(newIndex)
+		self.isShowingTwoPages = self._shouldShowTwoPages(newIndex)
 		logging.debug(f"Determined if we need a second page at {time.perf_counter() - startTime:.4f} seconds in, {self.isShowingTwoPages=}")
 		try:
-			if self.isShowingTwoPages:
-				image1, image2 = self.imageCacheHandler.retrieveImages(newIndex, newIndex + 1)
-				logging.debug(f"Loaded two images at {time.perf_counter() - startTime:.4f} seconds in")
-				self.parent.view.setImages(image1, image2)
-			else:
-				image = self.imageCacheHandler.retrieveImages(newIndex)[0]
-				self.parent.view.setImages(image)
+			self._displayImages(self._getSpreadIndexes(newIndex, self.isShowingTwoPages))
 		except Exception as e:
 			logging.exception(f"{type(e)} exception while loading page index {newIndex}: {e}\n")
-			UiUtils.showErrorMessagePopup("Error", f"Something went wrong while loading an image.\nPlease make sure your comic book file isn't corrupt\n"
-											f"If this error persists, please report this exception:\n{e} [{type(e)}]")
+			self._showImageLoadingError(f"{e} [{type(e)}]")
 			return False
 
 		# Changing pages succeeded, store that we're now on a new page
@@ -216,8 +346,151 @@ class BookDisplayController:
 		self.updatePageCountDisplay()
 		# Changing image may also change the zoom level, so update the display of that as well
 		self.updateZoomDisplay()
+		# Once this page change is drawn, get the pages around it ready so the next page change is instant
+		QTimer.singleShot(0, self._prepareNearbySpreads)
 		return True
 
+	def _goToPageIndexContinuously(self, newIndex: int, forceRedraw: bool) -> bool:
+		"""
+		Scroll to the provided page index in the continuous page strip, and create the strip if it isn't shown yet
+		:param newIndex: The absolute index to scroll to
+		:param forceRedraw: If True, the continuous page strip gets recreated, for instance because settings changed
+		:return: True if the page changed, False otherwise
+		"""
+		if forceRedraw or not self._isShowingContinuousPages():
+			self.isShowingTwoPages = False
+			self._isShowingPreviewImages = False
+			self.parent.view.showContinuousPages(self.imageCacheHandler, self.maxImageIndex + 1, self._onContinuousPageChanged)
+		self.parent.view.scrollToContinuousPage(newIndex)
+		self._onContinuousPageChanged(newIndex)
+		return True
+
+	def _onContinuousPageChanged(self, newIndex: int):
+		"""Called when the page at the top of the continuous page strip changes, usually because the user scrolled"""
+		if newIndex == self.currentImageIndex:
+			return
+		self.currentImageIndex = newIndex
+		HistoryStore.setStoredPage(self.bookFileReader.filepath, self.currentImageIndex)
+		self.updatePageCountDisplay()
+		self.updateZoomDisplay()
+
+	def _isShowingContinuousPages(self) -> bool:
+		return self.parent.view.isShowingContinuousPages()
+
+	def _shouldShowTwoPagesSetting(self) -> bool:
+		""":return: True if the settings say two pages should be shown side-by-side where possible. Continuous scrolling always shows single pages"""
+		settings = SettingsStore.getSettings()
+		return settings.SHOW_TWO_PAGES and not settings.CONTINUOUS_SCROLLING
+
+	def _shouldShowTwoPages(self, index: int) -> bool:
+		"""
+		:param index: The index of the first image to show
+		:return: True if the image at the provided index should be shown together with the next image, False if it should be shown on its own
+		"""
+		# Show a second image if this isn't a cover or a two-page spread, and if the user wants two show to pages at once
+		if index >= self.maxImageIndex or not self._shouldShowTwoPagesSetting():
+			return False
+		canBeDoublePage = self.comicInfoParser.canImageBeDoublePage(index)
+		# If the comic info parser doesn't know if it can be double page, check if it's the first image or a wide image
+		if canBeDoublePage is None:
+			canBeDoublePage = index != 0 and not self.isTwoPageSpread(index)
+		return canBeDoublePage
+
+	def _getSpreadIndexes(self, index: int, shouldShowTwoPages: bool = None) -> List[int]:
+		"""
+		Get the indexes of the images that would be shown together if we went to the provided index
+		:param index: The index of the first image of the spread
+		:param shouldShowTwoPages: Whether the spread consists of two images. If this is None, that is determined
+		:return: The image indexes in the spread, or an empty list if the index is out of range
+		"""
+		if index < 0 or index > self.maxImageIndex:
+			return []
+		if shouldShowTwoPages is None:
+			shouldShowTwoPages = self._shouldShowTwoPages(index)
+		return [index, index + 1] if shouldShowTwoPages else [index]
+
+	def _prepareNearbySpreads(self):
+		"""Have the view lay out the spreads before and after the current one while nothing else is happening, so changing to them is just a swap"""
+		if self.imageCacheHandler is None or self._isShowingPreviewImages or self._isShowingContinuousPages():
+			return
+		startTime = time.perf_counter()
+		try:
+			spreadsToPrepare = [self._getSpreadIndexes(self._getNextPageIndex())]
+			if self.currentImageIndex > 0:
+				spreadsToPrepare.append(self._getSpreadIndexes(self._getPreviousPageIndex()))
+		except Exception as e:
+			# This is just an optimization, if something's wrong with the nearby images, it'll get reported when they're actually displayed
+			logging.debug(f"{type(e)} exception while determining nearby spreads to prepare: {e}")
+			return
+		for spreadIndexes in spreadsToPrepare:
+			if not spreadIndexes:
+				continue
+			# Only prepare spreads with fully loaded images, preparing previews would be wasted work
+			images = self.imageCacheHandler.getCachedImages(*spreadIndexes)
+			if images:
+				self.parent.view.prepareSpread(spreadIndexes, images)
+		logging.debug(f"Preparing nearby spreads took {time.perf_counter() - startTime:.4f} seconds")
+
+	def _displayImages(self, indexes: List[int], shouldResetScroll: bool = True):
+		"""
+		Show the images for the provided indexes. This doesn't wait for images that aren't loaded yet, those are shown as a preview or placeholder,
+		and get replaced by the full image once it's loaded in the background
+		:param indexes: The image indexes to show
+		:param shouldResetScroll: Whether the view should scroll back to the top left. Should be False when replacing previews, so the view doesn't jump
+		"""
+		images, areAllImagesFull = self.imageCacheHandler.retrieveImages(*indexes)
+		# Use the sizes of the full images, so previews and placeholders get laid out exactly like the full images will be
+		# If a size isn't known yet, it gets looked up in the background along with the preview, and the page gets laid out again once that's done
+		imageSizes = [self.imageCacheHandler.getKnownImageSize(index) or _PLACEHOLDER_PAGE_SIZE for index in indexes]
+		self._isShowingPreviewImages = not areAllImagesFull
+		# Only full images are worth keeping around in the view when we change page, so only pass along the indexes for those
+		self.parent.view.setImages(*images, imageSizes=imageSizes, shouldResetScroll=shouldResetScroll, spreadIndexes=indexes if areAllImagesFull else None)
+
+	def _onImageLoaded(self, index: int, isPreview: bool):
+		"""
+		Called when an image is done loading in the background
+		If it's one of the images we're showing a preview or placeholder for, show the new image. If it's a nearby image, get it ready for display
+		"""
+		if self.imageCacheHandler is None:
+			return
+		if self._isShowingContinuousPages():
+			# The continuous page strip keeps track of which of its pages need updating itself
+			self.parent.view.onContinuousPageLoaded(index)
+			return
+		if index not in self.getDisplayedIndexes():
+			if not isPreview and not self._isShowingPreviewImages:
+				self._prepareNearbySpreads()
+			return
+		# If the user changed page since the image was requested, the image isn't needed anymore
+		if not self._isShowingPreviewImages:
+			return
+		if index == self.currentImageIndex and self._shouldShowTwoPages(index) != self.isShowingTwoPages:
+			# The size of the image wasn't known when the page was shown, and now that it is, it turns out it should be shown with a different number of pages
+			logging.debug(f"Image index {index} finished loading and changed whether it's a two-page spread, redrawing")
+			self._goToPageIndex(index, True)
+			return
+		logging.debug(f"{'Preview of i' if isPreview else 'I'}mage index {index} finished loading, updating display")
+		self._displayImages(self.getDisplayedIndexes(), False)
+		if not self._isShowingPreviewImages:
+			self._prepareNearbySpreads()
+
+	def _onImageLoadingFailed(self, index: int, errorMessage: str):
+		# Only bother the user if the image that failed is one they're trying to look at
+		if index in self.getDisplayedIndexes():
+			self._showImageLoadingError(errorMessage)
+
+	def _showImageLoadingError(self, errorMessage: str):
+		UiUtils.showErrorMessagePopup("Error", f"Something went wrong while loading an image.\nPlease make sure your comic book file isn't corrupt\n"
+										f"If this error persists, please report this exception:\n{errorMessage}")
+
+	def getDisplayedIndexes(self) -> List[int]:
+		""":return: The image indexes that are currently displayed. This is empty if no book is loaded"""
+		if self.currentImageIndex < 0:
+			return []
+		if self.isShowingTwoPages:
+			return [self.currentImageIndex, self.currentImageIndex + 1]
+		return [self.currentImageIndex]
+
 	def isFirstPage(self):
 		return self.currentImageIndex == 0
 
@@ -230,22 +503,39 @@ class BookDisplayController:
 		:param index: The index to check, or the curren index if left empty
 		:return: True if the (current) index is a two page spread, False otherwise
 		"""
+		if self.imageCacheHandler is None:
+			return False
 		return self.imageCacheHandler.isImageTwoPageSpread(index if index is not None else self.currentImageIndex)
 
 	def updateImageCache(self):
-		"""Make sure the image cache is up to date"""
-		if self.imageCacheHandler is None:
+		"""Make sure the image cache is up to date. The cache gets updated in the background, so this returns immediately"""
+		if self.imageCacheHandler is None or self._isShowingContinuousPages():
+			# The continuous page strip manages the cache itself, based on what's on screen
 			return
 		if self.isShowingTwoPages:
-			self.imageCacheHandler.updateCache(self.currentImageIndex, self.currentImageIndex + 1)
+			self.imageCacheHandler.updateCacheInBackground(self.currentImageIndex, self.currentImageIndex + 1)
 		else:
-			self.imageCacheHandler.updateCache(self.currentImageIndex)
+			self.imageCacheHandler.updateCacheInBackground(self.currentImageIndex)
 
 	def updateView(self):
 		"""Redraw the currently displayed page(s)"""
 		if self.isInitialized:
+			# The prepared spreads may depend on settings that changed, so make sure they get prepared again
+			self.parent.view.clearPreparedSpreads()
 			self._goToPageIndex(self.currentImageIndex, True)
 
+	def _onSettingsChanged(self, settings: SettingsStore.SettingsSnapshot, changedSettings: FrozenSet[SettingsEnum]):
+		if not changedSettings.isdisjoint(_REDRAW_SETTINGS):
+			if self.parent.isVisible():
+				# Updating the view also updates the cache, so don't do both
+				self.updateView()
+			else:
+				# Redrawing decodes and lays out pages, doing that for every open book at once would freeze the program, so background books get redrawn when they're shown
+				self._needsRedraw = True
+		elif not changedSettings.isdisjoint(_CACHE_SETTINGS) and not self._needsRedraw:
+			# If a redraw is pending, the cache gets updated when that happens
+			self.updateImageCache()
+
 	def updatePageCountDisplay(self):
 		"""Update the displayed current page number(s) in the controls panel"""
 		if self.bookFileReader:
@@ -253,9 +543,32 @@ class BookDisplayController:
 			if self.isShowingTwoPages:
 				currentPages.append(self.currentImageIndex + 2)
 			self.parent.controlsColumn.updateCurrentPageCountDisplay(currentPages, self.maxImageIndex + 1)
+			self.parent.controlsColumn.pageNavigator.setCurrentPage(self.currentImageIndex)
 		else:
 			self.parent.controlsColumn.updateCurrentPageCountDisplay(0, 0)
 
+	def getThumbnail(self, index: int) -> Optional[QImage]:
+		"""
+		Get the thumbnail of a page. If it isn't loaded yet, it gets loaded in the background, and the page navigator gets informed when it's ready
+		:param index: The index of the page to get the thumbnail of
+		:return: The thumbnail, or None if it isn't loaded yet or no book is loaded
+		"""
+		if self._thumbnailHandler is None:
+			return None
+		return self._thumbnailHandler.getThumbnail(index)
+
+	def cancelThumbnailLoading(self, *indexesToKeep: int):
+		"""
+		Stop loading the thumbnails that aren't needed anymore, for instance because they scrolled out of view
+		:param indexesToKeep: The indexes of the thumbnails that are still needed
+		"""
+		if self._thumbnailHandler is not None:
+			self._thumbnailHandler.cancelLoading(*indexesToKeep)
+
+	def _onThumbnailLoaded(self, index: int):
+		if self._thumbnailHandler is not None:
+			self.parent.controlsColumn.pageNavigator.onThumbnailLoaded(index)
+
 	def setZoomType(self, zoomType: ZoomEnum):
 		if self.bookFileReader:
 			self.parent.view.setZoomType(zoomType)
@@ -274,6 +587,16 @@ class BookDisplayController:
 			self.parent.view.zoomOut()
 			self.updateZoomDisplay()
 
+	def isMagnifierEnabled(self) -> bool:
+		return self.parent.view.isMagnifierEnabled
+
+	def setMagnifierEnabled(self, setEnabled: Union[bool, None] = None):
+		"""
+		Sets whether a magnifier loupe follows the mouse cursor over the page
+		:param setEnabled: The magnifier will be enabled if True, disabled if False, and toggled if this is None or left empty
+		"""
+		self.parent.view.setMagnifierEnabled(setEnabled)
+
 	def updateZoomDisplay(self):
 		if self.bookFileReader:
 			zoomLevel = self.parent.view.imageScale
@@ -312,7 +635,8 @@ class BookDisplayController:
 		# Check if we should change page if scroll past the page limit
 		logging.debug(f"HandleScroll in direction {scrollDirection}, {isEdgeScroll=}, last scroll direction is {self._lastEdgeScrollDirection}")
 		startTime = time.perf_counter()
-		if not SettingsStore.getSettingValue(SettingsEnum.CHANGE_PAGE_WHEN_SCROLL_PAST_EDGE):
+		settings = SettingsStore.getSettings()
+		if not settings.CHANGE_PAGE_WHEN_SCROLL_PAST_EDGE or self._isShowingContinuousPages():
 			return
 		if scrollDirection == DirectionEnum.UNKNOWN:
 			return
@@ -323,7 +647,7 @@ class BookDisplayController:
 		shouldChangePage = True
 		# If the 'pause on edge scrolling' setting is on, don't immediately change page, but only if the user persists in edge scrolling in the same direction
 		# This shouldn't apply to the zoom types that already maximise in a certain direction
-		timeBeforePageChange = SettingsStore.getSettingValue(SettingsEnum.TIME_BEFORE_SCROLL_CHANGES_PAGE)
+		timeBeforePageChange = settings.TIME_BEFORE_SCROLL_CHANGES_PAGE
 		if timeBeforePageChange > 0 and\
 				self.parent.view.currentZoomType != ZoomEnum.FIT_SCREEN and\
 				not (self.parent.view.currentZoomType == ZoomEnum.FIT_HORIZONTAL and scrollDirection in (DirectionEnum.WEST, DirectionEnum.EAST)) and\
@@ -4,6 +4,7 @@ from PySide6 import QtWidgets
 
 from comicviewer.ui import UiUtils
 from comicviewer.ui.ZoomEnum import ZoomEnum
+from comicviewer.ui.bookdisplay.PageNavigatorWidget import PageNavigatorWidget
 
 if TYPE_CHECKING:
 	from comicviewer.ui.bookdisplay.BookDisplayParentWidget import BookDisplayParentWidget
@@ -56,8 +57,9 @@ class BookDisplayControlsWidget(QtWidgets.QWidget):
 		self.closeBookButton = UiUtils.createButton('Close', self.parent.controller.closeBook, layout, "Close the comic book")
 		self.showBookInfoButton = UiUtils.createButton('ⓘ', self.parent.controller.showBookInfo, layout, "Show information about this comic book", buttonWidth=20)
 
-		# Push the controls to the top
-		layout.addStretch(1)
+		# The page navigator takes up the rest of the space, which also pushes the controls to the top
+		self.pageNavigator = PageNavigatorWidget(self.parent)
+		layout.addWidget(self.pageNavigator, 1)
 
 		self.debugOutput = QtWidgets.QLabel()
 		layout.addWidget(self.debugOutput)
@@ -1,5 +1,5 @@
-import logging, time
-from typing import TYPE_CHECKING, List
+import concurrent.futures, logging, time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple
 
 from PySide6 import QtCore, QtGui, QtWidgets
 
@@ -8,22 +8,46 @@ from comicviewer.settings.SettingsEnum import SettingsEnum
 from comicviewer.settings import SettingsStore
 from comicviewer.images import ImageUtils
 from comicviewer.ui.bookdisplay.BookDisplayContextMenu import BookDisplayContextMenu
+from comicviewer.ui.bookdisplay import TiledImageItem
+from comicviewer.ui.bookdisplay.ContinuousPageStrip import ContinuousPageStrip
+from comicviewer.ui.bookdisplay.ImageItem import ImageItem
+from comicviewer.ui.bookdisplay.MagnifierLoupe import MagnifierLoupe
 from comicviewer.misc.DirectionEnum import DirectionEnum
 
 if TYPE_CHECKING:
+	from comicviewer.images.ImageCacheHandler import ImageCacheHandler
 	from comicviewer.ui.bookdisplay.BookDisplayParentWidget import BookDisplayParentWidget
 
 _SCROLL_DISTANCE = 100
 _ZOOM_STEPS = 0.05
+_SMOOTH_RESCALE_DELAY = 150  # How many milliseconds the view size and zoom level should be stable before the images get rescaled in high quality
+_MAX_PREPARED_SPREADS = 2  # How many hidden spreads are kept ready, usually the previous and the next one
+
+
+class _PreparedSpread:
+	"""One or two images that are scaled and positioned in the scene, but hidden until they're shown"""
+	def __init__(self, baseImages: Sequence[QtGui.QImage], imageItems: List[QtWidgets.QGraphicsItem], scaledImagesWidth: int, scaledImagesHeight: int, imageScale: float, geometryKey: Tuple):
+		self.baseImages = baseImages
+		self.imageItems = imageItems
+		self.scaledImagesWidth = scaledImagesWidth
+		self.scaledImagesHeight = scaledImagesHeight
+		self.imageScale = imageScale
+		self.geometryKey = geometryKey  # The view geometry this spread was laid out for. If the view geometry changes, this spread can't be used anymore
+
 
 class BookDisplayView(QtWidgets.QGraphicsView):
+	_smoothImagesScaled = QtCore.Signal(int, object)  # Emitted from a worker thread with the rescale generation and the smoothly scaled images, so they get handled on the UI thread
+	_rescaleExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=1)  # Initialize as class variable so all views share it
+
 	def __init__(self, parent, *args, **kwargs):
 		super().__init__(*args, **kwargs)
 		self.parent: BookDisplayParentWidget = parent
 		# Initialize some values
 		self._baseImages: List[QtGui.QImage] or None = None  # The base images to show. Stored to make repeated scaling easier
+		self._baseImageSizes: List[QtCore.QSize] or None = None  # The full sizes of the base images. Can differ from the base image sizes if those are previews
 		self._imageScene: QtWidgets.QGraphicsScene or None = None  # The scene in which the images get drawn
-		self._imageItems: List[QtWidgets.QGraphicsPixmapItem] or None = None  # The images as drawn on the scene
+		self._imageItems: List[QtWidgets.QGraphicsItem] or None = None  # The images as drawn on the scene. Either ImageItems, or TiledImageItems for huge images
+		self._messageItem: QtWidgets.QGraphicsSimpleTextItem or None = None  # Shows a text message instead of images, for instance while a book is being loaded
 		self._baseImagesWidth = 0
 		self._baseImagesHeight = 0
 		self._scaledImagesWidth = 0
@@ -31,6 +55,15 @@ class BookDisplayView(QtWidgets.QGraphicsView):
 		self.currentZoomType = SettingsStore.getSettingValue(SettingsEnum.DEFAULT_ZOOM_TYPE)
 		self.imageScale: float = 1  # By which factor we need to shrink the image, depending on zoom type and level
 		self.contextMenu: BookDisplayContextMenu or None = None  # Will get filled when needed
+		self._displayedSpreadIndexes: Tuple[int, ...] or None = None  # The image indexes of the displayed images, if they're full images
+		self._displayedGeometryKey: Tuple or None = None  # The view geometry the displayed images were laid out for
+		self._preparedSpreads: Dict[Tuple[int, ...], _PreparedSpread] = {}  # Spreads that are laid out in the scene but hidden, so showing them is just a swap. Oldest first
+		self._renderedImageScale: float = 1  # The scale the images of the displayed image items were rendered at. Can differ from 'imageScale' while resizing or zooming, the item transform makes up the difference
+		self._rescaleGeneration = 0  # Increased every time the displayed images change, so outdated smooth rescale results can be ignored
+		self._smoothRescaleTimer: QtCore.QTimer or None = None
+		self._continuousPageStrip: ContinuousPageStrip or None = None  # Set while all pages are shown below each other, instead of one spread at a time
+		self._magnifierLoupe: MagnifierLoupe or None = None  # Will get filled when the magnifier is first enabled
+		self.isMagnifierEnabled: bool = False
 
 		# Create the components
 		self._initializeView()
@@ -48,6 +81,12 @@ class BookDisplayView(QtWidgets.QGraphicsView):
 		self.verticalScrollBar().actionTriggered.connect(lambda scrollType: self._handleScroll(scrollType, self.verticalScrollBar()))
 		self.horizontalScrollBar().actionTriggered.connect(lambda scrollType: self._handleScroll(scrollType, self.horizontalScrollBar()))
 		self.installEventFilter(self)
+		# Rescaling in high quality is slow, so while resizing or zooming only do that once things have been stable for a bit
+		self._smoothRescaleTimer = QtCore.QTimer(self)
+		self._smoothRescaleTimer.setSingleShot(True)
+		self._smoothRescaleTimer.setInterval(_SMOOTH_RESCALE_DELAY)
+		self._smoothRescaleTimer.timeout.connect(self._startSmoothRescale)
+		self._smoothImagesScaled.connect(self._onSmoothImagesScaled)
 
 	def _handleScroll(self, scrollType: QtWidgets.QAbstractSlider.SliderAction, scrollbar: QtWidgets.QScrollBar):
 		"""
@@ -82,10 +121,161 @@ class BookDisplayView(QtWidgets.QGraphicsView):
 		self.parent.controller.handleScroll(direction, isEdgeScroll)
 
 	def clearImages(self):
+		if self._continuousPageStrip is not None:
+			self._continuousPageStrip.clear()
+			self._continuousPageStrip = None
 		self._baseImages = None
+		self._baseImageSizes = None
+		self._displayedSpreadIndexes = None
+		self._clearImageItems()
+		self.clearMessage()
+		self.clearPreparedSpreads()
+
+	def showContinuousPages(self, imageCacheHandler: 'ImageCacheHandler', pageCount: int, onCurrentPageChanged: Callable[[int], None]):
+		"""
+		Show all the pages of the book below each other, instead of a single spread. Only the pages near the visible area are actually drawn
+		:param imageCacheHandler: The image cache of the book to show
+		:param pageCount: How many pages the book has
+		:param onCurrentPageChanged: Called with the index of the page at the top of the view whenever that changes because of scrolling
+		"""
+		self.clearImages()
+		self._continuousPageStrip = ContinuousPageStrip(self, imageCacheHandler, pageCount)
+		self._continuousPageStrip.currentPageChanged.connect(onCurrentPageChanged)
+		self._continuousPageStrip.layOutPages()
+		# Long strips are always taller than the view, so they can always be dragged
+		self.setDragMode(self.DragMode.ScrollHandDrag)
+		self.setFocus()
+
+	def isShowingContinuousPages(self) -> bool:
+		""":return: True if all pages are shown below each other, False if a single spread is shown"""
+		return self._continuousPageStrip is not None
+
+	def scrollToContinuousPage(self, pageIndex: int):
+		"""
+		Scroll to the top of the provided page, when showing continuous pages
+		:param pageIndex: The index of the page to scroll to
+		"""
+		if self._continuousPageStrip is not None:
+			self._continuousPageStrip.scrollToPage(pageIndex)
+
+	def onContinuousPageLoaded(self, pageIndex: int):
+		"""
+		Should be called when an image finished loading while showing continuous pages, so it can replace its preview or placeholder
+		:param pageIndex: The index of the page that finished loading
+		"""
+		if self._continuousPageStrip is not None:
+			self._continuousPageStrip.onImageLoaded(pageIndex)
+
+	def prepareSpread(self, spreadIndexes: Sequence[int], images: Sequence[QtGui.QImage]):
+		"""
+		Scale and lay out the provided images in the scene without showing them, so that calling 'setImages' with the same spread indexes later only has to swap them in
+		:param spreadIndexes: The image indexes of the provided images, used to recognise the spread when it should be shown
+		:param images: The full images of the spread
+		"""
+		spreadIndexes = tuple(spreadIndexes)
+		if spreadIndexes == self._displayedSpreadIndexes:
+			return
+		geometryKey = self._getGeometryKey()
+		existingPreparedSpread = self._preparedSpreads.get(spreadIndexes, None)
+		if existingPreparedSpread is not None:
+			if existingPreparedSpread.geometryKey == geometryKey:
+				return
+			self._removePreparedSpread(spreadIndexes)
+		startTime = time.perf_counter()
+		imageSizes = [image.size() for image in images]
+		imageScale = self._calculateImageScale(imageSizes)
+		scaledImages = self._scaleImagesBy(images, imageSizes, imageScale)
+		scaledImagesWidth, scaledImagesHeight = ImageUtils.calculateWidthAndHeight(self._getScaledSizes(imageSizes, imageScale))
+		imageItems = []
+		for image, imageSize, scaledImage in zip(images, imageSizes, scaledImages):
+			imageItem = self._createImageItem(image, imageSize, scaledImage, imageScale)
+			imageItem.setVisible(False)
+			imageItems.append(imageItem)
+		self._positionImages(imageItems, scaledImagesWidth)
+		self._storePreparedSpread(spreadIndexes, _PreparedSpread(images, imageItems, scaledImagesWidth, scaledImagesHeight, imageScale, geometryKey))
+		logging.debug(f"Preparing spread {spreadIndexes} took {time.perf_counter() - startTime:.4f} seconds")
+
+	def clearPreparedSpreads(self):
+		"""Remove all the prepared spreads, for instance because they're outdated"""
+		for spreadIndexes in list(self._preparedSpreads.keys()):
+			self._removePreparedSpread(spreadIndexes)
+
+	def _storePreparedSpread(self, spreadIndexes: Tuple[int, ...], preparedSpread: _PreparedSpread):
+		self._preparedSpreads[spreadIndexes] = preparedSpread
+		# Remove the oldest prepared spreads if we have too many
+		while len(self._preparedSpreads) > _MAX_PREPARED_SPREADS:
+			self._removePreparedSpread(next(iter(self._preparedSpreads)))
+
+	def _removePreparedSpread(self, spreadIndexes: Tuple[int, ...]):
+		preparedSpread = self._preparedSpreads.pop(spreadIndexes, None)
+		if preparedSpread is not None:
+			for imageItem in preparedSpread.imageItems:
+				self._imageScene.removeItem(imageItem)
+
+	def _stashDisplayedSpread(self):
+		"""Hide the displayed images and keep them as a prepared spread instead of removing them, so going back to them is instant. Only full images are stashed"""
+		if self._displayedSpreadIndexes is None or not self._imageItems or self._displayedGeometryKey is None:
+			return
+		for imageItem in self._imageItems:
+			imageItem.setVisible(False)
+		self._storePreparedSpread(self._displayedSpreadIndexes, _PreparedSpread(self._baseImages, self._imageItems, self._scaledImagesWidth, self._scaledImagesHeight,
+																				self.imageScale, self._displayedGeometryKey))
+		self._imageItems = None
+		self._displayedSpreadIndexes = None
+
+	def _showPreparedSpread(self, spreadIndexes: Tuple[int, ...], preparedSpread: _PreparedSpread, shouldResetScroll: bool):
+		startTime = time.perf_counter()
+		self._stashDisplayedSpread()
 		self._clearImageItems()
+		self.clearMessage()
+		self._baseImages = preparedSpread.baseImages
+		self._baseImageSizes = [image.size() for image in preparedSpread.baseImages]
+		self._baseImagesWidth, self._baseImagesHeight = ImageUtils.calculateWidthAndHeight(self._baseImageSizes, False)
+		self._imageItems = preparedSpread.imageItems
+		self._scaledImagesWidth = preparedSpread.scaledImagesWidth
+		self._scaledImagesHeight = preparedSpread.scaledImagesHeight
+		self.imageScale = preparedSpread.imageScale
+		self._renderedImageScale = preparedSpread.imageScale
+		self._displayedSpreadIndexes = spreadIndexes
+		self._displayedGeometryKey = preparedSpread.geometryKey
+		for imageItem in self._imageItems:
+			imageItem.setVisible(True)
+		self._setSceneSize()
+		if shouldResetScroll:
+			self._resetScrollPosition()
+		self._setHandIconOnMouseOver()
+		self.setFocus()
+		self._updateMagnifier()
+		logging.debug(f"Swapping in prepared spread {spreadIndexes} took {time.perf_counter() - startTime:.4f} seconds")
+
+	def _getGeometryKey(self) -> Tuple:
+		""":return: A value that changes whenever something changes that influences how images get scaled and positioned"""
+		return self.width(), self.height(), self.currentZoomType, self.imageScale if self.currentZoomType == ZoomEnum.CUSTOM else None, SettingsStore.getSettings().GAP_BETWEEN_PAGES
+
+	def showMessage(self, message: str):
+		"""
+		Show a text message in the middle of the view, for instance to show the progress of loading a book. This is cleared when images get drawn
+		:param message: The message to show
+		"""
+		if self._messageItem is None:
+			self._messageItem = self._imageScene.addSimpleText(message)
+			self._messageItem.setBrush(QtGui.QBrush(QtCore.Qt.white))
+		else:
+			self._messageItem.setText(message)
+		self._positionMessage()
+
+	def clearMessage(self):
+		if self._messageItem is not None:
+			self._imageScene.removeItem(self._messageItem)
+			self._messageItem = None
+
+	def _positionMessage(self):
+		self.setSceneRect(0, 0, self.width(), self.height())
+		messageRect = self._messageItem.boundingRect()
+		self._messageItem.setPos((self.width() - messageRect.width()) // 2, (self.height() - messageRect.height()) // 2)
 
 	def _clearImageItems(self):
+		self._cancelSmoothRescale()
 		if not self._imageItems:
 			return
 		for imageItem in self._imageItems:
@@ -96,64 +286,104 @@ class BookDisplayView(QtWidgets.QGraphicsView):
 		self._scaledImagesWidth = 0
 		self._scaledImagesHeight = 0
 
-	def setImages(self, *images: QtGui.QImage):
+	def setImages(self, *images: QtGui.QImage, imageSizes: List[QtCore.QSize] = None, shouldResetScroll: bool = True, spreadIndexes: Sequence[int] = None):
 		"""
 		Display the image(s) to the user
 		:param images: One or more images to show
+		:param imageSizes: The sizes the images should be displayed as, before zooming. Used to show previews and placeholders at the size of the full image. If not provided, the actual sizes of the images are used
+		:param shouldResetScroll: Whether to scroll back to the top left, or keep the current scroll position
+		:param spreadIndexes: The image indexes of the provided images. If these were prepared with 'prepareSpread', the prepared images are swapped in instead of drawing them again.
+			The displayed images will also be kept around as a prepared spread when other images get shown. Should be None for previews and placeholders
 		"""
+		if spreadIndexes is not None:
+			spreadIndexes = tuple(spreadIndexes)
+			preparedSpread = self._preparedSpreads.pop(spreadIndexes, None)
+			if preparedSpread is not None:
+				if preparedSpread.geometryKey == self._getGeometryKey():
+					self._showPreparedSpread(spreadIndexes, preparedSpread, shouldResetScroll)
+					return
+				# The prepared spread is outdated, so it's of no use anymore
+				for imageItem in preparedSpread.imageItems:
+					self._imageScene.removeItem(imageItem)
+			if spreadIndexes != self._displayedSpreadIndexes:
+				self._stashDisplayedSpread()
+		self._displayedSpreadIndexes = spreadIndexes
 		self._baseImages = images
-		self._baseImagesWidth, self._baseImagesHeight = ImageUtils.calculateWidthAndHeight(self._baseImages, False)
-		self._drawImages()
+		self._baseImageSizes = imageSizes if imageSizes else [image.size() for image in images]
+		self._baseImagesWidth, self._baseImagesHeight = ImageUtils.calculateWidthAndHeight(self._baseImageSizes, False)
+		self._drawImages(shouldResetScroll)
 
-	def _drawImages(self):
+	def _drawImages(self, shouldResetScroll: bool = True):
 		self._clearImageItems()
+		self.clearMessage()
 		if not self._baseImages:
 			logging.warning(f"Asked to draw images, but none are loaded")
 			return
 		startTime = time.perf_counter()
+		if not shouldResetScroll:
+			horizontalScrollValue = self.horizontalScrollBar().value()
+			verticalScrollValue = self.verticalScrollBar().value()
 		# Make the images the wanted size
-		scaledImages = self._scaleImages(self._baseImages)
+		scaledImages = self._scaleImages(self._baseImages, self._baseImageSizes)
+		self._renderedImageScale = self.imageScale
 		# Store some values we need for dragging and scrolling
-		self._scaledImagesWidth, self._scaledImagesHeight = ImageUtils.calculateWidthAndHeight(scaledImages)
+		self._scaledImagesWidth, self._scaledImagesHeight = ImageUtils.calculateWidthAndHeight(self._getScaledSizes(self._baseImageSizes, self.imageScale))
 		self._setSceneSize()
 		# Actually load the images into the scene
 		self._imageItems = []
-		for image in scaledImages:
-			self._imageItems.append(self._imageScene.addPixmap(QtGui.QPixmap(image)))
+		for image, imageSize, scaledImage in zip(self._baseImages, self._baseImageSizes, scaledImages):
+			self._imageItems.append(self._createImageItem(image, imageSize, scaledImage, self.imageScale))
 		# Position the images properly
 		self._positionImages()
-		# Reset the scroll position
-		self._resetScrollPosition()
+		# Reset the scroll position, or restore it if the scroll position should be kept
+		if shouldResetScroll:
+			self._resetScrollPosition()
+		else:
+			self.horizontalScrollBar().setValue(horizontalScrollValue)
+			self.verticalScrollBar().setValue(verticalScrollValue)
 		# Show a hand icon if the image can be dragged, and no special icon if it can't
 		self._setHandIconOnMouseOver()
 		# Claim focus, so the image can be moved with the arrow keys
 		self.setFocus()
+		self._displayedGeometryKey = self._getGeometryKey()
+		self._updateMagnifier()
 		logging.debug(f"Displaying image took {time.perf_counter() - startTime:.4f} seconds")
 
-	def _scaleImages(self, images: List[QtGui.QImage]) -> List[QtGui.QImage]:
+	def _scaleImages(self, images: List[QtGui.QImage], imageSizes: List[QtCore.QSize]) -> List[QtGui.QImage]:
+		"""
+		Scale the image according to the zoom settings, and store the used scale
+		While scaling the image item instead of the image is faster, scaling the image leads to better-looking results
+		:param images: The images to scale
+		:param imageSizes: The sizes to base the scaling on. Previews and placeholders are scaled to the size of the full image
+		:return: The scaled images. Images that are too large to show as a single image item aren't scaled, and are None in the returned list
 		"""
-		Scale the image according to the zoom settings
-		While scaling the QGraphicsPixmapItem instead of the QPixmap is faster, scaling the QPixmap leads to better-looking results
-		:param image: The pixmap to scale
-		:return: The scaled pixmap
+		self.imageScale = self._calculateImageScale(imageSizes)
+		return self._scaleImagesBy(images, imageSizes, self.imageScale)
+
+	def _calculateImageScale(self, imageSizes: List[QtCore.QSize]) -> float:
+		"""
+		Calculate by which factor images of the provided sizes should be scaled to match the current zoom type and view size
+		:param imageSizes: The sizes of the images that are shown together
+		:return: The scale factor
 		"""
 		# FIXME Handle differently-sized images
-		startTime = time.perf_counter()
 		# Calculate some values for sizing
-		totalWidth, highestHeight = ImageUtils.calculateWidthAndHeight(images, False)
+		totalWidth, highestHeight = ImageUtils.calculateWidthAndHeight(imageSizes, False)
 		# The image gap won't be scaled, but it does need to be taken into account when calculating the scaling, so calculate how much drawing room we have left
-		if len(images) > 1:
-			imageGap = SettingsStore.getSettingValue(SettingsEnum.GAP_BETWEEN_PAGES)
-			canvasWidthAfterImageGaps = self.width() - imageGap * (len(images) - 1)
+		if len(imageSizes) > 1:
+			imageGap = SettingsStore.getSettings().GAP_BETWEEN_PAGES
+			canvasWidthAfterImageGaps = self.width() - imageGap * (len(imageSizes) - 1)
 		else:
 			canvasWidthAfterImageGaps = self.width()
 		# Determine image scale based on zoom type
+		# No special handling needed for ZoomEnum.CUSTOM, because that already sets the image scale
+		imageScale = self.imageScale
 		if self.currentZoomType == ZoomEnum.ORIGINAL_SIZE:
-			self.imageScale = 1
+			imageScale = 1
 		elif self.currentZoomType == ZoomEnum.FIT_VERTICAL:
-			self.imageScale = min(1.0, self.height() / highestHeight)
+			imageScale = min(1.0, self.height() / highestHeight)
 		elif self.currentZoomType == ZoomEnum.FIT_HORIZONTAL:
-			self.imageScale = min(1, canvasWidthAfterImageGaps / totalWidth)
+			imageScale = min(1, canvasWidthAfterImageGaps / totalWidth)
 		elif self.currentZoomType == ZoomEnum.FIT_SCREEN:
 			widthScale = 1
 			heightScale = 1
@@ -161,20 +391,51 @@ class BookDisplayView(QtWidgets.QGraphicsView):
 				widthScale = canvasWidthAfterImageGaps / totalWidth
 			if highestHeight > self.height():
 				heightScale = self.height() / highestHeight
-			self.imageScale = min(widthScale, heightScale)
-		# No special handling needed for ZoomEnum.CUSTOM, because that already sets the image scale
-		if self.imageScale == 1:
-			# No need to resize if scale is 1
-			scaledImages = images
-		else:
-			scaledImages = []
-			for image in images:
-				scaledImages.append(image.scaled(image.width() * self.imageScale, image.height() * self.imageScale, mode=QtCore.Qt.TransformationMode.SmoothTransformation))
-		logging.debug(f"Scaling {len(scaledImages)} images by {self.imageScale:.2f}x based on canvas size {self.width()};{self.height()} "
-			f"({canvasWidthAfterImageGaps} after subtracting image gap), and images width {totalWidth} and height {highestHeight} "
-			f"took {time.perf_counter() - startTime:.4f} seconds")
+			imageScale = min(widthScale, heightScale)
+		logging.debug(f"Calculated image scale {imageScale:.2f}x based on canvas size {self.width()};{self.height()} "
+			f"({canvasWidthAfterImageGaps} after subtracting image gap), and images width {totalWidth} and height {highestHeight}")
+		return imageScale
+
+	def _scaleImagesBy(self, images: List[QtGui.QImage], imageSizes: List[QtCore.QSize], imageScale: float) -> List[QtGui.QImage]:
+		startTime = time.perf_counter()
+		scaledImages = []
+		for image, imageSize in zip(images, imageSizes):
+			scaledWidth = int(imageSize.width() * imageScale)
+			scaledHeight = int(imageSize.height() * imageScale)
+			if TiledImageItem.shouldTileImage(imageSize, imageScale):
+				# Huge images get drawn in tiles, and those tiles get scaled when they're drawn, so there's no need to scale the whole image
+				scaledImages.append(None)
+			elif image.width() == scaledWidth and image.height() == scaledHeight:
+				# No need to resize if the image is already the right size
+				scaledImages.append(image)
+			else:
+				scaledImages.append(ImageUtils.scaleImageSmoothly(image, scaledWidth, scaledHeight))
+		logging.debug(f"Scaling {len(scaledImages)} images by {imageScale:.2f}x took {time.perf_counter() - startTime:.4f} seconds")
 		return scaledImages
 
+	@staticmethod
+	def _getScaledSizes(imageSizes: Sequence[QtCore.QSize], imageScale: float) -> List[QtCore.QSize]:
+		return [QtCore.QSize(int(imageSize.width() * imageScale), int(imageSize.height() * imageScale)) for imageSize in imageSizes]
+
+	def _createImageItem(self, image: QtGui.QImage, imageSize: QtCore.QSize, scaledImage: QtGui.QImage or None, imageScale: float) -> QtWidgets.QGraphicsItem:
+		"""
+		Create an image item and add it to the scene
+		:param image: The base image
+		:param imageSize: The size the base image should be displayed as before zooming
+		:param scaledImage: The base image scaled to the displayed size, or None if the image is too large for that and should be drawn in tiles
+		:param imageScale: The scale the image is displayed at
+		:return: The created image item
+		"""
+		if scaledImage is None:
+			imageItem = TiledImageItem.TiledImageItem(image, imageSize)
+			imageItem.setScale(imageScale)
+			self._imageScene.addItem(imageItem)
+			return imageItem
+		# Draw the scaled image directly instead of converting it to a QPixmap, since that would be another full copy on the UI thread
+		imageItem = ImageItem(scaledImage)
+		self._imageScene.addItem(imageItem)
+		return imageItem
+
 	def _setSceneSize(self):
 		"""Set the scene size so it isn't larger than the image or the view. This is needed because by default the scene only grows and doesn't shrink"""
 		oldWidth = self._imageScene.width()
@@ -183,18 +444,104 @@ class BookDisplayView(QtWidgets.QGraphicsView):
 		height = max(self.height(), self._scaledImagesHeight)
 		self.setSceneRect(0, 0, width, height)
 
-	def _positionImages(self):
+	def _positionImages(self, imageItems: List[QtWidgets.QGraphicsItem] = None, scaledImagesWidth: int = None):
+		"""
+		Position the image items in the scene
+		:param imageItems: The image items to position. If not provided, the currently displayed image items are positioned
+		:param scaledImagesWidth: The total width of the provided image items, including the image gap. Should be provided if the image items are provided
+		"""
+		if imageItems is None:
+			imageItems = self._imageItems
+			scaledImagesWidth = self._scaledImagesWidth
 		# Add the images to the top middle of our canvas
-		if self._scaledImagesWidth < self.width():
+		if scaledImagesWidth < self.width():
 			# If the images are less wide than the canvas, make sure they're placed in the middle
-			x = self.width() // 2 - self._scaledImagesWidth // 2
+			x = self.width() // 2 - scaledImagesWidth // 2
 		else:
 			# If the image is wider than the canvas, place the top-left corner of the image in the top-left of the canvas
 			x = 0
-		imageGap = SettingsStore.getSettingValue(SettingsEnum.GAP_BETWEEN_PAGES)
-		for imageItem in self._imageItems:
+		imageGap = SettingsStore.getSettings().GAP_BETWEEN_PAGES
+		for imageItem in imageItems:
 			imageItem.setX(x)
-			x += imageItem.boundingRect().width() + imageGap
+			# Take the item scale into account, since that's used while resizing or zooming
+			x += imageItem.boundingRect().width() * imageItem.scale() + imageGap
+
+	def _rescaleImagesQuickly(self, shouldResetScroll: bool):
+		"""
+		Rescale the displayed images by changing the scale of their image items, which is nearly instant but doesn't look as good as scaling the images themselves.
+		A smooth high-quality rescale is scheduled for when the view size and zoom haven't changed for a bit
+		:param shouldResetScroll: Whether to scroll back to the top left, or keep the current scroll position
+		"""
+		if not self._imageItems or not self._baseImages:
+			return
+		self.imageScale = self._calculateImageScale(self._baseImageSizes)
+		# The images are now displayed at a different size than they were rendered at, so they can't be stashed or reused until they're rendered properly again
+		self._displayedGeometryKey = None
+		itemScale = self.imageScale / self._renderedImageScale if self._renderedImageScale else 1
+		for imageItem in self._imageItems:
+			if isinstance(imageItem, TiledImageItem.TiledImageItem):
+				# Tiled items are always the size of the base image, and pick the right pyramid level themselves
+				imageItem.setScale(self.imageScale)
+			else:
+				imageItem.setTransformationMode(QtCore.Qt.TransformationMode.FastTransformation)
+				imageItem.setScale(itemScale)
+		self._scaledImagesWidth, self._scaledImagesHeight = ImageUtils.calculateWidthAndHeight(self._getScaledSizes(self._baseImageSizes, self.imageScale))
+		self._setSceneSize()
+		self._positionImages()
+		if shouldResetScroll:
+			self._resetScrollPosition()
+		self._setHandIconOnMouseOver()
+		# (Re)start the timer, so the smooth rescale only happens once resizing or zooming stops
+		self._rescaleGeneration += 1
+		self._smoothRescaleTimer.start()
+
+	def _cancelSmoothRescale(self):
+		self._rescaleGeneration += 1
+		if self._smoothRescaleTimer is not None:
+			self._smoothRescaleTimer.stop()
+
+	def _startSmoothRescale(self):
+		if not self._imageItems or not self._baseImages:
+			return
+		# Scaling QImages is safe outside the UI thread, so do the slow high-quality scaling in the background
+		rescaleGeneration = self._rescaleGeneration
+		baseImages = list(self._baseImages)
+		baseImageSizes = list(self._baseImageSizes)
+		imageScale = self.imageScale
+		def scaleImages():
+			try:
+				scaledImages = self._scaleImagesBy(baseImages, baseImageSizes, imageScale)
+			except Exception as e:
+				logging.exception(f"{type(e)} exception while smoothly rescaling images: {e}")
+				return
+			self._smoothImagesScaled.emit(rescaleGeneration, scaledImages)
+		self._rescaleExecutor.submit(scaleImages)
+
+	def _onSmoothImagesScaled(self, rescaleGeneration: int, scaledImages: List[QtGui.QImage or None]):
+		if rescaleGeneration != self._rescaleGeneration or not self._imageItems or len(scaledImages) != len(self._imageItems):
+			# The displayed images or their scale changed while we were scaling, so these scaled images are outdated
+			return
+		startTime = time.perf_counter()
+		for itemIndex, scaledImage in enumerate(scaledImages):
+			imageItem = self._imageItems[itemIndex]
+			if scaledImage is None and isinstance(imageItem, TiledImageItem.TiledImageItem):
+				# Tiled items already got their new scale when resizing or zooming
+				continue
+			elif scaledImage is not None and isinstance(imageItem, ImageItem):
+				imageItem.setImage(scaledImage)
+				imageItem.setScale(1)
+				imageItem.setTransformationMode(QtCore.Qt.TransformationMode.FastTransformation)
+			else:
+				# The image crossed the size limit for tiling, so it needs a different kind of image item
+				self._imageScene.removeItem(imageItem)
+				self._imageItems[itemIndex] = self._createImageItem(self._baseImages[itemIndex], self._baseImageSizes[itemIndex], scaledImage, self.imageScale)
+		self._renderedImageScale = self.imageScale
+		self._scaledImagesWidth, self._scaledImagesHeight = ImageUtils.calculateWidthAndHeight(self._getScaledSizes(self._baseImageSizes, self.imageScale))
+		self._setSceneSize()
+		self._positionImages()
+		self._setHandIconOnMouseOver()
+		self._displayedGeometryKey = self._getGeometryKey()
+		logging.debug(f"Swapping in smoothly rescaled images took {time.perf_counter() - startTime:.4f} seconds")
 
 	def _resetScrollPosition(self):
 		self.verticalScrollBar().setValue(0)
@@ -215,9 +562,80 @@ class BookDisplayView(QtWidgets.QGraphicsView):
 		self.setDragMode(self.DragMode.ScrollHandDrag if shouldShowHandIcon else self.DragMode.NoDrag)
 
 	def resizeEvent(self, event: QtGui.QResizeEvent):
-		if self._imageItems:
-			self._setSceneSize()
-			self._drawImages()
+		# The prepared spreads were laid out for the old size, so they're of no use anymore
+		self.clearPreparedSpreads()
+		if self._messageItem is not None:
+			self._positionMessage()
+		if self._continuousPageStrip is not None:
+			self._continuousPageStrip.layOutPages()
+		elif self._imageItems:
+			self._rescaleImagesQuickly(shouldResetScroll=True)
+
+	def setMagnifierEnabled(self, setEnabled: bool or None = None):
+		"""
+		Set whether a magnifier loupe follows the mouse cursor, showing the page under it enlarged
+		:param setEnabled: The magnifier will be enabled if True, disabled if False, and toggled if this is None or left empty
+		"""
+		self.isMagnifierEnabled = not self.isMagnifierEnabled if setEnabled is None else setEnabled
+		if self.isMagnifierEnabled:
+			if self._magnifierLoupe is None:
+				self._magnifierLoupe = MagnifierLoupe(self.viewport())
+			# We need to know where the mouse is even when no button is pressed
+			self.viewport().setMouseTracking(True)
+			self._updateMagnifier()
+		elif self._magnifierLoupe is not None:
+			self._magnifierLoupe.clear()
+
+	def _updateMagnifier(self, cursorPosition: QtCore.QPoint = None):
+		"""
+		Show the part of the page under the cursor in the magnifier loupe
+		:param cursorPosition: Where the mouse cursor is, in viewport coordinates. If not provided, the current cursor position is used
+		"""
+		if not self.isMagnifierEnabled or self._magnifierLoupe is None:
+			return
+		if cursorPosition is None:
+			cursorPosition = self.viewport().mapFromGlobal(QtGui.QCursor.pos())
+		imageAtCursor = self._getImageAt(cursorPosition) if self.viewport().rect().contains(cursorPosition) else None
+		if imageAtCursor is None:
+			self._magnifierLoupe.clear()
+		else:
+			self._magnifierLoupe.showRegion(cursorPosition, *imageAtCursor)
+
+	def _getImageAt(self, viewportPosition: QtCore.QPoint) -> Optional[Tuple[QtGui.QImage, QtCore.QPointF, float]]:
+		"""
+		Find the image under the provided position. This uses the base images instead of the displayed scaled images, so it has the full resolution
+		:param viewportPosition: The position to check, in viewport coordinates
+		:return: None if there's no image at the position. Otherwise a tuple with the image, the position in image pixels, and how many screen pixels one image pixel is displayed as
+		"""
+		if self._continuousPageStrip is not None:
+			itemsAndImages = self._continuousPageStrip.getPageItemsAndImages()
+		elif self._imageItems and self._baseImages:
+			itemsAndImages = zip(self._imageItems, self._baseImages)
+		else:
+			return None
+		scenePosition = self.mapToScene(viewportPosition)
+		for imageItem, image in itemsAndImages:
+			itemPosition = imageItem.mapFromScene(scenePosition)
+			itemRect = imageItem.boundingRect()
+			if itemRect.contains(itemPosition) and itemRect.width() > 0 and itemRect.height() > 0:
+				# The item can show a preview at the size of the full image, so convert from item coordinates to image pixels
+				imagePoint = QtCore.QPointF(itemPosition.x() * image.width() / itemRect.width(), itemPosition.y() * image.height() / itemRect.height())
+				return image, imagePoint, imageItem.sceneBoundingRect().width() / image.width()
+		return None
+
+	def mouseMoveEvent(self, event: QtGui.QMouseEvent):
+		super().mouseMoveEvent(event)
+		self._updateMagnifier(event.position().toPoint())
+
+	def leaveEvent(self, event: QtCore.QEvent):
+		super().leaveEvent(event)
+		if self._magnifierLoupe is not None:
+			self._magnifierLoupe.clear()
+
+	def scrollContentsBy(self, dx: int, dy: int):
+		super().scrollContentsBy(dx, dy)
+		# The page moved under the cursor, so the loupe should show a different part of it
+		self._updateMagnifier()
 
 	def eventFilter(self, source: QtCore.QObject, event: QtCore.QEvent):
 		if event.type() == QtCore.QEvent.ContextMenu:
@@ -234,7 +652,10 @@ class BookDisplayView(QtWidgets.QGraphicsView):
 		"""
 		if zoomType != self.currentZoomType:
 			self.currentZoomType = zoomType
-			self._drawImages()
+			if self._continuousPageStrip is not None:
+				self._continuousPageStrip.layOutPages()
+			else:
+				self._rescaleImagesQuickly(shouldResetScroll=True)
 
 	def zoomIn(self):
 		self._zoom(_ZOOM_STEPS)
@@ -245,4 +666,7 @@ class BookDisplayView(QtWidgets.QGraphicsView):
 	def _zoom(self, zoomStepChange):
 		self.currentZoomType = ZoomEnum.CUSTOM
 		self.imageScale += zoomStepChange
-		self._drawImages()
+		if self._continuousPageStrip is not None:
+			self._continuousPageStrip.layOutPages()
+		else:
+			self._rescaleImagesQuickly(shouldResetScroll=True)
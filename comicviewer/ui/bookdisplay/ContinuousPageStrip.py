@@ -0,0 +1,289 @@
+import bisect, logging, time
+from typing import TYPE_CHECKING, Dict, List, Set, Tuple
+
+from PySide6 import QtCore, QtGui, QtWidgets
+
+from comicviewer.ui.ZoomEnum import ZoomEnum
+from comicviewer.ui.bookdisplay import TiledImageItem
+from comicviewer.ui.bookdisplay.ImageItem import ImageItem
+
+if TYPE_CHECKING:
+	from comicviewer.images.ImageCacheHandler import ImageCacheHandler
+	from comicviewer.ui.bookdisplay.BookDisplayView import BookDisplayView
+
+_MATERIALIZE_MARGIN = 1.0  # How many view heights above and below the visible area have their pages drawn, so they're ready before they scroll into view
+_PREFETCH_SECONDS = 1.5  # Pages that will scroll into view within this many seconds at the current scroll speed get loaded in advance
+_MAX_PREFETCH_VIEW_HEIGHTS = 20  # Limit how far ahead is prefetched, so flinging the scrollbar doesn't load half the book
+_VELOCITY_SMOOTHING = 0.3  # How much a new scroll speed measurement counts towards the scroll speed, so a single jerky scroll doesn't cause a burst of loading
+_MAX_RECYCLED_ITEMS = 8  # How many hidden image items are kept for reuse. That covers the pages that scroll out of range at once, keeping more would only keep unused items in the scene
+
+
+class ContinuousPageStrip(QtCore.QObject):
+	"""
+	Shows all the pages of a book below each other in a view, so they can be scrolled through continuously, like a webtoon.
+	The layout is calculated from the page sizes, but only the pages in and near the visible area get an image item. Items of pages that scroll out of range get reused
+	"""
+	currentPageChanged = QtCore.Signal(int)  # Emitted with the index of the page at the top of the view when that changes
+
+	def __init__(self, view: 'BookDisplayView', imageCacheHandler: 'ImageCacheHandler', pageCount: int):
+		"""
+		Create a continuous page strip. Nothing is shown until 'layOutPages' is called
+		:param view: The view to show the pages in. The strip adds its items to the scene of this view
+		:param imageCacheHandler: The image cache of the book to show
+		:param pageCount: How many pages the book has
+		"""
+		super().__init__()
+		self._view = view
+		self._scene: QtWidgets.QGraphicsScene = view.scene()
+		self._imageCacheHandler = imageCacheHandler
+		self._pageCount = pageCount
+		self._pageOffsets: List[int] = []  # The top y coordinate of each page
+		self._pageSizes: List[QtCore.QSize] = []  # The displayed size of each page
+		self._isPageSizeKnown: List[bool] = []  # Whether each page size is its actual size, or estimated because the page hasn't been looked at yet
+		self._pageItems: Dict[int, QtWidgets.QGraphicsItem] = {}  # The image items of the pages in and near the visible area, keyed by their page index
+		self._pageImages: Dict[int, QtGui.QImage] = {}  # The images shown by the page items, keyed by their page index
+		self._fullPageIndexes = set()  # The pages whose image item shows the full image, instead of a preview or placeholder
+		self._recycledItems: List[ImageItem] = []  # Hidden image items that can be reused for pages that scroll into range
+		self._currentPageIndex = -1
+		self._lastScrollValue = 0
+		self._lastScrollTime = time.perf_counter()
+		self._scrollVelocity: float = 0  # In pixels per second. Positive when scrolling down
+		self._pageIndexesWithNewSizes: Set[int] = set()  # Pages whose actual size became known, but that haven't been moved to that size yet
+		# Sizes often become known for several pages at once, for instance when a batch of pages gets cached, so apply them together once the UI thread is free
+		self._pageSizeUpdateTimer = QtCore.QTimer(self)
+		self._pageSizeUpdateTimer.setSingleShot(True)
+		self._pageSizeUpdateTimer.setInterval(0)
+		self._pageSizeUpdateTimer.timeout.connect(self._applyNewPageSizes)
+		self._view.verticalScrollBar().valueChanged.connect(self._onScroll)
+
+	def clear(self):
+		"""Remove all the page items from the scene. The strip can't be used after this"""
+		self._view.verticalScrollBar().valueChanged.disconnect(self._onScroll)
+		self._pageSizeUpdateTimer.stop()
+		for pageItem in list(self._pageItems.values()) + self._recycledItems:
+			self._scene.removeItem(pageItem)
+		self._pageItems.clear()
+		self._pageImages.clear()
+		self._recycledItems.clear()
+
+	def getCurrentPageIndex(self) -> int:
+		""":return: The index of the page at the top of the view"""
+		return self._currentPageIndex
+
+	def getPageItemsAndImages(self) -> List[Tuple[QtWidgets.QGraphicsItem, QtGui.QImage]]:
+		""":return: The image items of the pages that are drawn, each with the image it shows"""
+		return [(pageItem, self._pageImages[pageIndex]) for pageIndex, pageItem in self._pageItems.items()]
+
+	def layOutPages(self):
+		"""(Re)calculate where all the pages go, for instance because the view size or zoom changed. Keeps the current page at the same spot in the view"""
+		startTime = time.perf_counter()
+		anchorIndex, anchorFraction = self._getScrollAnchor()
+		# All the sizes get recalculated, so there's no need to apply new sizes separately anymore
+		self._pageSizeUpdateTimer.stop()
+		self._pageIndexesWithNewSizes.clear()
+		# Pages we don't know the size of yet are assumed to be the size of the last known page. Most long-strip books have uniformly sized pages, so this is usually right
+		lastKnownSize = QtCore.QSize(800, 1200)
+		imageSizes = []
+		self._isPageSizeKnown = []
+		for pageIndex in range(self._pageCount):
+			imageSize = self._imageCacheHandler.getKnownImageSize(pageIndex)
+			self._isPageSizeKnown.append(imageSize is not None)
+			if imageSize is None:
+				imageSize = lastKnownSize
+			else:
+				lastKnownSize = imageSize
+			imageSizes.append(imageSize)
+		self._pageSizes = []
+		self._pageOffsets = []
+		y = 0
+		for imageSize in imageSizes:
+			self._pageOffsets.append(y)
+			pageSize = self._getPageSize(imageSize)
+			self._pageSizes.append(pageSize)
+			y += pageSize.height()
+		if self._view.currentZoomType != ZoomEnum.CUSTOM and imageSizes:
+			# Store the scale of the current page in the view, so the zoom level display is right, and zooming in and out starts from the current scale
+			self._view.imageScale = self._getPageScale(imageSizes[max(0, min(anchorIndex, self._pageCount - 1))])
+		widestPageWidth = max((pageSize.width() for pageSize in self._pageSizes), default=0)
+		self._view.setSceneRect(0, 0, max(self._view.width(), widestPageWidth), max(self._view.height(), y))
+		# The existing items have the wrong size and position now, so draw them again
+		for pageIndex in list(self._pageItems.keys()):
+			self._recyclePageItem(pageIndex)
+		self._scrollToAnchor(anchorIndex, anchorFraction)
+		self._updatePageItems()
+		logging.debug(f"Laying out {self._pageCount} pages continuously took {time.perf_counter() - startTime:.4f} seconds")
+
+	def scrollToPage(self, pageIndex: int):
+		"""
+		Scroll so the top of the provided page is at the top of the view
+		:param pageIndex: The index of the page to scroll to
+		"""
+		if not self._pageOffsets:
+			self.layOutPages()
+		pageIndex = max(0, min(pageIndex, self._pageCount - 1))
+		self._jumpToScrollValue(self._pageOffsets[pageIndex])
+		# Setting the same scroll value doesn't trigger a scroll update, so update explicitly
+		self._updatePageItems()
+
+	def onImageLoaded(self, pageIndex: int):
+		"""
+		Should be called when an image finished loading, so a preview or placeholder can be replaced, and the page can get its actual size
+		:param pageIndex: The index of the page that finished loading
+		"""
+		if not self._pageOffsets or pageIndex >= self._pageCount:
+			return
+		if not self._isPageSizeKnown[pageIndex] and self._imageCacheHandler.getKnownImageSize(pageIndex) is not None:
+			# Our guess for the size of this page may be wrong, which moves everything after it. '_applyNewPageSizes' redraws this page if it's in range
+			self._pageIndexesWithNewSizes.add(pageIndex)
+			self._pageSizeUpdateTimer.start()
+		elif pageIndex in self._pageItems and pageIndex not in self._fullPageIndexes:
+			self._recyclePageItem(pageIndex)
+			self._updatePageItems()
+
+	def _applyNewPageSizes(self):
+		"""Give the pages whose actual size became known that size, and move the pages after them along. Keeps the current page at the same spot in the view"""
+		if not self._pageIndexesWithNewSizes or not self._pageOffsets:
+			return
+		startTime = time.perf_counter()
+		anchorIndex, anchorFraction = self._getScrollAnchor()
+		pageIndexesWithNewSizes = sorted(self._pageIndexesWithNewSizes)
+		self._pageIndexesWithNewSizes.clear()
+		# Go through the pages after the first changed page once, moving each page down by how much the changed pages above it grew
+		offsetChange = 0
+		nextChangedPosition = 0
+		for pageIndex in range(pageIndexesWithNewSizes[0], self._pageCount):
+			self._pageOffsets[pageIndex] += offsetChange
+			if nextChangedPosition < len(pageIndexesWithNewSizes) and pageIndexesWithNewSizes[nextChangedPosition] == pageIndex:
+				nextChangedPosition += 1
+				pageSize = self._getPageSize(self._imageCacheHandler.getKnownImageSize(pageIndex))
+				offsetChange += pageSize.height() - self._pageSizes[pageIndex].height()
+				self._pageSizes[pageIndex] = pageSize
+				self._isPageSizeKnown[pageIndex] = True
+				if pageIndex in self._pageItems:
+					# The item has the wrong scale now, so draw it again
+					self._recyclePageItem(pageIndex)
+		if self._view.currentZoomType != ZoomEnum.CUSTOM and anchorIndex in pageIndexesWithNewSizes:
+			self._view.imageScale = self._getPageScale(self._imageCacheHandler.getKnownImageSize(anchorIndex))
+		sceneRect = self._view.sceneRect()
+		widestPageWidth = max(max(self._pageSizes[pageIndex].width() for pageIndex in pageIndexesWithNewSizes), int(sceneRect.width()))
+		self._view.setSceneRect(0, 0, max(self._view.width(), widestPageWidth), max(self._view.height(), self._pageOffsets[-1] + self._pageSizes[-1].height()))
+		# The pages are centered horizontally, so the remaining items may have to move sideways too if the scene got wider
+		for pageIndex, pageItem in self._pageItems.items():
+			pageItem.setPos((self._view.sceneRect().width() - self._pageSizes[pageIndex].width()) // 2, self._pageOffsets[pageIndex])
+		self._scrollToAnchor(anchorIndex, anchorFraction)
+		self._updatePageItems()
+		logging.debug(f"Applying the new sizes of {len(pageIndexesWithNewSizes)} pages took {time.perf_counter() - startTime:.4f} seconds")
+
+	def _getPageSize(self, imageSize: QtCore.QSize) -> QtCore.QSize:
+		""":return: The size the page with the provided image size is displayed at"""
+		pageScale = self._getPageScale(imageSize)
+		return QtCore.QSize(max(1, int(imageSize.width() * pageScale)), max(1, int(imageSize.height() * pageScale)))
+
+	def _getPageScale(self, imageSize: QtCore.QSize) -> float:
+		zoomType = self._view.currentZoomType
+		if zoomType == ZoomEnum.ORIGINAL_SIZE:
+			return 1
+		elif zoomType == ZoomEnum.CUSTOM:
+			return self._view.imageScale
+		# Fitting vertically would make a long strip unreadably small, so every other zoom type fits the page width, without enlarging it
+		return min(1.0, self._view.width() / imageSize.width())
+
+	def _getPageIndexAt(self, y: float) -> int:
+		return max(0, min(bisect.bisect_right(self._pageOffsets, y) - 1, self._pageCount - 1))
+
+	def _getScrollAnchor(self):
+		""":return: The index of the page at the top of the view, and how far down that page the view top is, as a fraction of the page height"""
+		if not self._pageOffsets or self._currentPageIndex < 0:
+			return max(0, self._currentPageIndex), 0
+		pageIndex = self._currentPageIndex
+		return pageIndex, (self._view.verticalScrollBar().value() - self._pageOffsets[pageIndex]) / self._pageSizes[pageIndex].height()
+
+	def _scrollToAnchor(self, pageIndex: int, fraction: float):
+		pageIndex = max(0, min(pageIndex, self._pageCount - 1))
+		self._jumpToScrollValue(int(self._pageOffsets[pageIndex] + fraction * self._pageSizes[pageIndex].height()))
+
+	def _jumpToScrollValue(self, scrollValue: int):
+		# Jumps aren't scrolling by the user, so they shouldn't count towards the scroll speed
+		self._lastScrollValue = scrollValue
+		self._scrollVelocity = 0
+		self._view.verticalScrollBar().setValue(scrollValue)
+
+	def _onScroll(self, scrollValue: int):
+		now = time.perf_counter()
+		timeDelta = now - self._lastScrollTime
+		if timeDelta > 0.5:
+			# The user stopped scrolling for a while, so the previous speed doesn't say anything anymore
+			self._scrollVelocity = 0
+		elif timeDelta > 0:
+			self._scrollVelocity += _VELOCITY_SMOOTHING * ((scrollValue - self._lastScrollValue) / timeDelta - self._scrollVelocity)
+		self._lastScrollValue = scrollValue
+		self._lastScrollTime = now
+		self._updatePageItems()
+
+	def _updatePageItems(self):
+		"""Make sure the pages in and near the view have an image item, recycle the items of pages that went out of range, and cache the pages that will come into view soon"""
+		if not self._pageOffsets:
+			return
+		viewTop = self._view.verticalScrollBar().value()
+		viewHeight = self._view.height()
+		margin = viewHeight * _MATERIALIZE_MARGIN
+		firstPageIndex = self._getPageIndexAt(viewTop - margin)
+		lastPageIndex = self._getPageIndexAt(viewTop + viewHeight + margin)
+		for pageIndex in list(self._pageItems.keys()):
+			if pageIndex < firstPageIndex or pageIndex > lastPageIndex:
+				self._recyclePageItem(pageIndex)
+		pageIndexesToDraw = [pageIndex for pageIndex in range(firstPageIndex, lastPageIndex + 1) if pageIndex not in self._pageItems]
+		if pageIndexesToDraw:
+			images, _ = self._imageCacheHandler.retrieveImages(*pageIndexesToDraw, shouldUpdateCache=False)
+			for pageIndex, image in zip(pageIndexesToDraw, images):
+				self._createPageItem(pageIndex, image)
+		# Cache the pages in range, and the pages that'll scroll into view soon at the current speed
+		prefetchDistance = min(abs(self._scrollVelocity) * _PREFETCH_SECONDS, viewHeight * _MAX_PREFETCH_VIEW_HEIGHTS)
+		if self._scrollVelocity > 0:
+			lastPageIndex = self._getPageIndexAt(viewTop + viewHeight + margin + prefetchDistance)
+		elif self._scrollVelocity < 0:
+			firstPageIndex = self._getPageIndexAt(viewTop - margin - prefetchDistance)
+		self._imageCacheHandler.updateCacheInBackground(firstPageIndex, lastPageIndex)
+		# Report which page we're on
+		currentPageIndex = self._getPageIndexAt(viewTop)
+		if currentPageIndex != self._currentPageIndex:
+			self._currentPageIndex = currentPageIndex
+			self.currentPageChanged.emit(currentPageIndex)
+
+	def _createPageItem(self, pageIndex: int, image: QtGui.QImage):
+		pageSize = self._pageSizes[pageIndex]
+		# Previews and placeholders are smaller than the page, and placeholders don't even have the right aspect ratio, so scale both directions separately
+		horizontalScale = pageSize.width() / image.width()
+		verticalScale = pageSize.height() / image.height()
+		imageSize = self._imageCacheHandler.getKnownImageSize(pageIndex)
+		if imageSize is not None and image.size() == imageSize:
+			self._fullPageIndexes.add(pageIndex)
+		if TiledImageItem.shouldTileImage(image.size(), max(horizontalScale, verticalScale)):
+			pageItem = TiledImageItem.TiledImageItem(image)
+			self._scene.addItem(pageItem)
+		else:
+			if self._recycledItems:
+				pageItem = self._recycledItems.pop()
+				pageItem.setImage(image)
+				pageItem.setVisible(True)
+			else:
+				pageItem = ImageItem(image)
+				self._scene.addItem(pageItem)
+			# Let the item scale the image when it's drawn, which is quick, and means only the visible part gets scaled
+			pageItem.setTransformationMode(QtCore.Qt.TransformationMode.SmoothTransformation)
+		pageItem.setTransform(QtGui.QTransform.fromScale(horizontalScale, verticalScale))
+		pageItem.setPos((self._view.sceneRect().width() - pageSize.width()) // 2, self._pageOffsets[pageIndex])
+		self._pageItems[pageIndex] = pageItem
+		self._pageImages[pageIndex] = image
+
+	def _recyclePageItem(self, pageIndex: int):
+		pageItem = self._pageItems.pop(pageIndex)
+		self._pageImages.pop(pageIndex, None)
+		self._fullPageIndexes.discard(pageIndex)
+		if isinstance(pageItem, ImageItem) and len(self._recycledItems) < _MAX_RECYCLED_ITEMS:
+			# Drop the image, so recycled items don't keep page images in memory
+			pageItem.setVisible(False)
+			pageItem.setImage(QtGui.QImage())
+			self._recycledItems.append(pageItem)
+		else:
+			self._scene.removeItem(pageItem)
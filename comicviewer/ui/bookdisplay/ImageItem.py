@@ -0,0 +1,58 @@
+from PySide6 import QtCore, QtGui, QtWidgets
+
+from comicviewer.images import ImageUtils
+
+
+class ImageItem(QtWidgets.QGraphicsItem):
+	"""
+	Draws a QImage directly. Unlike a QGraphicsPixmapItem, this doesn't need the image to be converted to a QPixmap first, which is a full copy made on the UI thread.
+	Images in the display format (see 'ImageUtils.convertToDisplayFormat') can be drawn without any conversion
+	"""
+	def __init__(self, image: QtGui.QImage = None):
+		super().__init__()
+		self._image: QtGui.QImage = QtGui.QImage()
+		if image is not None:
+			self._image = self._toDrawableImage(image)
+		self._transformationMode = QtCore.Qt.TransformationMode.FastTransformation
+		# Only draw the part of the image that's visible, which requires knowing which part is exposed
+		self.setFlag(QtWidgets.QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption)
+
+	def image(self) -> QtGui.QImage:
+		return self._image
+
+	def setImage(self, image: QtGui.QImage):
+		"""
+		Change the image this item draws
+		:param image: The new image. Pass an empty QImage to stop referencing the current image
+		"""
+		self.prepareGeometryChange()
+		self._image = self._toDrawableImage(image)
+		self.update()
+
+	@staticmethod
+	def _toDrawableImage(image: QtGui.QImage) -> QtGui.QImage:
+		"""Grayscale pages are cached compactly, but drawing them would convert them on every paint, so convert them once here. Images in the display format are used as they are"""
+		if image.isNull() or image.format() != QtGui.QImage.Format_Grayscale8:
+			return image
+		return ImageUtils.convertToDisplayFormat(image)
+
+	def setTransformationMode(self, transformationMode: QtCore.Qt.TransformationMode):
+		"""
+		Set how the image gets scaled when the item is drawn at a different size, like QGraphicsPixmapItem.setTransformationMode
+		:param transformationMode: FastTransformation for quick but blocky scaling, SmoothTransformation for slower but better-looking scaling
+		"""
+		if transformationMode != self._transformationMode:
+			self._transformationMode = transformationMode
+			self.update()
+
+	def boundingRect(self) -> QtCore.QRectF:
+		return QtCore.QRectF(0, 0, self._image.width(), self._image.height())
+
+	def paint(self, painter: QtGui.QPainter, option: QtWidgets.QStyleOptionGraphicsItem, widget: QtWidgets.QWidget = None):
+		if self._image.isNull():
+			return
+		if self._transformationMode == QtCore.Qt.TransformationMode.SmoothTransformation:
+			painter.setRenderHint(QtGui.QPainter.RenderHint.SmoothPixmapTransform)
+		# Item coordinates are image pixels, so the exposed part of the item is also the part of the image to draw
+		exposedRect = option.exposedRect.intersected(self.boundingRect()) if not option.exposedRect.isEmpty() else self.boundingRect()
+		painter.drawImage(exposedRect, self._image, exposedRect)
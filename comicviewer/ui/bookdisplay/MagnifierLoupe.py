@@ -0,0 +1,61 @@
+from PySide6 import QtCore, QtGui, QtWidgets
+
+from comicviewer.settings import SettingsStore
+
+_LOUPE_SIZE = 240  # The diameter of the loupe, in pixels
+_MINIMUM_MAGNIFICATION = 1.0  # The magnification setting can be set lower, but a loupe that doesn't enlarge is useless, and a magnification of 0 can't be calculated with
+
+
+class MagnifierLoupe(QtWidgets.QWidget):
+	"""
+	A round lens that shows an enlarged part of a page. It draws straight from the full-resolution image, only the small part under the lens gets scaled,
+	so following the mouse doesn't require rescaling or redrawing the page itself
+	"""
+	def __init__(self, parent: QtWidgets.QWidget):
+		super().__init__(parent)
+		# Let mouse events go through to the view below, so dragging and scrolling keep working while the loupe is shown
+		self.setAttribute(QtCore.Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+		self.resize(_LOUPE_SIZE, _LOUPE_SIZE)
+		self._image: QtGui.QImage or None = None
+		self._sourceRect = QtCore.QRectF()
+		self.hide()
+
+	def showRegion(self, centerPosition: QtCore.QPoint, image: QtGui.QImage, imagePoint: QtCore.QPointF, screenPixelsPerImagePixel: float):
+		"""
+		Show the loupe at the provided position, magnifying the provided image around the provided point
+		:param centerPosition: Where the center of the loupe should be, in the coordinates of the parent widget
+		:param image: The full-resolution image to magnify
+		:param imagePoint: The point in the image that should be in the center of the loupe, in image pixels
+		:param screenPixelsPerImagePixel: How large one image pixel is currently displayed, used to magnify relative to the displayed size
+		"""
+		magnification = max(_MINIMUM_MAGNIFICATION, SettingsStore.getSettings().MAGNIFIER_MAGNIFICATION)
+		sourceSize = _LOUPE_SIZE / (screenPixelsPerImagePixel * magnification)
+		self._image = image
+		self._sourceRect = QtCore.QRectF(imagePoint.x() - sourceSize / 2, imagePoint.y() - sourceSize / 2, sourceSize, sourceSize)
+		self.move(centerPosition.x() - _LOUPE_SIZE // 2, centerPosition.y() - _LOUPE_SIZE // 2)
+		if self.isHidden():
+			self.show()
+			self.raise_()
+		self.update()
+
+	def clear(self):
+		"""Hide the loupe, and stop referencing the magnified image"""
+		self._image = None
+		self.hide()
+
+	def paintEvent(self, event: QtGui.QPaintEvent):
+		painter = QtGui.QPainter(self)
+		painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+		painter.setRenderHint(QtGui.QPainter.RenderHint.SmoothPixmapTransform)
+		lensRect = QtCore.QRectF(self.rect()).adjusted(1, 1, -1, -1)
+		lensPath = QtGui.QPainterPath()
+		lensPath.addEllipse(lensRect)
+		painter.setClipPath(lensPath)
+		painter.fillRect(self.rect(), QtCore.Qt.darkGray)
+		if self._image is not None:
+			# Only the source rectangle gets scaled, so this is cheap no matter how large the image is
+			painter.drawImage(QtCore.QRectF(self.rect()), self._image, self._sourceRect)
+		painter.setClipping(False)
+		painter.setPen(QtGui.QPen(QtCore.Qt.white, 2))
+		painter.drawEllipse(lensRect)
+		painter.end()
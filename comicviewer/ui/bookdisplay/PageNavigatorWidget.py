@@ -0,0 +1,135 @@
+from typing import TYPE_CHECKING
+
+from PySide6 import QtCore, QtGui, QtWidgets
+
+from comicviewer.images.ThumbnailHandler import THUMBNAIL_SIZE
+
+if TYPE_CHECKING:
+	from comicviewer.ui.bookdisplay.BookDisplayParentWidget import BookDisplayParentWidget
+
+_THUMBNAIL_MARGIN = 3  # How many thumbnails above and below the visible ones get loaded too, so they're ready when scrolling a bit
+
+
+class PageNavigatorWidget(QtWidgets.QWidget):
+	"""
+	Shows a slider and a list of page thumbnails, to quickly jump to a page. Thumbnails are only loaded for the part of the list that's visible.
+	Dragging the slider scrolls through the thumbnails, the page only changes when the slider is released
+	"""
+	def __init__(self, parent, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.parent: BookDisplayParentWidget = parent
+		self._currentPageIndex = -1
+		self._initializeUi()
+
+	def _initializeUi(self):
+		layout = QtWidgets.QVBoxLayout()
+		layout.setContentsMargins(0, 0, 0, 0)
+		self.setLayout(layout)
+
+		self.pageSlider = QtWidgets.QSlider(QtCore.Qt.Orientation.Horizontal)
+		self.pageSlider.setToolTip("Drag to browse through the pages, release to go to the page")
+		self.pageSlider.setRange(0, 0)
+		self.pageSlider.valueChanged.connect(self._onSliderValueChanged)
+		self.pageSlider.sliderReleased.connect(self._onSliderReleased)
+		layout.addWidget(self.pageSlider)
+
+		self.thumbnailList = QtWidgets.QListWidget()
+		self.thumbnailList.setIconSize(QtCore.QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+		self.thumbnailList.setUniformItemSizes(True)
+		self.thumbnailList.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollMode.ScrollPerPixel)
+		self.thumbnailList.setMinimumWidth(THUMBNAIL_SIZE + 30)
+		self.thumbnailList.itemClicked.connect(lambda item: self.parent.controller.goToPage(self.thumbnailList.row(item)))
+		self.thumbnailList.verticalScrollBar().valueChanged.connect(self._requestVisibleThumbnails)
+		# The list shouldn't take keyboard focus, otherwise the arrow keys would change the selected thumbnail instead of going through the keyboard handler
+		self.thumbnailList.setFocusPolicy(QtCore.Qt.FocusPolicy.NoFocus)
+		layout.addWidget(self.thumbnailList)
+
+	def setPageCount(self, pageCount: int):
+		"""
+		Create an entry for each page, without thumbnails. Should be called when a book is opened or closed
+		:param pageCount: How many pages the book has. Set to 0 when no book is opened
+		"""
+		self._currentPageIndex = -1
+		self.thumbnailList.clear()
+		for pageIndex in range(pageCount):
+			self.thumbnailList.addItem(QtWidgets.QListWidgetItem(str(pageIndex + 1)))
+		self._setSliderValueSilently(0, max(0, pageCount - 1))
+		self._requestVisibleThumbnails()
+
+	def setCurrentPage(self, pageIndex: int):
+		"""
+		Show which page is the current one
+		:param pageIndex: The index of the current page
+		"""
+		if pageIndex == self._currentPageIndex or pageIndex < 0 or pageIndex >= self.thumbnailList.count():
+			return
+		self._currentPageIndex = pageIndex
+		if not self.pageSlider.isSliderDown():
+			self._setSliderValueSilently(pageIndex)
+		self._showPageInList(pageIndex)
+
+	def onThumbnailLoaded(self, pageIndex: int):
+		"""
+		Should be called when a thumbnail is done loading, so it can be shown
+		:param pageIndex: The index of the page whose thumbnail is loaded
+		"""
+		item = self.thumbnailList.item(pageIndex)
+		if item is None:
+			return
+		thumbnail = self.parent.controller.getThumbnail(pageIndex)
+		if thumbnail is not None:
+			item.setIcon(QtGui.QIcon(QtGui.QPixmap.fromImage(thumbnail)))
+
+	def showEvent(self, event: QtGui.QShowEvent):
+		super().showEvent(event)
+		self._requestVisibleThumbnails()
+
+	def resizeEvent(self, event: QtGui.QResizeEvent):
+		super().resizeEvent(event)
+		self._requestVisibleThumbnails()
+
+	def _setSliderValueSilently(self, value: int, maximum: int = None):
+		"""Change the slider without it counting as the user picking a page"""
+		self.pageSlider.blockSignals(True)
+		if maximum is not None:
+			self.pageSlider.setRange(0, maximum)
+		self.pageSlider.setValue(value)
+		self.pageSlider.blockSignals(False)
+
+	def _showPageInList(self, pageIndex: int):
+		item = self.thumbnailList.item(pageIndex)
+		if item is not None:
+			self.thumbnailList.setCurrentItem(item)
+			self.thumbnailList.scrollToItem(item, QtWidgets.QAbstractItemView.ScrollHint.PositionAtCenter)
+			self._requestVisibleThumbnails()
+
+	def _onSliderValueChanged(self, value: int):
+		if self.pageSlider.isSliderDown():
+			# The user is scrubbing, only show where they are. Going to the page would decode full images for every page passed
+			self._showPageInList(value)
+		else:
+			# The value changed through a click or the keyboard, which is a deliberate page choice
+			self.parent.controller.goToPage(value)
+
+	def _onSliderReleased(self):
+		self.parent.controller.goToPage(self.pageSlider.value())
+
+	def _requestVisibleThumbnails(self):
+		"""Make sure the thumbnails of the visible pages get loaded, and stop loading thumbnails that scrolled out of view"""
+		if self.thumbnailList.count() == 0 or not self.isVisible():
+			return
+		viewportRect = self.thumbnailList.viewport().rect()
+		firstVisibleRow = self.thumbnailList.indexAt(viewportRect.topLeft()).row()
+		lastVisibleRow = self.thumbnailList.indexAt(viewportRect.bottomLeft()).row()
+		if firstVisibleRow < 0:
+			firstVisibleRow = 0
+		if lastVisibleRow < 0:
+			lastVisibleRow = self.thumbnailList.count() - 1
+		pageIndexesToLoad = range(max(0, firstVisibleRow - _THUMBNAIL_MARGIN), min(self.thumbnailList.count(), lastVisibleRow + _THUMBNAIL_MARGIN + 1))
+		self.parent.controller.cancelThumbnailLoading(*pageIndexesToLoad)
+		for pageIndex in pageIndexesToLoad:
+			item = self.thumbnailList.item(pageIndex)
+			if item.icon().isNull():
+				thumbnail = self.parent.controller.getThumbnail(pageIndex)
+				if thumbnail is not None:
+					item.setIcon(QtGui.QIcon(QtGui.QPixmap.fromImage(thumbnail)))
@@ -0,0 +1,116 @@
+import concurrent.futures, logging, math, threading, time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from PySide6 import QtCore, QtGui, QtWidgets
+
+from comicviewer.images import ImageUtils
+
+_TILE_SIZE = 512  # The width and height in pixels of a single tile
+_MAX_CACHED_TILES = 48  # How many tile pixmaps an item keeps around. Enough to cover a large screen at two pyramid levels
+_MAX_UNTILED_IMAGE_SIZE = 4096  # Images that would be displayed wider or taller than this many pixels should be drawn in tiles, instead of as one huge pixmap
+
+
+def shouldTileImage(imageSize: QtCore.QSize, imageScale: float) -> bool:
+	"""
+	Check whether an image is so large that it should be drawn with a tiled image item instead of as a single pixmap
+	:param imageSize: The size of the image, before scaling
+	:param imageScale: The scale the image will be displayed at
+	:return: True if the image should be drawn in tiles, False if it can be drawn as a single pixmap
+	"""
+	return max(imageSize.width(), imageSize.height()) * imageScale > _MAX_UNTILED_IMAGE_SIZE
+
+
+class TiledImageItem(QtWidgets.QGraphicsObject):
+	"""
+	Draws a (potentially huge) image by splitting it into tiles, and only turning the tiles that are visible into pixmaps.
+	A pyramid of ever smaller versions of the image (1/2, 1/4, etc.) is created in the background, so when zoomed out, the smallest version that's still sharp enough is used
+	"""
+	_pyramidLevelCreated = QtCore.Signal()  # Emitted from the worker thread when a new pyramid level is available, so the item gets redrawn on the UI thread
+
+	_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)  # Initialize as class variable so all tiled items share it
+
+	def __init__(self, image: QtGui.QImage, imageSize: QtCore.QSize = None):
+		"""
+		Create a tiled image item. The item is the size of the image, use 'setScale' to show it at a different size
+		:param image: The image to show
+		:param imageSize: The size to show the image at, before scaling. Used to show previews at the size of the full image. If not provided, the size of the image is used
+		"""
+		super().__init__()
+		self._size: QtCore.QSize = imageSize if imageSize else image.size()
+		self._pyramidLevels: List[QtGui.QImage] = [image]  # The first level is the provided image, and every next level is half the size of the previous one
+		self._tileCache: Dict[Tuple[int, int, int], QtGui.QPixmap] = OrderedDict()  # The tile pixmaps, keyed by pyramid level, column and row. Oldest first
+		self._isRemoved = threading.Event()
+		# Only redraw the parts of the item that are visible, which requires knowing which part is exposed
+		self.setFlag(QtWidgets.QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption)
+		self._pyramidLevelCreated.connect(self.update)
+		self._executor.submit(self._createPyramid)
+
+	def boundingRect(self) -> QtCore.QRectF:
+		return QtCore.QRectF(0, 0, self._size.width(), self._size.height())
+
+	def paint(self, painter: QtGui.QPainter, option: QtWidgets.QStyleOptionGraphicsItem, widget: QtWidgets.QWidget = None):
+		displayScale = QtWidgets.QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+		level = self._getPyramidLevelForScale(displayScale)
+		levelImage = self._pyramidLevels[level]
+		# How many pixels of the pyramid level image fit in one unit of this item
+		levelFactor = levelImage.width() / self._size.width()
+		exposedRect = option.exposedRect if not option.exposedRect.isEmpty() else self.boundingRect()
+		firstColumn = max(0, int(exposedRect.left() * levelFactor) // _TILE_SIZE)
+		lastColumn = min(math.ceil(levelImage.width() / _TILE_SIZE) - 1, int(exposedRect.right() * levelFactor) // _TILE_SIZE)
+		firstRow = max(0, int(exposedRect.top() * levelFactor) // _TILE_SIZE)
+		lastRow = min(math.ceil(levelImage.height() / _TILE_SIZE) - 1, int(exposedRect.bottom() * levelFactor) // _TILE_SIZE)
+		painter.setRenderHint(QtGui.QPainter.RenderHint.SmoothPixmapTransform)
+		for row in range(firstRow, lastRow + 1):
+			for column in range(firstColumn, lastColumn + 1):
+				tilePixmap = self._getTilePixmap(level, column, row)
+				targetRect = QtCore.QRectF(column * _TILE_SIZE / levelFactor, row * _TILE_SIZE / levelFactor, tilePixmap.width() / levelFactor, tilePixmap.height() / levelFactor)
+				painter.drawPixmap(targetRect, tilePixmap, QtCore.QRectF(tilePixmap.rect()))
+
+	def itemChange(self, change: QtWidgets.QGraphicsItem.GraphicsItemChange, value):
+		if change == QtWidgets.QGraphicsItem.GraphicsItemChange.ItemSceneHasChanged and value is None:
+			# The item got removed from the scene, so stop creating the pyramid and free the tiles
+			self._isRemoved.set()
+			self._tileCache.clear()
+		return super().itemChange(change, value)
+
+	def _getPyramidLevelForScale(self, displayScale: float) -> int:
+		"""
+		Get the smallest pyramid level that still has at least as many pixels as will be displayed, so we never have to scale up. If that level isn't created yet, the closest larger level is used
+		:param displayScale: How many screen pixels one item unit is shown as
+		:return: The index of the pyramid level to use
+		"""
+		baseFactor = self._pyramidLevels[0].width() / self._size.width()
+		wantedLevel = 0
+		if displayScale > 0 and baseFactor > displayScale:
+			wantedLevel = int(math.log2(baseFactor / displayScale))
+		return min(wantedLevel, len(self._pyramidLevels) - 1)
+
+	def _getTilePixmap(self, level: int, column: int, row: int) -> QtGui.QPixmap:
+		tileKey = (level, column, row)
+		tilePixmap = self._tileCache.get(tileKey, None)
+		if tilePixmap is not None:
+			self._tileCache.move_to_end(tileKey)
+			return tilePixmap
+		levelImage = self._pyramidLevels[level]
+		tileRect = QtCore.QRect(column * _TILE_SIZE, row * _TILE_SIZE, _TILE_SIZE, _TILE_SIZE).intersected(levelImage.rect())
+		tilePixmap = QtGui.QPixmap.fromImage(levelImage.copy(tileRect))
+		self._tileCache[tileKey] = tilePixmap
+		while len(self._tileCache) > _MAX_CACHED_TILES:
+			self._tileCache.popitem(last=False)
+		return tilePixmap
+
+	def _createPyramid(self):
+		startTime = time.perf_counter()
+		try:
+			levelImage = self._pyramidLevels[0]
+			while max(levelImage.width(), levelImage.height()) > _TILE_SIZE and not self._isRemoved.is_set():
+				# Halving each step from the previous level is both faster and better-looking than scaling the full image down directly
+				levelImage = ImageUtils.scaleImageSmoothly(levelImage, max(1, levelImage.width() // 2), max(1, levelImage.height() // 2))
+				self._pyramidLevels.append(levelImage)
+				self._pyramidLevelCreated.emit()
+		except RuntimeError as e:
+			# This happens when the item got deleted while we were still working on it, which isn't a problem
+			logging.debug(f"Stopped creating image pyramid because the item was deleted: {e}")
+			return
+		logging.debug(f"Creating image pyramid with {len(self._pyramidLevels)} levels took {time.perf_counter() - startTime:.4f} seconds")
@@ -50,7 +50,6 @@ class SettingsParentWidget(QtWidgets.QWidget):
 			# Update the initial values of all the saved settings
 			for setting in settingsToSave:
 				self.settingToWidget[setting].updateInitialValue()
-			self.controller.onSettingsChanged(settingsToSave.keys())
 			self._saveButton.setEnabled(False)
 			self._cancelButton.setEnabled(False)
 
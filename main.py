@@ -1,4 +1,4 @@
-import logging, os, sys
+import logging, multiprocessing, os, sys
 
 from PySide6.QtWidgets import QApplication
 
@@ -15,9 +15,13 @@ from comicviewer.settings import SettingsStore
 logLevel = SettingsStore.getSettingValue(SettingsEnum.LOGGING_LEVEL).logLevel
 logging.basicConfig(level=logLevel, format="[%(asctime)s] <%(levelname)s> %(message)s [%(module)s:%(lineno)d %(funcName)s()  threadID %(thread)d]")
 
-# Finally we've set up everything enough that we can open the actual window
-from comicviewer.ui.MainWindow import MainWindow
-app = QApplication()
-window = MainWindow()
-exitStatusCode = app.exec()
-sys.exit(exitStatusCode)
+# Worker processes for decoding images import this file too, but they shouldn't open a window. Everything above is setup they need as well
+if __name__ == '__main__':
+	# Needed for worker processes to work in a PyInstaller build
+	multiprocessing.freeze_support()
+	# Finally we've set up everything enough that we can open the actual window
+	from comicviewer.ui.MainWindow import MainWindow
+	app = QApplication()
+	window = MainWindow()
+	exitStatusCode = app.exec()
+	sys.exit(exitStatusCode)